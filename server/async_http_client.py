@@ -0,0 +1,77 @@
+"""Pooled asyncio HTTP client for Warcraft Logs calls made from async endpoints."""
+import asyncio
+import os
+import weakref
+
+import httpx
+
+import metrics
+from http_client import CONNECT_TIMEOUT_S, READ_TIMEOUT_S
+
+# One event loop can keep far more requests in flight than a threadpool can.
+MAX_CONNECTIONS = int(os.getenv("WCL_ASYNC_POOL_SIZE", "200"))
+MAX_KEEPALIVE = int(os.getenv("WCL_ASYNC_KEEPALIVE", "50"))
+
+# Mirrors the urllib3 Retry policy used by http_client; 429s are left to
+# the rate budget there too.
+RETRY_STATUSES = {500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 1
+
+# httpx clients are bound to the loop they were created on, so keep one per loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _build_client():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+    )
+
+
+def get_client():
+    """Return the AsyncClient for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[loop] = client
+    return client
+
+
+def _retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return BACKOFF_FACTOR * (2 ** attempt)
+
+
+async def post(url, **kwargs):
+    """POST with the same retry/backoff behaviour as the sync client."""
+    client = get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        response = None
+        try:
+            response = await client.post(url, **kwargs)
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+        metrics.record_retry(response.status_code if response is not None else None)
+        await asyncio.sleep(_retry_delay(response, attempt))
+
+
+async def aclose():
+    """Close the current loop's client, e.g. on application shutdown."""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1 @@
+"""Offline benchmarks for the API against a local Warcraft Logs stand-in; run `python -m bench --help`."""
@@ -0,0 +1,236 @@
+"""Run the benchmark suite against a local Warcraft Logs stand-in.
+
+From server/:
+
+    python -m bench                                  # every scenario, 5 cold iterations each
+    python -m bench report-bundle compare -n 20 --latency-ms 80 --jitter-ms 40
+    python -m bench --cache warm player-summary-100
+    python -m bench --throttle-rate 0.05 report-detail-five-calls
+    python -m bench --users 25 --duration 30         # load mode over scenarios.LOAD_MIX
+    python -m bench --list
+
+Requests go to the app in-process through httpx's ASGI transport, or with
+`--base-url` to a running server whose WCL_GRAPHQL_ENDPOINT/WCL_TOKEN_URL
+point at `python -m bench.mock_wcl` (pass that as `--mock-url`). Each
+scenario reports wall time, p50/p95/p99 latency and, per iteration, the
+upstream requests, token requests, injected 429s and bytes exchanged with
+the mock. `--json FILE` also writes the results, for comparing two runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from bench import mock_wcl
+
+
+class RemoteStats:
+    """Counters of a mock running in another process."""
+
+    def __init__(self, mock_url):
+        self.mock_url = mock_url.rstrip("/")
+
+    def reset(self):
+        httpx.post(f"{self.mock_url}/__reset").raise_for_status()
+
+    def snapshot(self):
+        response = httpx.get(f"{self.mock_url}/__stats")
+        response.raise_for_status()
+        return response.json()
+
+
+def _configure(mock, cache, workdir):
+    """Point the app at the mock and keep every store inside `workdir`."""
+    os.environ.update({
+        "WCL_GRAPHQL_ENDPOINT": mock.graphql_endpoint,
+        "WCL_TOKEN_URL": mock.token_url,
+        "WCL_CACHE_URL": "off" if cache == "cold" else f"sqlite:///{workdir}/report_cache.db",
+        "WCL_INDEX_URL": f"sqlite:///{workdir}/wcl_index.db",
+        "WCL_METRICS_DIR": os.path.join(workdir, "metrics_store"),
+        "WCL_SCHEDULER": "0",
+    })
+
+
+def _summary(name, latencies, errors, wall_s, upstream, iterations):
+    """One result row; `upstream` is the mock's counters, or None when they cannot be attributed."""
+    latencies = np.asarray(latencies or [0.0])
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+    per_run = max(1, iterations)
+
+    def per_iteration(counter, digits=1):
+        return None if upstream is None else round(upstream[counter] / per_run, digits)
+
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "errors": len(errors),
+        "firstError": errors[0] if errors else None,
+        "wallS": round(wall_s, 3),
+        "p50Ms": round(float(p50), 1),
+        "p95Ms": round(float(p95), 1),
+        "p99Ms": round(float(p99), 1),
+        "upstreamRequests": per_iteration("requests"),
+        "tokenRequests": per_iteration("token_requests", 2),
+        "throttled": per_iteration("throttled", 2),
+        # Bytes are counted from the app's side: received from / sent to the mock.
+        "bytesIn": per_iteration("bytes_out", None),
+        "bytesOut": per_iteration("bytes_in", None),
+    }
+
+
+async def _timed(scenario, client, latencies, errors):
+    started = time.perf_counter()
+    try:
+        await scenario.run(client)
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_scenario(scenario, client, stats, iterations, warmup=0):
+    for _ in range(warmup):
+        await scenario.run(client)
+    stats.reset()
+    latencies, errors = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await _timed(scenario, client, latencies, errors)
+    wall_s = time.perf_counter() - started
+    return _summary(scenario.name, latencies, errors, wall_s, stats.snapshot(), iterations)
+
+
+async def run_load(scenarios, client, stats, users, duration_s):
+    """`users` concurrent loops over `scenarios` for `duration_s`; one row per scenario plus a total."""
+    latencies = {scenario.name: [] for scenario in scenarios}
+    errors = {scenario.name: [] for scenario in scenarios}
+    deadline = time.perf_counter() + duration_s
+
+    async def user(offset):
+        step = offset
+        while time.perf_counter() < deadline:
+            scenario = scenarios[step % len(scenarios)]
+            step += 1
+            await _timed(scenario, client, latencies[scenario.name], errors[scenario.name])
+
+    stats.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    wall_s = time.perf_counter() - started
+    upstream = stats.snapshot()
+
+    total = sum(len(values) for values in latencies.values())
+    # Upstream counters are shared by the whole mix, so only the total row has them.
+    rows = [
+        _summary(name, values, errors[name], wall_s, None, len(values))
+        for name, values in latencies.items()
+    ]
+    overall = _summary(
+        f"all ({users} users)", [v for values in latencies.values() for v in values],
+        [e for values in errors.values() for e in values], wall_s, upstream, total,
+    )
+    overall["opsPerS"] = round(total / wall_s, 1) if wall_s else 0
+    return rows + [overall]
+
+
+_COLUMNS = [
+    ("scenario", 28), ("iterations", 5), ("errors", 4), ("wallS", 8), ("p50Ms", 8), ("p95Ms", 8), ("p99Ms", 8),
+    ("upstreamRequests", 8), ("tokenRequests", 6), ("throttled", 6), ("bytesIn", 10), ("bytesOut", 9),
+]
+_HEADERS = {
+    "iterations": "n", "errors": "err", "wallS": "wall s", "p50Ms": "p50 ms", "p95Ms": "p95 ms", "p99Ms": "p99 ms",
+    "upstreamRequests": "req/it", "tokenRequests": "tok/it", "throttled": "429/it", "bytesIn": "B in/it",
+    "bytesOut": "B out/it",
+}
+
+
+def print_table(rows, out=sys.stdout):
+    print("  ".join(_HEADERS.get(name, name).ljust(width) for name, width in _COLUMNS), file=out)
+    for row in rows:
+        print("  ".join(("-" if row[name] is None else str(row[name])).ljust(width) for name, width in _COLUMNS), file=out)
+        if row["firstError"]:
+            print(f"    first error: {row['firstError']}", file=out)
+        if "opsPerS" in row:
+            print(f"    throughput: {row['opsPerS']} ops/s", file=out)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", help="scenario names (default: all; see --list)")
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    parser.add_argument("--cache", choices=("cold", "warm"), default="cold",
+                        help="cold disables the report cache; warm runs one unmeasured pass first")
+    parser.add_argument("--users", type=int, help="load mode: concurrent users looping over the scenarios")
+    parser.add_argument("--duration", type=float, default=30, help="load mode: seconds to run")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--mock-url", help="with --base-url: the standalone mock to read counters from")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    mock_wcl.add_arguments(parser)
+    return parser
+
+
+async def _main(args, stats, client_kwargs):
+    from bench.scenarios import LOAD_MIX, SCENARIOS
+
+    if args.list:
+        for scenario in SCENARIOS.values():
+            print(f"{scenario.name:28}  {scenario.description}")
+        return []
+    names = args.scenarios or (LOAD_MIX if args.users else list(SCENARIOS))
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)} (see --list)")
+    if args.base_url:
+        # Functions run in this process, not in the server being measured.
+        names = [name for name in names if not name.startswith("fn:")]
+    scenarios = [SCENARIOS[name] for name in names]
+
+    async with httpx.AsyncClient(timeout=None, **client_kwargs) as client:
+        if args.users:
+            if args.cache == "warm":
+                for scenario in scenarios:
+                    await scenario.run(client)
+            return await run_load(scenarios, client, stats, args.users, args.duration)
+        warmup = 1 if args.cache == "warm" else 0
+        return [await run_scenario(scenario, client, stats, args.iterations, warmup) for scenario in scenarios]
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="wcl-bench-")
+    mock = None
+    if args.base_url:
+        if not args.mock_url:
+            raise SystemExit("--base-url needs --mock-url to read upstream counters")
+        stats = RemoteStats(args.mock_url)
+        client_kwargs = {"base_url": args.base_url}
+    else:
+        mock = mock_wcl.from_arguments(args).start()
+        _configure(mock, args.cache, workdir)
+        import main as app_module
+        import pull_logs
+
+        # Fetch the token up front so the first scenario is not charged for it.
+        pull_logs.get_access_token()
+        stats = mock.stats
+        client_kwargs = {"transport": httpx.ASGITransport(app=app_module.app), "base_url": "http://bench"}
+    try:
+        rows = asyncio.run(_main(args, stats, client_kwargs))
+    finally:
+        if mock is not None:
+            mock.stop()
+    if rows:
+        print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Deterministic stand-in data for the Warcraft Logs GraphQL API.
+
+`World` answers the query shapes pull_logs sends by reading the query text
+and resolving its `$variables`: guild report listings, public report
+windows, single and aliased report queries (fights, tables, masterData,
+graph), rankings and rateLimitData. Fight lists honour the requested
+projection, so payload sizes track what the app asks for.
+Every value is derived from a seeded RNG, so two runs see the same reports
+and the same payload sizes.
+"""
+import random
+import re
+import time
+import zlib
+
+SPECS = [
+    ("Warrior", "Fury"), ("Rogue", "Combat"), ("Mage", "Fire"), ("Priest", "Holy"),
+    ("Warlock", "Destruction"), ("Hunter", "Marksmanship"), ("Druid", "Restoration"),
+    ("Paladin", "Holy"), ("Shaman", "Enhancement"), ("Priest", "Shadow"),
+]
+ZONES = [(1006, "Naxxramas"), (1005, "Temple of Ahn'Qiraj"), (1002, "Blackwing Lair")]
+SERVERS = ["living-flame", "wild-growth", "crusader-strike", "lone-wolf"]
+GEAR_SLOTS = 19
+FIGHT_MS = 3 * 60 * 1000
+GRAPH_INTERVAL_MS = 1000
+
+_REPORT_BLOCK = re.compile(r'(?:(\w+): )?report\(code: ("[^"]+"|\$\w+)\)')
+_FIELD = re.compile(r"(?:(p\d+): )?\b(fights|masterData|table|graph)\b\s*(\([^)]*\))?")
+_SELECTION = re.compile(r"\s*\{((?:[^{}]|\{[^{}]*\})*)\}")
+
+
+def _arg(args, name, default=None, variables=None):
+    match = re.search(rf"\b{name}: (\"[^\"]*\"|\[[^\]]*\]|\$?[\w.-]+)", args or "")
+    if not match:
+        return default
+    value = match.group(1)
+    if value.startswith("$"):
+        value = (variables or {}).get(value[1:])
+        return default if value is None else value
+    if value.startswith('"'):
+        return value.strip('"')
+    if value.startswith("["):
+        return [int(v) for v in value.strip("[]").split(",") if v.strip()]
+    return int(value) if re.fullmatch(r"-?\d+", value) else value
+
+
+def _rng(*key):
+    return random.Random(zlib.crc32(repr(key).encode()))
+
+
+class World:
+    """A guild with `reports` logs of `players` raiders, plus the public report stream."""
+
+    def __init__(self, reports=100, players=20, bosses=4, window_reports=10, seed=1):
+        self.reports = reports
+        self.players = players
+        self.bosses = bosses
+        self.window_reports = window_reports
+        self.seed = seed
+        # Every guild report is older than the live window, so all are final.
+        self.anchor = int(time.time() // 3600 * 3600 * 1000) - 24 * 3600 * 1000
+
+    # -- data --------------------------------------------------------------
+
+    def player_names(self):
+        return [f"Bench{i}" for i in range(self.players)]
+
+    def _player(self, index):
+        class_name, spec = SPECS[index % len(SPECS)]
+        return {"id": index + 1, "name": f"Bench{index}", "type": class_name, "spec": spec}
+
+    def guild_reports(self):
+        reports = []
+        for i in range(self.reports):
+            start = self.anchor - i * 84 * 3600 * 1000
+            zone_id, zone_name = ZONES[i % len(ZONES)]
+            reports.append({
+                "code": f"BENCH{i:04d}",
+                "title": f"{zone_name} #{self.reports - i}",
+                "startTime": start,
+                "endTime": start + 3 * 3600 * 1000,
+                "zone": {"id": zone_id, "name": zone_name},
+                "owner": {"name": "Bench0"},
+            })
+        return reports
+
+    def _report_start(self, code):
+        match = re.fullmatch(r"BENCH(\d+)", code)
+        if match:
+            return self.anchor - int(match.group(1)) * 84 * 3600 * 1000
+        match = re.fullmatch(r"POP(\d+)-\d+", code)
+        return int(match.group(1)) if match else self.anchor
+
+    def fights(self, code):
+        start = self._report_start(code)
+        fights = [{"id": 1, "name": "Trash", "encounterID": 0, "startTime": start, "endTime": start + FIGHT_MS,
+                   "difficulty": None, "bossPercentage": None, "fightPercentage": None}]
+        for b in range(self.bosses):
+            begin = start + (b + 1) * (FIGHT_MS + 60000)
+            fights.append({
+                "id": b + 2,
+                "name": f"Boss {b + 1}",
+                "encounterID": 1101 + b,
+                "startTime": begin,
+                "endTime": begin + FIGHT_MS,
+                "difficulty": 3,
+                "averageItemLevel": 62.5,
+                "bossPercentage": 0 if _rng(self.seed, code, b).random() > 0.2 else 35.5,
+                "fightPercentage": 0,
+            })
+        return fights
+
+    def actors(self, code):
+        players = range(self.players)
+        if code.startswith("POP"):
+            players = range(_rng(self.seed, code).randint(10, self.players))
+        return [
+            {"id": p["id"], "name": p["name"], "type": "Player", "subType": p["type"],
+             "server": SERVERS[index % len(SERVERS)].replace("-", " ").title()}
+            for index, p in ((i, self._player(i)) for i in players)
+        ]
+
+    def _gear(self, index):
+        rng = _rng(self.seed, "gear", index)
+        return [{
+            "slot": slot,
+            "id": 0 if slot in (3, 18) and rng.random() < 0.5 else 20000 + index * 100 + slot,
+            "name": f"Bench Item {index}-{slot}",
+            "itemLevel": 1 if slot in (3, 18) else rng.randint(58, 66),
+            "quality": 4,
+            "permanentEnchant": rng.choice([0, 1900, 2504]),
+            "permanentEnchantName": "Crusader",
+            "temporaryEnchantName": "",
+            "gems": [],
+        } for slot in range(GEAR_SLOTS)]
+
+    def table(self, code, data_type="DamageDone", fight_ids=None, source_id=None):
+        if source_id is not None:
+            rng = _rng(self.seed, code, fight_ids, source_id)
+            return {"data": {"entries": [
+                {"name": f"Ability {a}", "guid": 1000 + a, "total": rng.randint(1000, 90000),
+                 "uses": rng.randint(1, 60), "hitCount": rng.randint(1, 60), "tickCount": rng.randint(0, 30)}
+                for a in range(12)
+            ]}}
+        fights = len(fight_ids) if fight_ids else self.bosses + 1
+        entries = []
+        for i in range(self.players):
+            player = self._player(i)
+            rng = _rng(self.seed, code, data_type, fight_ids, i)
+            active = fights * FIGHT_MS * rng.uniform(0.85, 1.0)
+            entries.append({
+                "name": player["name"],
+                "id": player["id"],
+                "type": player["type"],
+                "icon": f"{player['type']}-{player['spec']}",
+                "total": int(active / 1000 * rng.uniform(300, 900)),
+                "activeTime": int(active),
+                "overheal": int(rng.uniform(0, 50000)) if data_type == "Healing" else 0,
+                "gear": self._gear(i),
+            })
+        return {"data": {"entries": entries}}
+
+    def graph(self, code, fight_ids, source_id=None):
+        fight = next((f for f in self.fights(code) if f["id"] in (fight_ids or [2])), None)
+        if fight is None:
+            return {"data": {"series": []}}
+        sources = [source_id] if source_id else range(1, self.players + 1)
+        points = (fight["endTime"] - fight["startTime"]) // GRAPH_INTERVAL_MS
+        series = []
+        for source in sources:
+            rng = _rng(self.seed, code, fight["id"], source)
+            series.append({
+                "name": f"Bench{source - 1}",
+                "id": source,
+                "pointStart": fight["startTime"],
+                "pointInterval": GRAPH_INTERVAL_MS,
+                "data": [round(rng.uniform(200, 900), 1) for _ in range(points)],
+            })
+        return {"data": {"series": series}}
+
+    def rankings(self, class_name, spec_name):
+        top = next(
+            (self._player(i) for i in range(self.players)
+             if self._player(i)["type"] == class_name and self._player(i)["spec"] == spec_name),
+            None,
+        )
+        if top is None:
+            return {"rankings": []}
+        return {"rankings": [{
+            "name": top["name"],
+            "amount": 987.6,
+            "duration": FIGHT_MS,
+            "report": {"code": "BENCH0000", "fightID": 2},
+        }]}
+
+    # -- queries -----------------------------------------------------------
+
+    def _guild_page(self, args, variables):
+        limit, page = _arg(args, "limit", 100, variables), _arg(args, "page", 1, variables)
+        zone_id = _arg(args, "zoneID", None, variables)
+        start, end = _arg(args, "startTime", None, variables), _arg(args, "endTime", None, variables)
+        reports = [
+            r for r in self.guild_reports()
+            if (zone_id is None or r["zone"]["id"] == zone_id)
+            and (start is None or r["startTime"] >= start)
+            and (end is None or r["startTime"] <= end)
+        ]
+        data = reports[(page - 1) * limit:page * limit]
+        return {"data": data, "has_more_pages": page * limit < len(reports)}
+
+    def _public_window(self, args, variables):
+        start, end = _arg(args, "startTime", None, variables), _arg(args, "endTime", None, variables)
+        data = []
+        for i in range(self.window_reports):
+            report_start = start + (end - start) * i // max(1, self.window_reports)
+            server = SERVERS[_rng(self.seed, start, i).randrange(len(SERVERS))]
+            zone_id, zone_name = ZONES[i % len(ZONES)]
+            data.append({
+                "code": f"POP{report_start}-{i}",
+                "startTime": report_start,
+                "endTime": report_start + 2 * 3600 * 1000,
+                "zone": {"id": zone_id, "name": zone_name},
+                "guild": {"name": f"Guild {i}", "server": {"slug": server, "region": {"slug": "us"}}},
+            })
+        return {"data": data, "has_more_pages": False}
+
+    def _report_field(self, code, kind, args, variables, rest):
+        if kind == "fights":
+            fights = self.fights(code)
+            selection = _SELECTION.match(rest)
+            if selection:
+                # Top-level names of the selection set; nested sets are taken whole.
+                fields = set(re.findall(r"(\w+)(?:\s*\{[^{}]*\})?", selection.group(1)))
+                fights = [{name: value for name, value in fight.items() if name in fields} for fight in fights]
+            return fights
+        if kind == "masterData":
+            return {"actors": self.actors(code)}
+
+        def arg(name, default=None):
+            return _arg(args, name, default, variables)
+
+        if kind == "graph":
+            return self.graph(code, arg("fightIDs"), arg("sourceID"))
+        return self.table(code, arg("dataType", "DamageDone"), arg("fightIDs"), arg("sourceID"))
+
+    def _report_data(self, query, variables):
+        blocks = list(_REPORT_BLOCK.finditer(query))
+        result = {}
+        for index, block in enumerate(blocks):
+            alias, code = block.group(1) or "report", block.group(2)
+            code = variables.get(code[1:]) if code.startswith("$") else code.strip('"')
+            body = query[block.end():blocks[index + 1].start() if index + 1 < len(blocks) else len(query)]
+            start = self._report_start(code)
+            report = {"endTime": start + 3 * 3600 * 1000}
+            for field in _FIELD.finditer(body):
+                report[field.group(1) or field.group(2)] = self._report_field(
+                    code, field.group(2), field.group(3), variables, body[field.end():],
+                )
+            result[alias] = report
+        return result
+
+    def respond(self, query, variables=None):
+        """The JSON body the API would return for `query` sent with `variables`."""
+        variables = variables or {}
+        data = {}
+        if "rateLimitData" in query:
+            data["rateLimitData"] = {"limitPerHour": 18000, "pointsSpentThisHour": 120.0, "pointsResetIn": 1800}
+        rankings = re.search(r"characterRankings\(([^)]*)\)", query)
+        if rankings:
+            args = rankings.group(1)
+            data["worldData"] = {"encounter": {"characterRankings": self.rankings(
+                _arg(args, "className", None, variables), _arg(args, "specName", None, variables))}}
+        listing = re.search(r"reports\(([^)]*)\)", query)
+        if listing:
+            args = listing.group(1)
+            if "guildName" in args:
+                data["reportData"] = {"reports": self._guild_page(args, variables)}
+            elif "endTime" in args:
+                data["reportData"] = {"reports": self._public_window(args, variables)}
+            else:
+                data["reportData"] = {"reports": {"data": self.guild_reports()[:100], "has_more_pages": False}}
+        elif "report(" in query:
+            data["reportData"] = self._report_data(query, variables)
+        return {"data": data}
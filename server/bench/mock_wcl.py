@@ -0,0 +1,197 @@
+"""Local HTTP stand-in for the Warcraft Logs OAuth and GraphQL endpoints.
+
+Responses come from a fixtures.World, or from recorded responses saved as
+`<query_key>.json` in `fixtures_dir` (single_flight.query_key of the query
+and its variables), which
+take precedence. Every request can be delayed by `latency_ms` (plus up to
+`jitter_ms`), and a `throttle_rate` share of GraphQL requests is answered
+with 429 and a Retry-After header. Counters cover requests, 429s and bytes;
+GET /__stats returns them and POST /__reset clears them, so a benchmark can
+also read them from a mock running in another process:
+
+    python -m bench.mock_wcl --port 8081 --latency-ms 50
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from single_flight import query_key
+
+from bench.fixtures import World
+
+
+class MockStats:
+    FIELDS = ("requests", "token_requests", "throttled", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for name in self.FIELDS:
+                setattr(self, name, 0)
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class MockWarcraftLogs:
+    def __init__(self, world=None, latency_ms=0, jitter_ms=0, throttle_rate=0.0, retry_after_s=1,
+                 fixtures_dir=None, seed=1):
+        self.world = world or World()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after_s = retry_after_s
+        self.fixtures_dir = fixtures_dir
+        self.stats = MockStats()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def graphql_endpoint(self):
+        return f"{self.url}/api/v2/client"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/oauth/token"
+
+    def start(self, host="127.0.0.1", port=0):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                out = json.dumps(payload, separators=(",", ":")).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(out)
+                return len(out)
+
+            def do_GET(self):
+                if self.path == "/__stats":
+                    self._send(200, mock.stats.snapshot())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path == "/__reset":
+                    mock.stats.reset()
+                    self._send(200, mock.stats.snapshot())
+                    return
+                status, payload, headers = mock.handle(self.path, body)
+                sent = self._send(status, payload, headers)
+                mock.stats.add(bytes_in=len(body), bytes_out=sent)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-wcl", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _chance(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def _delay(self):
+        delay_ms = self.latency_ms + (self._chance() * self.jitter_ms if self.jitter_ms else 0)
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+
+    def _recorded(self, query, variables):
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, f"{query_key(query, variables)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def handle(self, path, body):
+        """Return (status, JSON payload, extra headers) for one request."""
+        self._delay()
+        if path.endswith("/oauth/token"):
+            self.stats.add(token_requests=1)
+            return 200, {"access_token": "bench-token", "token_type": "Bearer", "expires_in": 3600}, {}
+
+        self.stats.add(requests=1)
+        if self.throttle_rate and self._chance() < self.throttle_rate:
+            self.stats.add(throttled=1)
+            return 429, {"error": "Too Many Requests"}, {"Retry-After": str(self.retry_after_s)}
+        try:
+            payload = json.loads(body)
+            query, variables = payload["query"], payload.get("variables")
+        except (ValueError, KeyError):
+            return 400, {"error": "expected a JSON body with a query"}, {}
+        recorded = self._recorded(query, variables)
+        return 200, recorded if recorded is not None else self.world.respond(query, variables), {}
+
+
+def add_arguments(parser):
+    """Mock and fixture options shared by this module and the bench runner."""
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every upstream request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra random delay of up to this much")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of GraphQL requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--fixtures", help="directory of recorded <query_key>.json responses")
+    parser.add_argument("--reports", type=int, default=100, help="reports in the bench guild's history")
+    parser.add_argument("--players", type=int, default=20, help="raiders per report")
+
+
+def from_arguments(args):
+    return MockWarcraftLogs(
+        World(reports=args.reports, players=args.players),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        retry_after_s=args.retry_after,
+        fixtures_dir=args.fixtures,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local Warcraft Logs stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    mock = from_arguments(args).start(args.host, args.port)
+    print(f"WCL_GRAPHQL_ENDPOINT={mock.graphql_endpoint}")
+    print(f"WCL_TOKEN_URL={mock.token_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,138 @@
+"""Benchmark scenarios: every API route, the page-level call patterns and the sync fetchers.
+
+A scenario is an async callable taking an httpx.AsyncClient pointed at the
+app. Route scenarios issue the same requests the UI pages do; "fn:"
+scenarios call the synchronous pull_logs/scheduler functions in a thread.
+Import this module only after bench.__main__ has pointed the environment at
+the mock server, since pull_logs reads its endpoints at import time.
+"""
+import asyncio
+from collections import namedtuple
+
+import pull_logs
+import raid_population
+import scheduler
+
+Scenario = namedtuple("Scenario", "name description run")
+
+GUILD = "bench-guild"
+SERVER = "living-flame"
+REGION = "US"
+REPORT = "BENCH0001"
+FIGHT = 2
+PLAYER = "Bench1"
+GUILD_QUERY = f"guild={GUILD}&server={SERVER}&region={REGION}"
+
+
+async def _get(client, url):
+    response = await client.get(url)
+    response.raise_for_status()
+    return response
+
+
+async def _post(client, url):
+    response = await client.post(url)
+    response.raise_for_status()
+    return response
+
+
+def _route(name, url, description=None):
+    return Scenario(name, description or f"GET {url}", lambda client: _get(client, url))
+
+
+async def _report_detail_five_calls(client):
+    # What ReportDetail used to do before the bundle endpoint: five parallel views.
+    await asyncio.gather(*(
+        _get(client, f"/api/{view}/{REPORT}")
+        for view in ("fights", "dps", "healing", "gear", "wowsims-export")
+    ))
+
+
+async def _player_summary_stream(client):
+    url = f"/api/player-summary/stream?{GUILD_QUERY}&player={PLAYER}"
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_lines():
+            pass
+
+
+async def _raid_population(client):
+    await _post(client, "/api/raiding-population/ingest")
+    await _get(client, f"/api/raiding-population?server={SERVER}&region={REGION}")
+
+
+def _function(name, fn, *args):
+    async def run(client):
+        return await asyncio.to_thread(fn, *args)
+    return Scenario(f"fn:{name}", f"{fn.__module__}.{fn.__name__}{args}", run)
+
+
+ROUTES = [
+    _route("hello", "/api/hello"),
+    _route("zone-summary", f"/api/zone-summary?{GUILD_QUERY}"),
+    _route("guild-logs", f"/api/guild-logs?{GUILD_QUERY}"),
+    _route("guild-logs-zone", f"/api/guild-logs?{GUILD_QUERY}&zone_id=1006&limit=50"),
+    _route("fights", f"/api/fights/{REPORT}"),
+    _route("dps", f"/api/dps/{REPORT}"),
+    _route("healing", f"/api/healing/{REPORT}"),
+    _route("gear", f"/api/gear/{REPORT}"),
+    _route("wowsims-export", f"/api/wowsims-export/{REPORT}"),
+    _route("report-bundle", f"/api/report/{REPORT}/bundle"),
+    _route("report-bundle-fights", f"/api/report/{REPORT}/bundle?fight_ids={FIGHT},{FIGHT + 1}"),
+    _route("player-summary-100", f"/api/player-summary?{GUILD_QUERY}&player={PLAYER}",
+           "GET /api/player-summary over the whole (default 100-log) guild history"),
+    Scenario("player-summary-stream-100", "NDJSON player summary, read to the end", _player_summary_stream),
+    _route("compare", f"/api/compare/{REPORT}?fight_id={FIGHT}&player={PLAYER}"),
+    _route("compare-hps", f"/api/compare/{REPORT}?fight_id={FIGHT}&player=Bench3&metric=hps"),
+    _route("timeline", f"/api/timeline/{REPORT}?fight_id={FIGHT}"),
+    _route("timeline-player", f"/api/timeline/{REPORT}?fight_id={FIGHT}&player={PLAYER}&method=buckets"),
+    Scenario("raid-population", "POST ingest, then GET /api/raiding-population", _raid_population),
+    _route("raid-population-status", "/api/raiding-population/status"),
+    _route("raid-population-zones", f"/api/raiding-population?server={SERVER}&region={REGION}&group_by=zone"),
+    _route("raid-population-trend", f"/api/raiding-population/trend?region={REGION}&interval=week"),
+    _route("scheduler-status", "/api/scheduler/status"),
+    _route("cache-stats", "/api/cache/stats"),
+    _route("rate-limit", "/api/rate-limit"),
+    _route("trends-status", f"/api/trends/status?{GUILD_QUERY}"),
+    _route("trends-percentiles", f"/api/trends/percentiles?{GUILD_QUERY}"),
+    _route("trends-rolling", f"/api/trends/rolling?{GUILD_QUERY}&class_name=Rogue&last_reports=50"),
+    _route("trends-boss-medians", f"/api/trends/boss-medians?{GUILD_QUERY}"),
+]
+
+PATTERNS = [
+    Scenario("report-detail-five-calls", "fights, dps, healing, gear and wowsims-export in parallel",
+             _report_detail_five_calls),
+]
+
+FUNCTIONS = [
+    _function("get_fights", pull_logs.get_fights, REPORT),
+    _function("get_dps_data", pull_logs.get_dps_data, REPORT),
+    _function("get_healing_data", pull_logs.get_healing_data, REPORT),
+    _function("get_gear_data", pull_logs.get_gear_data, REPORT),
+    _function("get_wowsims_export", pull_logs.get_wowsims_export, REPORT),
+    _function("get_report_bundle", pull_logs.get_report_bundle, REPORT),
+    _function("get_guild_logs", pull_logs.get_guild_logs, GUILD, SERVER, REGION),
+    _function("summarize_zone_counts", pull_logs.summarize_zone_counts, GUILD, SERVER, REGION),
+    _function("get_player_summary", pull_logs.get_player_summary, GUILD, SERVER, REGION, PLAYER),
+    _function("get_compare_data", pull_logs.get_compare_data, REPORT, FIGHT, PLAYER),
+    _function("get_timeline", pull_logs.get_timeline, REPORT, FIGHT),
+    _function("ingest_new_reports", raid_population.ingest_new_reports),
+    # Also fills the metrics store the trends routes read.
+    Scenario(
+        "fn:prewarm_guild", f"scheduler.prewarm_guild({GUILD!r}, {SERVER!r}, {REGION!r})",
+        lambda client: asyncio.to_thread(scheduler.prewarm_guild, GUILD, SERVER, REGION, set()),
+    ),
+]
+
+# Functions first so the trends routes have stored metrics to aggregate.
+SCENARIOS = {scenario.name: scenario for scenario in FUNCTIONS + PATTERNS + ROUTES}
+
+# What a mix of concurrent users does in load mode.
+LOAD_MIX = [
+    "report-bundle",
+    "report-detail-five-calls",
+    "guild-logs",
+    "compare",
+    "timeline",
+    "player-summary-stream-100",
+]
@@ -0,0 +1,136 @@
+"""Run small dependency graphs of fetch steps with as much overlap as possible.
+
+A graph is an ordered dict of name -> Step. Each step lists the steps it
+needs and receives every finished result so far. Steps whose dependencies are
+done run concurrently. A step ends the whole run early by raising EarlyExit
+with the response to return; unfinished steps are then cancelled.
+
+`run_dag` is for the async endpoints and `run_dag_threads` for the sync
+facade, mirroring fan_out. Both record per-step timings for debugging.
+"""
+import asyncio
+import contextvars
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# `run(results)` returns the step's value (a coroutine for run_dag).
+Step = namedtuple("Step", "deps run")
+
+
+class EarlyExit(Exception):
+    """Stop the graph and answer with `result` instead."""
+
+    def __init__(self, result):
+        super().__init__("early exit")
+        self.result = result
+
+
+class DagRun:
+    """Step results, the early-exit response if any, and timings in milliseconds."""
+
+    def __init__(self):
+        self.results = {}
+        self.exit = None
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    def _ms(self, at):
+        return round((at - self._started) * 1000, 1)
+
+    def _record(self, name, started):
+        self.timings[name] = {
+            "startMs": self._ms(started),
+            "durationMs": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def timing_report(self):
+        return {"steps": self.timings, "totalMs": self._ms(time.perf_counter())}
+
+
+def _check(steps):
+    seen = set()
+    for name, step in steps.items():
+        missing = [dep for dep in step.deps if dep not in seen]
+        if missing:
+            raise ValueError(f"step {name!r} depends on {missing} which are not defined before it")
+        seen.add(name)
+
+
+async def run_dag(steps):
+    """Run an async graph; returns a DagRun, or raises the first step error."""
+    _check(steps)
+    run = DagRun()
+    tasks = {}
+
+    async def execute(name, step):
+        if step.deps:
+            await asyncio.gather(*(tasks[dep] for dep in step.deps))
+        started = time.perf_counter()
+        try:
+            run.results[name] = await step.run(run.results)
+        finally:
+            run._record(name, started)
+
+    for name, step in steps.items():
+        tasks[name] = asyncio.ensure_future(execute(name, step))
+
+    pending = set(tasks.values())
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            # Steps are checked in graph order so exits keep their sequential priority.
+            for task in (t for t in tasks.values() if t in done):
+                if task.cancelled() or task.exception() is None:
+                    continue
+                if isinstance(task.exception(), EarlyExit):
+                    run.exit = task.exception().result
+                    return run
+                raise task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+        # Failed dependencies re-raise inside their dependents; retrieve those too.
+        for task in tasks.values():
+            if task.done() and not task.cancelled():
+                task.exception()
+    return run
+
+
+def run_dag_threads(steps, max_workers=4):
+    """Thread-pool twin of `run_dag` for synchronous callers.
+
+    Running threads cannot be interrupted, so after an early exit they are
+    left to finish in the background.
+    """
+    _check(steps)
+    run = DagRun()
+    remaining = dict(steps)
+    running = {}
+
+    def execute(name, step):
+        started = time.perf_counter()
+        try:
+            return step.run(run.results)
+        finally:
+            run._record(name, started)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while remaining or running:
+            for name, step in list(remaining.items()):
+                if all(dep in run.results for dep in step.deps):
+                    del remaining[name]
+                    future = pool.submit(contextvars.copy_context().run, execute, name, step)
+                    running[future] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: list(steps).index(running[f])):
+                name = running.pop(future)
+                try:
+                    run.results[name] = future.result()
+                except EarlyExit as e:
+                    run.exit = e.result
+                    return run
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return run
@@ -0,0 +1,40 @@
+"""Shared SQLAlchemy engines, one per database URL.
+
+SQLite files are opened in WAL mode with a busy timeout, so several worker
+processes can read them while one writes instead of failing with
+"database is locked".
+"""
+import threading
+
+from sqlalchemy import create_engine, event
+
+_engines = {}
+_created = set()
+_lock = threading.Lock()
+
+SQLITE_BUSY_TIMEOUT_MS = 10000
+
+
+def _sqlite_pragmas(dbapi_connection, _record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def get_engine(url, metadata=None):
+    """Return the process-wide engine for `url`, creating `metadata`'s tables on first use."""
+    engine = _engines.get(url)
+    if engine is not None and (metadata is None or (url, id(metadata)) in _created):
+        return engine
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, pool_pre_ping=True)
+            if engine.dialect.name == "sqlite" and ":memory:" not in url and url != "sqlite://":
+                event.listen(engine, "connect", _sqlite_pragmas)
+            _engines[url] = engine
+        if metadata is not None and (url, id(metadata)) not in _created:
+            metadata.create_all(engine)
+            _created.add((url, id(metadata)))
+    return engine
@@ -0,0 +1,190 @@
+"""Bounded-concurrency fan-out for independent per-report work.
+
+`fan_out` runs coroutines on the event loop for the async endpoints and
+`fan_out_threads` runs plain callables on a thread pool for the sync facade.
+Both keep results in input order and report failures instead of dropping
+them, so callers can return partial data together with what went wrong.
+The `_ordered` variants are generators that hand each result over as soon
+as every earlier one is done, for streaming responses.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+FAN_OUT_CONCURRENCY = int(os.getenv("WCL_FAN_OUT_CONCURRENCY", "8"))
+FAN_OUT_TASK_TIMEOUT_S = float(os.getenv("WCL_FAN_OUT_TIMEOUT", "60"))
+
+
+class FanOutResult:
+    """Per-item results in input order (None where the item failed) plus failures."""
+
+    def __init__(self, results, failures):
+        self.results = results
+        self.failures = failures
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    def succeeded(self):
+        """Yield results of the items that did not fail, still in input order."""
+        failed = {failure["index"] for failure in self.failures}
+        for index, result in enumerate(self.results):
+            if index not in failed:
+                yield result
+
+
+def _describe(exc):
+    if isinstance(exc, (TimeoutError, FutureTimeoutError)):
+        return "timed out"
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _collect(items, outcomes, label):
+    results = []
+    failures = []
+    for index, (item, outcome) in enumerate(zip(items, outcomes)):
+        if isinstance(outcome, BaseException):
+            results.append(None)
+            failures.append({"index": index, "item": label(item), "error": _describe(outcome)})
+        else:
+            results.append(outcome)
+    return FanOutResult(results, failures)
+
+
+async def fan_out(items, worker, concurrency=FAN_OUT_CONCURRENCY, timeout=FAN_OUT_TASK_TIMEOUT_S, label=lambda item: item):
+    """Await `worker(item)` for every item with at most `concurrency` in flight.
+
+    `timeout` applies to each task once it starts running, not to time spent
+    waiting for a slot.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item):
+        async with semaphore:
+            return await asyncio.wait_for(worker(item), timeout)
+
+    outcomes = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+    return _collect(items, outcomes, label)
+
+
+def fan_out_threads(items, worker, concurrency=FAN_OUT_CONCURRENCY, timeout=FAN_OUT_TASK_TIMEOUT_S, label=lambda item: item):
+    """Thread-pool twin of `fan_out` for synchronous callers.
+
+    Threads cannot be interrupted, so a timed-out task is reported as failed
+    and left to finish in the background.
+    """
+    items = list(items)
+    if not items:
+        return FanOutResult([], [])
+    started = [threading.Event() for _ in items]
+    started_at = [None] * len(items)
+
+    def run(index, item):
+        started_at[index] = time.monotonic()
+        started[index].set()
+        return worker(item)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))))
+    try:
+        # Worker threads start with an empty context; carry the caller's over
+        # so settings such as the rate-limit priority still apply.
+        futures = [
+            pool.submit(contextvars.copy_context().run, run, index, item)
+            for index, item in enumerate(items)
+        ]
+        outcomes = []
+        for index, future in enumerate(futures):
+            try:
+                # Wait for the task to start before its own timeout begins.
+                started[index].wait()
+                remaining = timeout - (time.monotonic() - started_at[index])
+                outcomes.append(future.result(timeout=max(0, remaining)))
+            except Exception as exc:
+                outcomes.append(exc)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _collect(items, outcomes, label)
+
+
+async def _settle(item, task):
+    try:
+        return item, await task, None
+    except Exception as exc:
+        return item, None, _describe(exc)
+
+
+async def _iterate(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def fan_out_ordered(items, worker, concurrency=FAN_OUT_CONCURRENCY, timeout=FAN_OUT_TASK_TIMEOUT_S):
+    """Yield (item, result, error) in input order, at most `concurrency` in flight.
+
+    `items` may be an async iterable. Items are pulled lazily and nothing is
+    kept once yielded, so memory stays flat however many items there are.
+    `error` is None on success.
+    """
+    pending = deque()
+    try:
+        async for item in _iterate(items):
+            pending.append((item, asyncio.ensure_future(asyncio.wait_for(worker(item), timeout))))
+            if len(pending) >= max(1, concurrency):
+                yield await _settle(*pending.popleft())
+        while pending:
+            yield await _settle(*pending.popleft())
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def _start_thread(worker, item):
+    """Run `worker(item)` on a thread of its own and return its future."""
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(worker, item))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name="fan-out", daemon=True).start()
+    return future
+
+
+def _settle_future(item, started, future, timeout):
+    try:
+        remaining = timeout - (time.monotonic() - started)
+        return item, future.result(timeout=max(0, remaining)), None
+    except Exception as exc:
+        return item, None, _describe(exc)
+
+
+def fan_out_threads_ordered(items, worker, concurrency=FAN_OUT_CONCURRENCY, timeout=FAN_OUT_TASK_TIMEOUT_S):
+    """Thread twin of `fan_out_ordered` for synchronous callers.
+
+    Each task gets a thread of its own rather than a pool slot, so it starts
+    right away and a timed-out task left running in the background does not
+    hold up the ones behind it.
+    """
+    concurrency = max(1, concurrency)
+    pending = deque()
+    for item in items:
+        pending.append((item, time.monotonic(), _start_thread(worker, item)))
+        if len(pending) >= concurrency:
+            yield _settle_future(*pending.popleft(), timeout)
+    while pending:
+        yield _settle_future(*pending.popleft(), timeout)
@@ -0,0 +1,151 @@
+"""Decode a table entry's gear once and derive every gear view from it.
+
+The gear table, the WoWSims export and the player summary all read the same
+`gear` list of a DamageDone entry. `decode` walks that list in one pass into
+slot-indexed Item records and computes the average item level once; the
+view helpers below only reshape the decoded result.
+
+Decoded gear is memoized per (report, fight set, player). Entries of live
+reports can still change, so memoized gear expires after the same TTL the
+report cache uses for live responses.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from report_cache import LIVE_TTL_S
+
+logger = logging.getLogger(__name__)
+
+SLOT_COUNT = 20
+# Shirt and tabard have no item level that matters.
+NO_ILVL_SLOTS = (3, 18)
+MEMO_SIZE = 4096
+
+
+class Item:
+    __slots__ = ("slot", "id", "name", "ilvl", "quality", "enchant", "enchant_name", "temp_enchant_name", "gems")
+
+    def __init__(self, piece, slot):
+        self.slot = slot
+        self.id = piece.get("id", 0)
+        self.name = piece.get("name", "Empty")
+        self.ilvl = int(piece.get("itemLevel") or 0)
+        self.quality = piece.get("quality", 0)
+        self.enchant = piece.get("permanentEnchant")
+        self.enchant_name = piece.get("permanentEnchantName", "")
+        self.temp_enchant_name = piece.get("temporaryEnchantName", "")
+        self.gems = tuple(gem["id"] for gem in piece.get("gems") or () if gem.get("id"))
+
+
+class Gear:
+    """Items ordered by slot (one per slot) and their average item level."""
+
+    __slots__ = ("items", "avg_ilvl")
+
+    def __init__(self, items, avg_ilvl):
+        self.items = items
+        self.avg_ilvl = avg_ilvl
+
+    def equipped(self):
+        """Items with a real item id, skipping empty-slot placeholders."""
+        return [item for item in self.items if item.id]
+
+
+def decode(pieces):
+    """Decode a gear list into a Gear.
+
+    The first piece of each slot wins, except that a real item replaces an
+    empty placeholder. Malformed pieces are logged and skipped.
+    """
+    slots = [None] * SLOT_COUNT
+    for piece in pieces or ():
+        try:
+            slot = piece["slot"]
+            if not 0 <= slot < SLOT_COUNT:
+                raise ValueError(f"slot {slot} out of range")
+            current = slots[slot]
+            if current is None or (not current.id and piece.get("id")):
+                slots[slot] = Item(piece, slot)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Skipping malformed gear piece %r: %s", piece, e)
+
+    items = tuple(item for item in slots if item is not None)
+    levels = [item.ilvl for item in items if item.id and item.slot not in NO_ILVL_SLOTS and item.ilvl not in (0, 1)]
+    return Gear(items, sum(levels) / len(levels) if levels else 0.0)
+
+
+class _Memo:
+    def __init__(self, size=MEMO_SIZE, ttl=LIVE_TTL_S):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[0] > now:
+                self._entries.move_to_end(key)
+                return hit[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return value
+
+
+_memo = _Memo()
+
+
+def decoded(entry, report_code=None, fight_ids=None):
+    """Decoded gear of a table entry, memoized when the report is known."""
+    if report_code is None:
+        return decode(entry.get("gear"))
+    key = (report_code, tuple(fight_ids) if fight_ids else None, entry.get("name"))
+    return _memo.get(key, lambda: decode(entry.get("gear")))
+
+
+def columns(gear):
+    """Wide `gear_{slot}_*` columns for the gear table."""
+    row = {}
+    for item in gear.items:
+        row[f"gear_{item.slot}_name"] = item.name
+        row[f"gear_{item.slot}_id"] = item.id
+        row[f"gear_{item.slot}_slot"] = item.slot
+        row[f"gear_{item.slot}_ilvl"] = item.ilvl
+        row[f"gear_{item.slot}_perm_enchant"] = item.enchant_name
+        row[f"gear_{item.slot}_temp_enchant"] = item.temp_enchant_name
+    return row
+
+
+def wowsims_items(gear):
+    """Items in WoWSims addon-import form."""
+    result = []
+    for item in gear.equipped():
+        exported = {"slot": item.slot, "id": item.id}
+        if item.enchant:
+            exported["enchant"] = item.enchant
+        if item.gems:
+            exported["gems"] = list(item.gems)
+        result.append(exported)
+    return result
+
+
+def display_items(gear):
+    """Items with the names and levels the player page shows."""
+    return [
+        {
+            "slot": item.slot,
+            "id": item.id,
+            "name": item.name,
+            "ilvl": item.ilvl,
+            "enchant": item.enchant_name,
+            "quality": item.quality,
+        }
+        for item in gear.equipped()
+    ]
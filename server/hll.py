@@ -0,0 +1,62 @@
+"""HyperLogLog distinct-count sketches on NumPy register arrays.
+
+A sketch is PRECISION_BITS-indexed uint8 registers (4 KiB at the default
+precision, about 1.6% standard error). Adding an item already counted is a
+no-op and merging is an element-wise max, so sketches of days, servers or
+zones can be combined in any order to count the union.
+"""
+import hashlib
+
+import numpy as np
+
+PRECISION_BITS = 12
+REGISTERS = 1 << PRECISION_BITS
+_REST_BITS = 64 - PRECISION_BITS
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def empty():
+    return np.zeros(REGISTERS, dtype=np.uint8)
+
+
+def _hash(item):
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+
+
+def add(registers, items):
+    """Add string items to `registers` in place."""
+    for item in items:
+        value = _hash(item)
+        index = value >> _REST_BITS
+        rest = value & ((1 << _REST_BITS) - 1)
+        # Position of the first 1 bit in the remaining bits, counting from 1.
+        rank = _REST_BITS - rest.bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+    return registers
+
+
+def merge(sketches):
+    """Union of several sketches."""
+    sketches = list(sketches)
+    if not sketches:
+        return empty()
+    return np.maximum.reduce(sketches)
+
+
+def estimate(registers):
+    """Approximate number of distinct items added."""
+    raw = _ALPHA * REGISTERS * REGISTERS / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Linear counting is more accurate while many registers are still empty.
+        return int(round(REGISTERS * np.log(REGISTERS / zeros)))
+    return int(round(raw))
+
+
+def to_bytes(registers):
+    return registers.tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype=np.uint8).copy()
@@ -0,0 +1,229 @@
+"""ETags, Cache-Control and compression for report and guild listing responses.
+
+While a request runs, every report cache entry it reads notes its TTL here
+(None for finished reports). The response then gets a matching
+Cache-Control: "immutable" when everything came from finished reports,
+otherwise the shortest TTL involved. A strong ETag is the hash of the body.
+
+ETags and their lifetimes are also kept per URL, so a repeated request with
+a matching If-None-Match is answered 304 without running the endpoint at
+all, until that lifetime ends. Bodies of at least COMPRESS_MIN_BYTES are
+sent brotli- (when the `brotli` package is installed) or gzip-encoded; each
+encoding gets its own ETag suffix since strong validators are per encoding.
+"""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Route templates whose JSON responses get validators and cache lifetimes.
+CACHEABLE_ROUTES = {
+    "/api/fights/{report_code}",
+    "/api/dps/{report_code}",
+    "/api/healing/{report_code}",
+    "/api/gear/{report_code}",
+    "/api/wowsims-export/{report_code}",
+    "/api/report/{report_code}/bundle",
+    "/api/timeline/{report_code}",
+    "/api/guild-logs",
+}
+IMMUTABLE_MAX_AGE_S = 365 * 24 * 60 * 60
+COMPRESS_MIN_BYTES = int(os.getenv("WCL_COMPRESS_MIN_BYTES", "1024"))
+VALIDATORS_KEPT = 10000
+
+_ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz", None: ""}
+
+
+class _Freshness:
+    """Shortest TTL noted during one request; None while only finished reports were read."""
+
+    def __init__(self):
+        self.seen = False
+        self.ttl = None
+
+    def note(self, ttl):
+        if ttl is not None:
+            self.ttl = ttl if self.ttl is None else min(self.ttl, ttl)
+        self.seen = True
+
+    def cache_control(self):
+        if not self.seen:
+            return None
+        if self.ttl is None:
+            return f"public, max-age={IMMUTABLE_MAX_AGE_S}, immutable"
+        return f"public, max-age={int(self.ttl)}"
+
+
+_freshness = ContextVar("response_freshness", default=None)
+
+
+def note_ttl(ttl):
+    """Record that the current response uses data valid for `ttl` seconds (None: forever)."""
+    freshness = _freshness.get()
+    if freshness is not None:
+        freshness.note(ttl)
+
+
+def _etag_matches(if_none_match, digest):
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        for suffix in _ENCODING_SUFFIX.values():
+            if suffix and tag.endswith(suffix):
+                tag = tag[:-len(suffix)]
+                break
+        if tag == digest:
+            return True
+    return False
+
+
+def _encoding(accept_encoding, size):
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    return "gzip" if "gzip" in accepted else None
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+class _Validators:
+    """URL -> (digest, body size, Cache-Control, expiry, route), least recently used dropped first."""
+
+    def __init__(self, size=VALIDATORS_KEPT):
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if entry[3] is not None and entry[3] <= time.monotonic():
+                del self._entries[url]
+                return None
+            self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url, digest, size, cache_control, ttl, route):
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[url] = (digest, size, cache_control, expires, route)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+
+class HttpCacheMiddleware:
+    """ASGI middleware adding validators, Cache-Control and compression to CACHEABLE_ROUTES."""
+
+    def __init__(self, app):
+        self.app = app
+        self.validators = _Validators()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        url = scope["path"] + "?" + scope.get("query_string", b"").decode("latin-1")
+        if_none_match = headers.get("if-none-match")
+
+        if if_none_match:
+            known = self.validators.get(url)
+            if known and _etag_matches(if_none_match, known[0]):
+                digest, size, cache_control, _, route = known
+                # Lets route-labelled metrics see which endpoint was skipped.
+                scope["route"] = route
+                await _not_modified(send, digest, _encoding(headers.get("accept-encoding", ""), size), cache_control)
+                return
+
+        freshness = _Freshness()
+        token = _freshness.set(freshness)
+        try:
+            await self._respond(scope, receive, send, url, headers, freshness)
+        finally:
+            _freshness.reset(token)
+
+    async def _respond(self, scope, receive, send, url, headers, freshness):
+        start = None
+        chunks = []
+
+        async def buffered_send(message):
+            nonlocal start
+            if start is None and message["type"] == "http.response.start":
+                route = scope.get("route")
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if (
+                    message["status"] == 200
+                    and route is not None
+                    and route.path in CACHEABLE_ROUTES
+                    and content_type.startswith(b"application/json")
+                ):
+                    start = message
+                    return
+                start = False
+            if start is False:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._finish(send, start, b"".join(chunks), url, headers, freshness, scope["route"])
+
+        await self.app(scope, receive, buffered_send)
+
+    async def _finish(self, send, start, body, url, headers, freshness, route):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        cache_control = freshness.cache_control() or "no-cache"
+        if freshness.seen:
+            self.validators.put(url, digest, len(body), cache_control, freshness.ttl, route)
+        encoding = _encoding(headers.get("accept-encoding", ""), len(body))
+        if _etag_matches(headers.get("if-none-match", ""), digest):
+            await _not_modified(send, digest, encoding, cache_control)
+            return
+
+        body = _compress(body, encoding)
+        response_headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"etag", b"cache-control", b"content-encoding")
+        ]
+        response_headers += _validator_headers(digest, encoding, cache_control)
+        response_headers.append((b"content-length", str(len(body)).encode()))
+        if encoding:
+            response_headers.append((b"content-encoding", encoding.encode()))
+        await send({**start, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _validator_headers(digest, encoding, cache_control):
+    return [
+        (b"etag", f'"{digest}{_ENCODING_SUFFIX[encoding]}"'.encode()),
+        (b"cache-control", cache_control.encode()),
+        (b"vary", b"Accept-Encoding"),
+    ]
+
+
+async def _not_modified(send, digest, encoding, cache_control):
+    await send({
+        "type": "http.response.start",
+        "status": 304,
+        "headers": _validator_headers(digest, encoding, cache_control),
+    })
+    await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,71 @@
+"""Long-lived, pooled HTTP client shared by every Warcraft Logs call."""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+# Sized to match Starlette's default threadpool so no worker waits on a socket.
+POOL_SIZE = int(os.getenv("WCL_POOL_SIZE", "40"))
+CONNECT_TIMEOUT_S = float(os.getenv("WCL_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT_S = float(os.getenv("WCL_READ_TIMEOUT", "30"))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT_S, READ_TIMEOUT_S)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """Create a keep-alive Session with retry logic for transient SSL/connection errors.
+
+    429s are not retried here: the caller charges them to the rate budget
+    and backs off through it, which a blind adapter retry would bypass.
+    """
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["POST", "GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide Session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def post(url, **kwargs):
+    """POST through the shared connection pool with connect/read timeouts applied."""
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    response = get_session().post(url, **kwargs)
+    # urllib3 retries happen inside the adapter; its Retry history lists them.
+    retries = getattr(response.raw, "retries", None)
+    for attempt in getattr(retries, "history", ()):
+        metrics.record_retry(attempt.status)
+    return response
+
+
+def close():
+    """Close pooled connections, e.g. on application shutdown."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
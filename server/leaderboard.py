@@ -0,0 +1,207 @@
+"""Guild leaderboard kept as a materialized aggregate, for /api/leaderboard.
+
+Per guild it stores one row per player, boss and metric (kills, summed and
+best throughput) plus one attendance row per player. The scheduler folds
+each finished report's boss fight rows (metrics_store.fight_rows) in once;
+a ledger of folded report codes makes a repeated fold a no-op, so a read
+costs O(players) however many reports the guild has. Live reports are left
+out until they finish, since their numbers can still change. `clear` drops a
+guild's view and ledger so scheduler.rebuild_leaderboard can refold the
+ledger's reports.
+"""
+import threading
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    select,
+)
+
+from db import get_engine
+from raid_population import INDEX_URL
+
+metadata = MetaData()
+
+board_reports = Table(
+    "leaderboard_reports",
+    metadata,
+    Column("guild", String(160), primary_key=True),
+    Column("report_code", String(32), primary_key=True),
+    Column("start_time", BigInteger, nullable=False),
+)
+
+board_bosses = Table(
+    "leaderboard_bosses",
+    metadata,
+    Column("guild", String(160), primary_key=True),
+    Column("player", String(64), primary_key=True),
+    Column("encounter_id", Integer, primary_key=True),
+    # "dps" or "hps", as in metrics_store.
+    Column("metric", String(3), primary_key=True),
+    Column("encounter", String(64)),
+    Column("kills", Integer, nullable=False),
+    Column("throughput_sum", Float, nullable=False),
+    Column("best", Float, nullable=False),
+    Column("best_report", String(32)),
+    Column("best_fight_id", Integer),
+)
+
+board_attendance = Table(
+    "leaderboard_attendance",
+    metadata,
+    Column("guild", String(160), primary_key=True),
+    Column("player", String(64), primary_key=True),
+    Column("class_name", String(16)),
+    Column("spec", String(16)),
+    Column("reports", Integer, nullable=False),
+    Column("last_seen", BigInteger),
+)
+
+# Folds read then rewrite a player's rows, so they must not interleave.
+_lock = threading.Lock()
+
+
+def _engine():
+    return get_engine(INDEX_URL, metadata)
+
+
+def _report_partials(rows):
+    """Per (player, encounter, metric) kills, summed and best throughput of one report's kill rows."""
+    partials = {}
+    for row in rows:
+        if not row["kill"]:
+            continue
+        key = (row["player"], row["encounter_id"], row["metric"])
+        partial = partials.setdefault(key, {
+            "encounter": row["encounter"], "kills": 0, "throughput_sum": 0.0, "best": -1.0,
+        })
+        partial["kills"] += 1
+        partial["throughput_sum"] += row["throughput"]
+        if row["throughput"] > partial["best"]:
+            partial.update(best=row["throughput"], best_report=row["report_code"], best_fight_id=row["fight_id"])
+    return partials
+
+
+def _merge_bosses(conn, key, players, partials):
+    existing = {
+        (row["player"], row["encounter_id"], row["metric"]): dict(row)
+        for row in conn.execute(
+            select(board_bosses).where(board_bosses.c.guild == key, board_bosses.c.player.in_(players))
+        ).mappings()
+    }
+    for (player, encounter_id, metric), partial in partials.items():
+        row = existing.setdefault((player, encounter_id, metric), {
+            "guild": key, "player": player, "encounter_id": encounter_id, "metric": metric,
+            "kills": 0, "throughput_sum": 0.0, "best": -1.0, "best_report": None, "best_fight_id": None,
+        })
+        row["encounter"] = partial["encounter"]
+        row["kills"] += partial["kills"]
+        row["throughput_sum"] += partial["throughput_sum"]
+        if partial["best"] > row["best"]:
+            row.update(best=partial["best"], best_report=partial["best_report"], best_fight_id=partial["best_fight_id"])
+    conn.execute(delete(board_bosses).where(board_bosses.c.guild == key, board_bosses.c.player.in_(players)))
+    if existing:
+        conn.execute(board_bosses.insert(), list(existing.values()))
+
+
+def _merge_attendance(conn, key, start_time, rows):
+    seen = {row["player"]: row for row in rows}
+    existing = {
+        row["player"]: dict(row)
+        for row in conn.execute(
+            select(board_attendance).where(board_attendance.c.guild == key, board_attendance.c.player.in_(seen))
+        ).mappings()
+    }
+    for player, row in seen.items():
+        attendance = existing.setdefault(player, {"guild": key, "player": player, "reports": 0, "last_seen": None})
+        attendance["reports"] += 1
+        if attendance["last_seen"] is None or start_time >= attendance["last_seen"]:
+            attendance.update(class_name=row["class_name"], spec=row["spec"], last_seen=start_time)
+    conn.execute(delete(board_attendance).where(board_attendance.c.guild == key, board_attendance.c.player.in_(seen)))
+    conn.execute(board_attendance.insert(), list(existing.values()))
+
+
+def fold(key, report_code, start_time, rows):
+    """Add one finished report's fight rows to guild `key`'s view; False if it was already folded."""
+    with _lock, _engine().begin() as conn:
+        folded = conn.execute(
+            select(board_reports.c.report_code)
+            .where(board_reports.c.guild == key, board_reports.c.report_code == report_code)
+        ).first()
+        if folded:
+            return False
+        conn.execute(board_reports.insert().values(guild=key, report_code=report_code, start_time=start_time))
+        if rows:
+            partials = _report_partials(rows)
+            _merge_bosses(conn, key, list({player for player, _, _ in partials}), partials)
+            _merge_attendance(conn, key, start_time, rows)
+    return True
+
+
+def folded_reports(key):
+    """(report code, start time) of every report folded into guild `key`'s view."""
+    with _engine().connect() as conn:
+        return [tuple(row) for row in conn.execute(
+            select(board_reports.c.report_code, board_reports.c.start_time).where(board_reports.c.guild == key)
+        )]
+
+
+def clear(key):
+    """Drop guild `key`'s view and ledger, ahead of a rebuild."""
+    with _lock, _engine().begin() as conn:
+        for table in (board_reports, board_bosses, board_attendance):
+            conn.execute(delete(table).where(table.c.guild == key))
+
+
+def leaderboard(key, metric="dps", encounter_id=None):
+    """Per player: attendance and, per boss, kill count, average and best throughput.
+
+    Players are sorted by their average over the bosses they killed.
+    """
+    conditions = [board_bosses.c.guild == key, board_bosses.c.metric == metric]
+    if encounter_id is not None:
+        conditions.append(board_bosses.c.encounter_id == encounter_id)
+    with _engine().connect() as conn:
+        reports = conn.execute(
+            select(func.count()).select_from(board_reports).where(board_reports.c.guild == key)
+        ).scalar()
+        attendance = conn.execute(select(board_attendance).where(board_attendance.c.guild == key)).mappings().all()
+        bosses = conn.execute(select(board_bosses).where(*conditions)).mappings().all()
+
+    by_player = {}
+    for row in bosses:
+        by_player.setdefault(row["player"], []).append({
+            "encounterID": row["encounter_id"],
+            "encounter": row["encounter"],
+            "kills": row["kills"],
+            "average": round(row["throughput_sum"] / row["kills"], 1) if row["kills"] else 0,
+            "best": round(row["best"], 1),
+            "bestReport": row["best_report"],
+            "bestFightID": row["best_fight_id"],
+        })
+
+    players = []
+    for row in attendance:
+        encounters = sorted(by_player.get(row["player"], []), key=lambda e: e["encounterID"])
+        if encounter_id is not None and not encounters:
+            continue
+        averages = [e["average"] for e in encounters]
+        players.append({
+            "player": row["player"],
+            "class": row["class_name"],
+            "spec": row["spec"],
+            "reportsAttended": row["reports"],
+            "attendance": round(row["reports"] / reports, 3) if reports else 0,
+            "lastSeen": row["last_seen"],
+            "average": round(sum(averages) / len(averages), 1) if averages else 0,
+            "encounters": encounters,
+        })
+    players.sort(key=lambda player: player["average"], reverse=True)
+    return {"reports": reports, "metric": metric, "players": players}
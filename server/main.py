@@ -1,12 +1,44 @@
 # my-backend/main.py
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pull_logs import summarize_zone_counts, get_guild_logs, get_fights, get_dps_data, get_healing_data, get_gear_data, get_wowsims_export, get_player_summary, get_compare_data, get_raid_pop
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pull_logs_async import summarize_zone_counts, get_guild_logs, get_fights, get_dps_data, get_healing_data, get_gear_data, get_wowsims_export, get_player_summary, iter_player_summary, get_compare_data, get_report_bundle, get_timeline
+import asyncio
+import json
+import time
+import async_http_client
+import http_client
+from http_cache import HttpCacheMiddleware
+import metrics
+from pull_logs import GUILD_PAGE_SIZE, decode_cursor
+from report_cache import report_cache
+import single_flight
+from shared_cache import shared_flight
+from rate_limiter import RateLimitExceeded, rate_budget
+import leaderboard
+import metrics_store
+import timeline
+import raid_population
+from scheduler import SCHEDULER_ENABLED, rebuild_leaderboard, scheduler
 from collections import Counter
 from typing import Optional, List
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app):
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    scheduler.stop()
+    await async_http_client.aclose()
+    http_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Inside CORS so 304s and compressed bodies still get CORS headers.
+app.add_middleware(HttpCacheMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["https://wow-website.onrender.com", "http://localhost:3000"],
@@ -15,6 +47,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Streaming responses are timed up to their headers, not to the last frame.
+    started = time.perf_counter()
+    status = 500
+    with metrics.http_in_flight.track():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            # Label by route template so report codes and players don't add series.
+            route = request.scope.get("route")
+            labels = {"method": request.method, "route": route.path if route else "unmatched"}
+            metrics.http_requests.inc(status=status, **labels)
+            metrics.http_latency.observe(time.perf_counter() - started, **labels)
+    return response
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)},
+    )
+
 def parse_fight_ids(fight_ids: Optional[str]) -> Optional[List[int]]:
     """Parse comma-separated fight IDs string into a list of ints."""
     if not fight_ids:
@@ -22,7 +79,7 @@ def parse_fight_ids(fight_ids: Optional[str]) -> Optional[List[int]]:
     return [int(x.strip()) for x in fight_ids.split(",") if x.strip()]
 
 @app.get("/api/hello")
-def read_root():
+async def read_root():
     return {"message": "Hello from FastAPI!"}
 
 
@@ -32,48 +89,224 @@ def read_root():
 
 # --- API Endpoint ---
 @app.get("/api/zone-summary")
-def get_zone_summary(guild: str = Query(...), server: str = Query(...), region: str = Query("US")):
-    data = summarize_zone_counts(guild, server, region)
+async def get_zone_summary(guild: str = Query(...), server: str = Query(...), region: str = Query("US")):
+    data = await summarize_zone_counts(guild, server, region)
     return data
 
 @app.get("/api/guild-logs")
-def guild_logs(guild: str = Query(...), server: str = Query(...), region: str = Query("US")):
-    return get_guild_logs(guild, server, region)
+async def guild_logs(
+    guild: str = Query(...),
+    server: str = Query(...),
+    region: str = Query("US"),
+    cursor: Optional[str] = Query(None),
+    zone_id: Optional[int] = Query(None),
+    start_time: Optional[int] = Query(None),
+    end_time: Optional[int] = Query(None),
+    limit: int = Query(GUILD_PAGE_SIZE, ge=1, le=100),
+):
+    """One page of logs plus `nextCursor`; pass it back as `cursor` for the next page."""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return await get_guild_logs(guild, server, region, cursor, zone_id, start_time, end_time, limit)
 
 @app.get("/api/fights/{report_code}")
-def fights_report(report_code: str):
-    return get_fights(report_code)
+async def fights_report(report_code: str):
+    return await get_fights(report_code)
 
 @app.get("/api/dps/{report_code}")
-def dps_report(report_code: str, fight_ids: Optional[str] = Query(None)):
-    return get_dps_data(report_code, parse_fight_ids(fight_ids))
+async def dps_report(report_code: str, fight_ids: Optional[str] = Query(None)):
+    return await get_dps_data(report_code, parse_fight_ids(fight_ids))
 
 @app.get("/api/healing/{report_code}")
-def healing_report(report_code: str, fight_ids: Optional[str] = Query(None)):
-    return get_healing_data(report_code, parse_fight_ids(fight_ids))
+async def healing_report(report_code: str, fight_ids: Optional[str] = Query(None)):
+    return await get_healing_data(report_code, parse_fight_ids(fight_ids))
 
 @app.get("/api/gear/{report_code}")
-def gear_report(report_code: str, fight_ids: Optional[str] = Query(None)):
-    return get_gear_data(report_code, parse_fight_ids(fight_ids))
+async def gear_report(report_code: str, fight_ids: Optional[str] = Query(None)):
+    return await get_gear_data(report_code, parse_fight_ids(fight_ids))
 
 @app.get("/api/wowsims-export/{report_code}")
-def wowsims_export(report_code: str, fight_ids: Optional[str] = Query(None)):
-    return get_wowsims_export(report_code, parse_fight_ids(fight_ids))
+async def wowsims_export(report_code: str, fight_ids: Optional[str] = Query(None)):
+    return await get_wowsims_export(report_code, parse_fight_ids(fight_ids))
+
+@app.get("/api/report/{report_code}/bundle")
+async def report_bundle(report_code: str, fight_ids: Optional[str] = Query(None)):
+    return await get_report_bundle(report_code, parse_fight_ids(fight_ids))
 
 @app.get("/api/player-summary")
-def player_summary(guild: str = Query(...), server: str = Query(...), player: str = Query(...), region: str = Query("US")):
-    return get_player_summary(guild, server, region, player)
+async def player_summary(guild: str = Query(...), server: str = Query(...), player: str = Query(...), region: str = Query("US")):
+    return await get_player_summary(guild, server, region, player)
+
+@app.get("/api/player-summary/stream")
+async def player_summary_stream(guild: str = Query(...), server: str = Query(...), player: str = Query(...), region: str = Query("US")):
+    """NDJSON: a "player" frame, one "log" frame per report as it completes, then "summary"."""
+    async def lines():
+        async for frame in iter_player_summary(guild, server, region, player):
+            yield json.dumps(frame) + "\n"
+    # X-Accel-Buffering stops nginx-style proxies from holding frames back.
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
 
 @app.get("/api/compare/{report_code}")
-def compare_report(
+async def compare_report(
     report_code: str,
     fight_id: int = Query(...),
     player: str = Query(...),
     metric: str = Query("dps"),
+    debug: bool = Query(False),
 ):
-    return get_compare_data(report_code, fight_id, player, metric)
+    return await get_compare_data(report_code, fight_id, player, metric, debug)
+
+@app.get("/api/timeline/{report_code}")
+async def fight_timeline(
+    report_code: str,
+    fight_id: int = Query(...),
+    player: Optional[str] = Query(None),
+    metric: str = Query("dps"),
+    points: int = Query(timeline.DEFAULT_POINTS, ge=3, le=timeline.MAX_POINTS),
+    method: str = Query("lttb", pattern="^(lttb|buckets)$"),
+):
+    return await get_timeline(report_code, fight_id, player, metric, points, method)
 
 @app.get("/api/raiding-population")
-def get_raiding_population(server: str = Query(...), region: str = Query("US")):
-    data = get_raid_pop()
-    return data
\ No newline at end of file
+async def get_raiding_population(
+    server: Optional[str] = Query(None),
+    region: str = Query("US"),
+    start_time: Optional[int] = Query(None),
+    end_time: Optional[int] = Query(None),
+    zone_id: Optional[int] = Query(None),
+    group_by: Optional[str] = Query(None),
+    exact: bool = Query(False),
+):
+    """Unique raiders from day/server/zone sketches; exact=true counts distinct player rows instead."""
+    if group_by is not None and group_by not in raid_population.GROUP_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {sorted(raid_population.GROUP_COLUMNS)}")
+    # Answer from the index right away; new reports are pulled in behind it.
+    ingesting = await asyncio.to_thread(raid_population.refresh_in_background)
+    data = await asyncio.to_thread(
+        raid_population.query_population, server, region, start_time, end_time, zone_id, group_by, exact
+    )
+    return {**data, "ingesting": ingesting}
+
+@app.get("/api/raiding-population/trend")
+async def get_raiding_population_trend(
+    server: Optional[str] = Query(None),
+    region: str = Query("US"),
+    start_time: Optional[int] = Query(None),
+    end_time: Optional[int] = Query(None),
+    zone_id: Optional[int] = Query(None),
+    interval: str = Query("week", pattern="^(day|week)$"),
+):
+    ingesting = await asyncio.to_thread(raid_population.refresh_in_background)
+    data = await asyncio.to_thread(
+        raid_population.population_trend, server, region, start_time, end_time, zone_id, interval
+    )
+    return {**data, "ingesting": ingesting}
+
+@app.post("/api/raiding-population/ingest")
+async def ingest_raiding_population():
+    return await asyncio.to_thread(raid_population.ingest_new_reports)
+
+@app.get("/api/raiding-population/status")
+async def raiding_population_status():
+    return await asyncio.to_thread(raid_population.status)
+
+@app.get("/api/scheduler/status")
+async def scheduler_status():
+    return scheduler.status()
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        **report_cache.stats(),
+        **single_flight.stats(),
+        "sharedCoalesced": shared_flight.coalesced,
+        "sharedPublished": shared_flight.published,
+        "sharedWaitTimeouts": shared_flight.wait_timeouts,
+    }
+
+@app.get("/api/rate-limit")
+async def rate_limit_status():
+    return rate_budget.snapshot()
+
+def _cache_hit_ratio():
+    lookups = report_cache.hits + report_cache.misses
+    return report_cache.hits / lookups if lookups else None
+
+metrics.Callback(
+    "wcl_cache_lookups_total", "Report cache lookups by result.",
+    lambda: {("hit",): report_cache.hits, ("miss",): report_cache.misses}, ("result",), kind="counter",
+)
+metrics.Callback(
+    "wcl_cache_hit_ratio", "Share of report cache lookups that hit since startup.",
+    _cache_hit_ratio,
+)
+metrics.Callback(
+    "wcl_single_flight_coalesced_total", "Upstream queries answered by joining an identical in-flight one.",
+    lambda: single_flight.stats()["coalesced"], kind="counter",
+)
+metrics.Callback(
+    "wcl_shared_flight_coalesced_total", "Upstream queries answered by another worker's result.",
+    lambda: shared_flight.coalesced, kind="counter",
+)
+metrics.Callback(
+    "wcl_rate_points_remaining", "Points left in the hourly Warcraft Logs budget.",
+    lambda: rate_budget.snapshot()["pointsRemaining"],
+)
+metrics.Callback(
+    "wcl_rate_limit_per_hour", "Hourly Warcraft Logs points limit.",
+    lambda: rate_budget.snapshot()["limitPerHour"],
+)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/leaderboard")
+async def guild_leaderboard(
+    guild: str = Query(...),
+    server: str = Query(...),
+    region: str = Query("US"),
+    metric: str = Query("dps"),
+    encounter_id: Optional[int] = Query(None),
+):
+    """Per-player average and best throughput by boss plus attendance, from the materialized view."""
+    key = metrics_store.guild_key(guild, server, region)
+    return await asyncio.to_thread(leaderboard.leaderboard, key, metric, encounter_id)
+
+@app.post("/api/leaderboard/rebuild")
+async def rebuild_guild_leaderboard(guild: str = Query(...), server: str = Query(...), region: str = Query("US")):
+    return await asyncio.to_thread(rebuild_leaderboard, guild, server, region)
+
+@app.get("/api/trends/status")
+async def trends_status(guild: str = Query(...), server: str = Query(...), region: str = Query("US")):
+    return await asyncio.to_thread(metrics_store.status, metrics_store.guild_key(guild, server, region))
+
+@app.get("/api/trends/{view}")
+async def trends(
+    view: str,
+    guild: str = Query(...),
+    server: str = Query(...),
+    region: str = Query("US"),
+    metric: str = Query("dps"),
+    encounter_id: Optional[int] = Query(None),
+    zone: Optional[str] = Query(None),
+    class_name: Optional[str] = Query(None),
+    spec: Optional[str] = Query(None),
+    player: Optional[str] = Query(None),
+    kills_only: bool = Query(True),
+    start_time: Optional[int] = Query(None),
+    end_time: Optional[int] = Query(None),
+    last_reports: Optional[int] = Query(None, ge=1),
+    window: int = Query(5, ge=1),
+):
+    """Percentiles, rolling averages or per-boss medians from the local metrics store."""
+    if view not in metrics_store.VIEWS:
+        raise HTTPException(status_code=404, detail=f"Unknown trend view {view!r}")
+    return await asyncio.to_thread(
+        metrics_store.trend, view, guild, server, region, start_time, end_time, last_reports, window,
+        metric=metric, encounter_id=encounter_id, zone=zone, class_name=class_name, spec=spec,
+        player=player, kill=True if kills_only else None,
+    )
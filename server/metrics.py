@@ -0,0 +1,197 @@
+"""In-process counters, gauges and histograms rendered in the Prometheus text format.
+
+Every metric keeps one small lock around a dict keyed by label values, so
+updates from worker threads and the event loop are safe and cost a dict
+lookup. Values that already live elsewhere (cache hits, the points budget)
+are read at scrape time through Callback instead of being copied.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a cached answer up to a slow multi-request summary.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_labels(self.label_names, key, extra)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the enclosed block as in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Callback(_Metric):
+    """Value read from `fn` at scrape time; fn returns {label values: value} or a number."""
+
+    def __init__(self, name, help, fn, labels=(), kind="gauge"):
+        super().__init__(name, help, labels)
+        self._fn = fn
+        self.kind = kind
+
+    def _samples(self):
+        values = self._fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            (self.name, key if isinstance(key, tuple) else (key,), (), value)
+            for key, value in values.items() if value is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                samples.append((f"{self.name}_bucket", key, (("le", _number(float(bound))),), cumulative))
+            samples.append((f"{self.name}_bucket", key, (("le", "+Inf"),), count))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), count))
+        return samples
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = Counter("http_requests_total", "API requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "API time to response headers.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "API requests being handled.")
+
+upstream_requests = Counter(
+    "wcl_upstream_requests_total", "Warcraft Logs calls by operation and final status.", ("operation", "status"))
+upstream_latency = Histogram(
+    "wcl_upstream_request_duration_seconds", "Warcraft Logs call time including client retries.", ("operation",))
+upstream_in_flight = Gauge("wcl_upstream_in_flight", "Warcraft Logs calls in progress.", ("operation",))
+upstream_retries = Counter(
+    "wcl_upstream_retries_total", "Client-level retries of Warcraft Logs calls by reason.", ("reason",))
+upstream_throttled = Counter("wcl_upstream_429_total", "429 responses from Warcraft Logs, retried or not.")
+
+
+def retry_reason(status):
+    """Label for a retried attempt: "429", "5xx" or "connection" when no response came back."""
+    if status is None:
+        return "connection"
+    return "429" if status == 429 else f"{status // 100}xx"
+
+
+def record_retry(status):
+    upstream_retries.inc(reason=retry_reason(status))
+    if status == 429:
+        upstream_throttled.inc()
+
+
+def record_upstream(operation, status, started):
+    """Count one finished upstream call; `status` is the HTTP status or "error"."""
+    upstream_requests.inc(operation=operation, status=status)
+    upstream_latency.observe(time.perf_counter() - started, operation=operation)
+    if status == 429:
+        upstream_throttled.inc()
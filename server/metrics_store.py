@@ -0,0 +1,261 @@
+"""Columnar store of per-player, per-boss-fight metrics for trend queries.
+
+Each guild gets a directory with one compressed NumPy archive per month
+(`<guild>/<YYYY-MM>.npz`), one array per column. The scheduler records every
+boss fight table it warms, so trend endpoints aggregate local arrays instead
+of re-reading hundreds of reports upstream. Re-recording a report replaces
+its rows, so reports ingested while still live are corrected later.
+"""
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+import gear
+from pull_logs import spec_of
+
+METRICS_DIR = os.getenv("WCL_METRICS_DIR", "metrics_store")
+
+COLUMNS = {
+    "report_code": "U16",
+    "start_time": np.int64,
+    "zone": "U64",
+    "fight_id": np.int32,
+    "encounter_id": np.int32,
+    "encounter": "U64",
+    "kill": np.bool_,
+    "player": "U32",
+    "class_name": "U16",
+    "spec": "U16",
+    # "dps" rows come from DamageDone tables, "hps" rows from Healing tables.
+    "metric": "U3",
+    "total": np.float64,
+    "active_time": np.float64,
+    "throughput": np.float32,
+    "avg_ilvl": np.float32,
+}
+
+_lock = threading.Lock()
+
+
+def guild_key(guild, server, region):
+    return re.sub(r"[^a-z0-9-]+", "-", f"{guild}-{server}-{region}".lower()).strip("-")
+
+
+def _month(start_time_ms):
+    return datetime.fromtimestamp(start_time_ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def _partition_path(key, month):
+    return os.path.join(METRICS_DIR, key, f"{month}.npz")
+
+
+def fight_rows(report, fights, tables):
+    """Flatten boss fight tables into column rows.
+
+    `tables` maps (fight_id, data_type) to that fight's table entries.
+    """
+    rows = []
+    zone = (report.get("zone") or {}).get("name") or "Unknown"
+    for fight in fights:
+        if fight.get("encounterID", 0) == 0:
+            continue
+        for data_type, metric in (("DamageDone", "dps"), ("Healing", "hps")):
+            for entry in tables.get((fight["id"], data_type)) or []:
+                active = entry.get("activeTime") or 0
+                total = entry.get("total", 0)
+                rows.append({
+                    "report_code": report["code"],
+                    "start_time": report.get("startTime", 0),
+                    "zone": zone,
+                    "fight_id": fight["id"],
+                    "encounter_id": fight["encounterID"],
+                    "encounter": fight.get("name", "Unknown"),
+                    # Fight lists carry bossPercentage rather than a kill flag.
+                    "kill": fight.get("bossPercentage") == 0,
+                    "player": entry.get("name", ""),
+                    "class_name": entry.get("type", "Unknown"),
+                    "spec": spec_of(entry),
+                    "metric": metric,
+                    "total": total,
+                    "active_time": active,
+                    "throughput": total / active * 1000 if active else 0.0,
+                    "avg_ilvl": round(gear.decode(entry.get("gear")).avg_ilvl, 1),
+                })
+    return rows
+
+
+def _to_columns(rows):
+    return {name: np.array([row[name] for row in rows], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _empty():
+    return {name: np.array([], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return _empty()
+    with np.load(path) as archive:
+        return {name: archive[name] for name in COLUMNS}
+
+
+def _write(path, columns):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, **columns)
+    os.replace(tmp, path)
+
+
+def record(key, rows):
+    """Store rows in their month partitions, replacing earlier rows of the same reports."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(_month(row["start_time"]), []).append(row)
+    with _lock:
+        for month, month_rows in by_month.items():
+            path = _partition_path(key, month)
+            existing = _read(path)
+            keep = ~np.isin(existing["report_code"], [row["report_code"] for row in month_rows])
+            new = _to_columns(month_rows)
+            _write(path, {
+                name: np.concatenate([existing[name][keep], new[name]]).astype(COLUMNS[name])
+                for name in COLUMNS
+            })
+    return len(rows)
+
+
+def _months(key):
+    directory = os.path.join(METRICS_DIR, key)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name[:-len(".npz")] for name in os.listdir(directory)
+        if name.endswith(".npz") and not name.endswith(".tmp.npz")
+    )
+
+
+def load(key, start_time=None, end_time=None, **equals):
+    """Columns for a guild, filtered by start time range and exact column values.
+
+    Only the month partitions overlapping the time range are read.
+    """
+    first = _month(start_time) if start_time is not None else None
+    last = _month(end_time) if end_time is not None else None
+    parts = [
+        _read(_partition_path(key, month)) for month in _months(key)
+        if not (first and month < first) and not (last and month > last)
+    ]
+    if not parts:
+        return _empty()
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+    mask = np.ones(len(columns["report_code"]), dtype=bool)
+    if start_time is not None:
+        mask &= columns["start_time"] >= start_time
+    if end_time is not None:
+        mask &= columns["start_time"] <= end_time
+    for name, value in equals.items():
+        if value is not None:
+            mask &= columns[name] == value
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def report_rows(key):
+    """A guild's stored rows as dicts, grouped by report code."""
+    columns = load(key)
+    by_report = {}
+    for values in zip(*(columns[name].tolist() for name in COLUMNS)):
+        row = dict(zip(COLUMNS, values))
+        by_report.setdefault(row["report_code"], []).append(row)
+    return by_report
+
+
+def _groups(values):
+    """Unique values plus, per value, the row indices that hold it."""
+    uniques, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(uniques)))[:-1]
+    return uniques, np.split(order, bounds)
+
+
+def player_percentiles(columns, percentiles=(25, 50, 75, 95)):
+    """Per-player throughput percentiles over the given rows."""
+    players, groups = _groups(columns["player"])
+    result = []
+    for player, rows in zip(players, groups):
+        values = columns["throughput"][rows]
+        result.append({
+            "player": str(player),
+            "fights": int(len(rows)),
+            **{f"p{p}": round(float(v), 1) for p, v in zip(percentiles, np.percentile(values, percentiles))},
+        })
+    return sorted(result, key=lambda row: row.get("p50", 0), reverse=True)
+
+
+def rolling_average(columns, window=5):
+    """Throughput over time with a trailing `window`-fight mean, one series per player."""
+    players, groups = _groups(columns["player"])
+    kernel = np.ones(max(1, window))
+    result = {}
+    for player, rows in zip(players, groups):
+        rows = rows[np.argsort(columns["start_time"][rows], kind="stable")]
+        values = columns["throughput"][rows].astype(np.float64)
+        sums = np.convolve(values, kernel)[:len(values)]
+        counts = np.minimum(np.arange(1, len(values) + 1), len(kernel))
+        result[str(player)] = [
+            {"startTime": int(t), "reportCode": str(code), "throughput": round(float(v), 1), "rolling": round(float(r), 1)}
+            for t, code, v, r in zip(columns["start_time"][rows], columns["report_code"][rows], values, sums / counts)
+        ]
+    return result
+
+
+def boss_medians(columns):
+    """Median throughput and fight count per encounter."""
+    encounters, groups = _groups(columns["encounter_id"])
+    result = []
+    for encounter_id, rows in zip(encounters, groups):
+        result.append({
+            "encounterID": int(encounter_id),
+            "encounter": str(columns["encounter"][rows[0]]),
+            "fights": int(len(rows)),
+            "median": round(float(np.median(columns["throughput"][rows])), 1),
+        })
+    return result
+
+
+def status(key):
+    return {"guild": key, "months": _months(key), "rows": int(len(load(key)["report_code"]))}
+
+
+def latest_reports(columns, count):
+    """Keep only rows from the `count` most recent reports."""
+    codes, first_index = np.unique(columns["report_code"], return_index=True)
+    newest = codes[np.argsort(columns["start_time"][first_index])[::-1][:count]]
+    mask = np.isin(columns["report_code"], newest)
+    return {name: values[mask] for name, values in columns.items()}
+
+
+VIEWS = {
+    "percentiles": player_percentiles,
+    "rolling": rolling_average,
+    "boss-medians": boss_medians,
+}
+
+
+def trend(view, guild, server, region, start_time=None, end_time=None, last_reports=None, window=5, **equals):
+    """Run one of VIEWS over a guild's stored rows.
+
+    For example the rolling DPS of every Rogue over the last 50 Naxxramas
+    reports: view="rolling", metric="dps", class_name="Rogue",
+    zone="Naxxramas", last_reports=50.
+    """
+    columns = load(guild_key(guild, server, region), start_time, end_time, **equals)
+    if last_reports:
+        columns = latest_reports(columns, last_reports)
+    if view == "rolling":
+        return rolling_average(columns, window)
+    return VIEWS[view](columns)
+
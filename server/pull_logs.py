@@ -1,8 +1,26 @@
-import requests
+import logging
+import os
+import re
 import time
-from collections import Counter
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from collections import Counter, namedtuple
+from itertools import islice
+
+import numpy as np
+
+import gear
+import http_cache
+import http_client
+import metrics
+import queries
+import shared_cache
+import timeline
+from dag import EarlyExit, Step, run_dag_threads
+from fan_out import fan_out_threads, fan_out_threads_ordered
+from rate_limiter import RATE_LIMIT_RETRIES, estimate_cost, rate_budget
+from report_cache import report_cache, query_signature, ttl_for
+from single_flight import query_key, single_flight
+from shared_cache import shared_flight
+from token_provider import REFRESH_MARGIN_S, TokenProvider
 
 # ---- Configuration ----
 CLIENT_ID = "9eda1388-3586-4fef-9d23-f4878704f24e"
@@ -11,86 +29,287 @@ CLIENT_SECRET = "2hb8IyvWlQqz3rtwjr2xW6jDzg0czpHQXRGKHLRP"
 GUILD_NAME = "sanctuary"
 SERVER_SLUG = "living-flame"
 REGION = "US"
-GRAPHQL_ENDPOINT = "https://fresh.warcraftlogs.com/api/v2/client"
-TOKEN_URL = "https://fresh.warcraftlogs.com/oauth/token"
-
-
-def _get_session():
-    """Create a requests Session with retry logic for transient SSL/connection errors."""
-    session = requests.Session()
-    retries = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["POST", "GET"],
-    )
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-    return session
+GRAPHQL_ENDPOINT = os.getenv("WCL_GRAPHQL_ENDPOINT", "https://fresh.warcraftlogs.com/api/v2/client")
+TOKEN_URL = os.getenv("WCL_TOKEN_URL", "https://fresh.warcraftlogs.com/oauth/token")
+# Where workers share the token when WCL_SHARED_CACHE_URL is set.
+SHARED_TOKEN_KEY = f"token:{TOKEN_URL}:{CLIENT_ID}"
+
+# Reports folded into one aliased request, and the most table/fights fields
+# any single request may carry so it stays under the API complexity limit.
+BATCH_REPORTS = int(os.getenv("WCL_BATCH_REPORTS", "5"))
+BATCH_MAX_FIELDS = int(os.getenv("WCL_BATCH_MAX_FIELDS", "20"))
+# How long a top-parse baseline (rankings plus the #1 player's abilities for
+# an encounter/class/spec/metric) is reused, and how many recent guild
+# reports the baseline warm-up looks at.
+BASELINE_TTL_S = int(os.getenv("WCL_BASELINE_TTL", "3600"))
+# Baselines that came back as an {"error"} dict may be transient, so they are
+# only reused briefly.
+BASELINE_ERROR_TTL_S = int(os.getenv("WCL_BASELINE_ERROR_TTL", "60"))
+BASELINE_WARM_REPORTS = int(os.getenv("WCL_BASELINE_WARM_REPORTS", "10"))
+HEALER_SPECS = {"Holy", "Discipline", "Restoration"}
+# Guild report listing: rows per page for the UI, the page size used when
+# walking a guild's whole history (100 is the API maximum), how many pages
+# such a walk may read, and how long a listing page is cached. Listings are
+# anchored to a time rounded down to GUILD_PAGE_ANCHOR_S so concurrent
+# visitors share page 1 and later pages don't shift as new logs arrive.
+GUILD_PAGE_SIZE = int(os.getenv("WCL_GUILD_PAGE_SIZE", "25"))
+GUILD_HISTORY_PAGE_SIZE = 100
+GUILD_HISTORY_MAX_PAGES = int(os.getenv("WCL_GUILD_HISTORY_MAX_PAGES", "50"))
+GUILD_PAGE_TTL_S = int(os.getenv("WCL_GUILD_PAGE_TTL", "600"))
+GUILD_PAGE_ANCHOR_S = 60
+
+logger = logging.getLogger(__name__)
+
+def _apply_rate_limit_data(data):
+    try:
+        limits = data["data"]["rateLimitData"]
+        rate_budget.update(limits["limitPerHour"], limits["pointsSpentThisHour"], limits["pointsResetIn"])
+    except (KeyError, TypeError):
+        rate_budget.refresh_failed()
+
+
+def _operation(query):
+    """Metrics label for a query: the report field it selects, "batch" for aliased reports, or its root."""
+    if "worldData" in query:
+        return "rankings"
+    if re.search(r"\br\d+: report\(", query):
+        return "batch"
+    if "reports(" in query:
+        return "reports"
+    for field in ("graph(", "masterData", "table(", "fights"):
+        if field in query:
+            return field.rstrip("(")
+    return "rateLimit" if "rateLimitData" in query else "other"
+
+
+def _post(operation, url, **kwargs):
+    """http_client.post, recorded in the upstream metrics under `operation`."""
+    started = time.perf_counter()
+    with metrics.upstream_in_flight.track(operation=operation):
+        try:
+            response = http_client.post(url, **kwargs)
+        except Exception:
+            metrics.record_upstream(operation, "error", started)
+            raise
+    metrics.record_upstream(operation, response.status_code, started)
+    return response
+
 
+def _refresh_rate_budget(headers):
+    """Re-read the hourly points budget; failures just keep the local estimate."""
+    try:
+        response = _post("rateLimit", GRAPHQL_ENDPOINT, json={"query": queries.RATE_LIMIT}, headers=headers)
+        response.raise_for_status()
+        _apply_rate_limit_data(response.json())
+    except Exception:
+        logger.warning("could not read rateLimitData", exc_info=True)
+        rate_budget.refresh_failed()
+    finally:
+        rate_budget.end_refresh()
 
-def _graphql_post(headers, query):
-    """Make a GraphQL POST request with retry logic."""
-    session = _get_session()
-    response = session.post(GRAPHQL_ENDPOINT, json={"query": query}, headers=headers)
+
+def _graphql_post(headers, request):
+    """Run a queries.Request, sharing one upstream call among identical concurrent ones."""
+    key = query_key(*request)
+    return single_flight.do(key, lambda: shared_flight.do(key, lambda: _send_query(headers, request)))
+
+
+def _send_query(headers, request):
+    """Make a GraphQL POST request with retry logic.
+
+    A 401 means the cached token was revoked or expired early, so it is
+    invalidated and the request is retried once with a fresh token. Every
+    call first takes its estimated cost from the shared points budget.
+    """
+    if rate_budget.claim_refresh():
+        _refresh_rate_budget(headers)
+    operation = _operation(request.query)
+    body = {"query": request.query, "variables": request.variables}
+    cost = estimate_cost(request.query)
+    response = _post_query(operation, body, headers, cost)
+    if response.status_code == 401:
+        stale_token = headers.get("Authorization", "").removeprefix("Bearer ")
+        invalidate_token(stale_token)
+        headers = {**headers, "Authorization": f"Bearer {get_access_token()}"}
+        response = _post_query(operation, body, headers, cost)
     response.raise_for_status()
     return response.json()
 
 
-def get_access_token():
-    r = requests.post(
+def _post_query(operation, body, headers, cost):
+    """POST once the budget allows it; a 429 blocks the budget and is retried through it."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        rate_budget.acquire(cost, refresh=lambda: _refresh_rate_budget(headers))
+        response = _post(operation, GRAPHQL_ENDPOINT, json=body, headers=headers)
+        rate_budget.observe(response.status_code, response.headers)
+        if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            return response
+        metrics.record_retry(response.status_code)
+
+
+def _fetch_access_token():
+    r = _post(
+        "token",
         TOKEN_URL,
         data={"grant_type": "client_credentials"},
         auth=(CLIENT_ID, CLIENT_SECRET)
     )
     r.raise_for_status()
-    return r.json()["access_token"]
+    payload = r.json()
+    return payload["access_token"], payload.get("expires_in", 3600)
 
 
-def fetch_all_logs(token, guild, server, region, limit=100):
-    headers = {"Authorization": f"Bearer {token}"}
-    query = f"""
-    {{
-      reportData {{
-        reports(guildName: "{guild}", guildServerSlug: "{server}", guildServerRegion: "{region}", limit: {limit}) {{
-          data {{
-            code
-            title
-            startTime
-            zone {{
-              name
-            }}
-            owner {{
-              name
-            }}
-          }}
-        }}
-      }}
-    }}
+def _shared_token():
+    """(token, seconds left) from the shared cache tier while it stays fresh, else None."""
+    entry = shared_cache.get_json(SHARED_TOKEN_KEY)
+    if entry is None:
+        return None
+    expires_in = entry["expiresAt"] - time.time()
+    return (entry["token"], expires_in) if expires_in > REFRESH_MARGIN_S else None
+
+
+def _request_access_token():
+    """Reuse the token another worker stored, else fetch and store one; one fetch across workers."""
+    shared = _shared_token()
+    if shared:
+        return shared
+
+    def fetch():
+        shared = _shared_token()
+        if shared:
+            return shared
+        token, expires_in = _fetch_access_token()
+        shared_cache.set_json(SHARED_TOKEN_KEY, {"token": token, "expiresAt": time.time() + expires_in}, expires_in)
+        return token, expires_in
+
+    return shared_flight.do("token", fetch)
+
+
+_token_provider = TokenProvider(_request_access_token)
+
+
+def invalidate_token(token):
+    """Drop a token upstream rejected, here and in the shared cache tier."""
+    _token_provider.invalidate(token)
+    entry = shared_cache.get_json(SHARED_TOKEN_KEY)
+    if entry is not None and entry["token"] == token:
+        shared_cache.delete(SHARED_TOKEN_KEY)
+
+
+def get_access_token():
+    """Return the shared API token, only hitting TOKEN_URL when it is near expiry."""
+    return _token_provider.get_token()
+
+
+def _auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _cached_report_query(headers, request, kind, report_code, **params):
+    """Serve a report-scoped query from the persistent cache, filling it on a miss.
+
+    Concurrent callers for the same signature share one lookup and fetch.
     """
-    response = requests.post(GRAPHQL_ENDPOINT, json={"query": query}, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    key = query_signature(kind, report_code, **params)
+    return _noted(single_flight.do(key, lambda: _read_through(key, headers, request, kind, report_code)))
 
 
-def summarize_zone_counts(GUILD_NAME=GUILD_NAME, SERVER_SLUG=SERVER_SLUG, REGION=REGION):
-    token = get_access_token()
-    data = fetch_all_logs(token, GUILD_NAME, SERVER_SLUG, REGION)
+def _read_through(key, headers, request, kind, report_code, ttl=None):
+    """Cache lookup, fetch and store; `ttl` defaults to ttl_for(response)."""
+    cached = report_cache.get(key)
+    if cached is not None:
+        return cached
+    data = _graphql_post(headers, request)
+    if not data.get("errors"):
+        report_cache.put(key, report_code, kind, data, ttl if ttl is not None else ttl_for(data))
+    return data
+
+
+def _noted(data, ttl=None):
+    """Note `data`'s lifetime for http_cache and return it.
+
+    Called by each caller once a coalesced call returns, so joiners record
+    it too and not only the caller that ran the shared call.
+    """
+    if data.get("errors"):
+        http_cache.note_ttl(0)
+    else:
+        http_cache.note_ttl(ttl if ttl is not None else ttl_for(data))
+    return data
+
 
-    reports = data["data"]["reportData"]["reports"]["data"]
+def fetch_all_logs(token, guild, server, region, limit=100):
+    return _graphql_post(_auth_headers(token), queries.guild_reports(guild, server, region, limit=limit))
+
+
+def _guild_page_anchor(end_time=None):
+    """Upper time bound for a listing: the caller's end_time, else now rounded down."""
+    now_ms = int(time.time() // GUILD_PAGE_ANCHOR_S * GUILD_PAGE_ANCHOR_S * 1000)
+    return min(end_time, now_ms) if end_time is not None else now_ms
+
+
+def encode_cursor(anchor, page):
+    return f"{anchor}.{page}"
+
+
+def decode_cursor(cursor):
+    """Return (anchor, page) from a cursor; raises ValueError when malformed."""
+    anchor, page = cursor.split(".")
+    anchor, page = int(anchor), int(page)
+    if page < 1:
+        raise ValueError("cursor page must be positive")
+    return anchor, page
+
+
+def fetch_guild_reports_page(token, guild, server, region, page=1, limit=GUILD_PAGE_SIZE, zone_id=None, start_time=None, end_time=None):
+    """One page of a guild's reports, newest first, cached on its own for GUILD_PAGE_TTL_S."""
+    scope = f"{guild}/{server}/{region}".lower()
+    params = {"page": page, "limit": limit, "zoneID": zone_id, "startTime": start_time, "endTime": end_time}
+    key = query_signature("guild-page", scope, **params)
+    request = queries.guild_reports(guild, server, region, page, limit, zone_id, start_time, end_time)
+    data = single_flight.do(
+        key, lambda: _read_through(key, _auth_headers(token), request, "guild-page", scope, GUILD_PAGE_TTL_S)
+    )
+    return _noted(data, GUILD_PAGE_TTL_S)
+
+
+def _guild_page_result(data, anchor, page):
+    reports_page = data["data"]["reportData"]["reports"]
+    has_more = bool(reports_page.get("has_more_pages"))
+    return {
+        "logs": _guild_log_rows(reports_page["data"]),
+        "page": page,
+        "hasMore": has_more,
+        "nextCursor": encode_cursor(anchor, page + 1) if has_more else None,
+    }
+
+
+def iter_guild_reports(token, guild, server, region, zone_id=None, start_time=None, end_time=None, max_pages=GUILD_HISTORY_MAX_PAGES):
+    """Yield every report of a guild, newest first, one cached page at a time."""
+    anchor = _guild_page_anchor(end_time)
+    for page in range(1, max_pages + 1):
+        data = fetch_guild_reports_page(
+            token, guild, server, region, page, GUILD_HISTORY_PAGE_SIZE, zone_id, start_time, anchor
+        )
+        reports_page = data["data"]["reportData"]["reports"]
+        yield from reports_page["data"]
+        if not reports_page.get("has_more_pages"):
+            break
+
+
+def _zone_counts(reports):
     zone_counter = Counter(
         report["zone"]["name"] for report in reports if report.get("zone")
     )
-
     return dict(zone_counter)
 
 
-def get_guild_logs(guild, server, region="US"):
+def summarize_zone_counts(GUILD_NAME=GUILD_NAME, SERVER_SLUG=SERVER_SLUG, REGION=REGION):
     token = get_access_token()
-    data = fetch_all_logs(token, guild, server, region)
-    reports = data["data"]["reportData"]["reports"]["data"]
+    return _zone_counts(iter_guild_reports(token, GUILD_NAME, SERVER_SLUG, REGION))
 
+
+def _guild_log_rows(reports):
     result = []
     for report in reports:
         zone_name = report["zone"]["name"] if report.get("zone") else "Unknown"
@@ -100,6 +319,7 @@ def get_guild_logs(guild, server, region="US"):
             "zone": zone_name,
             "owner": report["owner"]["name"] if report.get("owner") else "Unknown",
             "startTime": report.get("startTime", 0),
+            "zoneId": report["zone"].get("id") if report.get("zone") else None,
         })
 
     # Sort by startTime descending (most recent first)
@@ -107,26 +327,23 @@ def get_guild_logs(guild, server, region="US"):
     return result
 
 
-def fetch_table(token, report_code, data_type="DamageDone", fight_ids=None):
-    headers = {"Authorization": f"Bearer {token}"}
-    if fight_ids:
-        ids_str = ", ".join(str(fid) for fid in fight_ids)
-        fight_filter = f"fightIDs: [{ids_str}],"
-    else:
-        fight_filter = ""
-    query = f"""
-    {{
-      reportData {{
-        report(code: "{report_code}") {{
-          table(dataType: {data_type}, {fight_filter} startTime: 0, endTime: 100000000)
-        }}
-      }}
-    }}
+def get_guild_logs(guild, server, region="US", cursor=None, zone_id=None, start_time=None, end_time=None, limit=GUILD_PAGE_SIZE):
+    """One page of a guild's logs plus the cursor for the next one.
+
+    The first call anchors the listing at the current time; the returned
+    cursor keeps that anchor so following pages stay consistent.
     """
+    token = get_access_token()
+    anchor, page = decode_cursor(cursor) if cursor else (_guild_page_anchor(end_time), 1)
+    data = fetch_guild_reports_page(token, guild, server, region, page, limit, zone_id, start_time, anchor)
+    return _guild_page_result(data, anchor, page)
 
-    response = requests.post(GRAPHQL_ENDPOINT, json={"query": query}, headers=headers)
-    response.raise_for_status()
-    return response.json()
+
+def fetch_table(token, report_code, data_type="DamageDone", fight_ids=None):
+    return _cached_report_query(
+        _auth_headers(token), queries.report_table(report_code, data_type, fight_ids),
+        "table", report_code, dataType=data_type, fightIDs=fight_ids,
+    )
 
 
 def fetch_dps_table(token, report_code, fight_ids=None):
@@ -134,57 +351,12 @@ def fetch_dps_table(token, report_code, fight_ids=None):
 
 
 def fetch_fights(token, report_code):
-    headers = {"Authorization": f"Bearer {token}"}
-    query = f"""
-    {{
-      reportData {{
-        report(code: "{report_code}") {{
-          fights {{
-            id
-            name
-            encounterID
-            endTime
-            startTime
-            difficulty
-            averageItemLevel
-            bossPercentage
-            completeRaid
-            fightPercentage
-            boundingBox {{
-              minX
-              minY
-              maxX
-              maxY
-            }}
-            classicSeasonID
-            enemyNPCs {{
-              id
-              instanceCount
-              groupCount
-            }}
-            enemyPets {{
-              id
-              instanceCount
-              groupCount
-            }}
-            enemyPlayers
-            friendlyPlayers
-          }}
-        }}
-      }}
-    }}
-    """
-
-    response = requests.post(GRAPHQL_ENDPOINT, json={"query": query}, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
+    """A report's fight list, projected to queries.FIGHT_FIELDS."""
+    return _cached_report_query(_auth_headers(token), queries.report_fights(report_code), "fights", report_code)
 
-def get_fights(report_code):
-    token = get_access_token()
-    data = fetch_fights(token, report_code)
-    fights = data["data"]["reportData"]["report"]["fights"]
 
+def _summarize_fights(fights):
+    """Group trash pulls into one row and list each boss pull separately."""
     trash_ids = []
     trash_duration = 0
     bosses = []
@@ -235,11 +407,14 @@ def get_fights(report_code):
     return result
 
 
-def get_dps_data(report_code, fight_ids=None):
+def get_fights(report_code):
     token = get_access_token()
-    data = fetch_dps_table(token, report_code, fight_ids)
-    players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+    data = fetch_fights(token, report_code)
+    fights = data["data"]["reportData"]["report"]["fights"]
+    return _summarize_fights(fights)
+
 
+def _dps_rows(players):
     result = []
     for player in players:
         name = player["name"]
@@ -257,11 +432,14 @@ def get_dps_data(report_code, fight_ids=None):
     return result
 
 
-def get_healing_data(report_code, fight_ids=None):
+def get_dps_data(report_code, fight_ids=None):
     token = get_access_token()
-    data = fetch_table(token, report_code, "Healing", fight_ids)
+    data = fetch_dps_table(token, report_code, fight_ids)
     players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+    return _dps_rows(players)
+
 
+def _healing_rows(players):
     result = []
     for player in players:
         name = player["name"]
@@ -279,65 +457,32 @@ def get_healing_data(report_code, fight_ids=None):
     return result
 
 
-def get_gear_data(report_code, fight_ids=None):
+def get_healing_data(report_code, fight_ids=None):
     token = get_access_token()
-    data = fetch_dps_table(token, report_code, fight_ids)
+    data = fetch_table(token, report_code, "Healing", fight_ids)
     players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+    return _healing_rows(players)
+
 
+def _gear_rows(players, report_code=None, fight_ids=None):
     result = []
     for player in players:
-        name = player["name"]
-        gear = player["gear"]
-
-        player_class = player.get("type", "Unknown")
-        player_icon = player.get("icon", "")
-        player_spec = player_icon.split("-")[-1] if "-" in player_icon else ""
-
-        # Initialize an entry for this player
-        player_data = {
-            "name": name,
-            "className": player_class,
-            "spec": player_spec,
-        }
+        decoded = gear.decoded(player, report_code, fight_ids)
+        result.append({
+            "name": player["name"],
+            "className": player.get("type", "Unknown"),
+            "spec": spec_of(player),
+            **gear.columns(decoded),
+            "total_ilvl": round(decoded.avg_ilvl, 2),
+        })
+    return result
 
-        first_item = [0]*20
-        count, total_ilvl = 0, 0
-        # Loop over the gear pieces and add each one as a separate column
-        items = []
-        for idx, piece in enumerate(gear):
-          gear_name = piece.get('name', 'Empty')#piece['name']
-          slot = piece['slot']
-          
-          try:
-            if first_item[slot] == 0:
-              ilvl = piece.get('itemLevel', '0')  # Assuming 'ilvl' is a key in 'piece', default to 'N/A' if missing
-              if ilvl not in (1,0) and slot not in (3,18):
-                total_ilvl = total_ilvl + int(ilvl)
-                count = count + 1
-              player_data[f"gear_{slot}_name"] = gear_name
-              player_data[f"gear_{slot}_id"] = piece.get('id', 0)
-              player_data[f"gear_{slot}_slot"] = slot
-              player_data[f"gear_{slot}_ilvl"] = ilvl
-              player_data[f"gear_{slot}_perm_enchant"] = piece.get('permanentEnchantName', '')
-              player_data[f"gear_{slot}_temp_enchant"] = piece.get('temporaryEnchantName', '')
-              gear_data = {
-                  "id": piece.get('id', 'Empty'),
-                  **({"enchant": enchant} if (enchant := piece.get('permanentEnchant', '')) else {}),
-                  # **({"rune": rune} if (rune := piece.get('temporaryEnchant', '')) else {}),
-              }
-              if gear_data["id"] != 0:
-                items.append(gear_data)
-
-            first_item[slot] = first_item[slot] + 1
-          except Exception:
-              import pdb;pdb.set_trace()  
-              import traceback
-              traceback.print_exc()
-        player_data["total_ilvl"] = round(total_ilvl / max(1, count), 2)
-
-        result.append(player_data)
 
-    return result
+def get_gear_data(report_code, fight_ids=None):
+    token = get_access_token()
+    data = fetch_dps_table(token, report_code, fight_ids)
+    players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+    return _gear_rows(players, report_code, fight_ids)
 
 
 CLASS_ID_MAP = {
@@ -346,255 +491,95 @@ CLASS_ID_MAP = {
     "Warlock": 9, "Monk": 10, "Druid": 11,
 }
 
-def get_wowsims_export(report_code, fight_ids=None):
-    """Return per-player gear in WoWSims addon-import JSON format."""
-    token = get_access_token()
-    data = fetch_dps_table(token, report_code, fight_ids)
-    players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
-
+def _wowsims_rows(players, report_code=None, fight_ids=None):
     result = []
     for player in players:
-        name = player.get("name", "Unknown")
         player_class = player.get("type", "Unknown")
-        player_icon = player.get("icon", "")
-        gear_raw = player.get("gear", [])
-
-        items = []
-        seen_slots = set()
-        for piece in gear_raw:
-            slot = piece.get("slot")
-            item_id = piece.get("id", 0)
-            if slot is None or item_id == 0 or slot in seen_slots:
-                continue
-            seen_slots.add(slot)
-
-            item = {"slot": slot, "id": item_id}
-            enchant = piece.get("permanentEnchant")
-            if enchant:
-                item["enchant"] = enchant
-            gems_raw = piece.get("gems", [])
-            if gems_raw:
-                gem_ids = [g.get("id") for g in gems_raw if g.get("id")]
-                if gem_ids:
-                    item["gems"] = gem_ids
-            items.append(item)
-
-        # Sort items by slot for readability
-        items.sort(key=lambda x: x["slot"])
-
         result.append({
-            "name": name,
+            "name": player.get("name", "Unknown"),
             "class": CLASS_ID_MAP.get(player_class, 0),
             "className": player_class,
-            "spec": player_icon.split("-")[-1] if "-" in player_icon else "",
-            "gear": items,
+            "spec": spec_of(player),
+            "gear": gear.wowsims_items(gear.decoded(player, report_code, fight_ids)),
         })
-
     return result
 
 
-import requests
-
-def get_all_logs(token, limit=100, page_number=1, start_time = 0):
-    headers = {"Authorization": f"Bearer {token}"}
-
-    args = [f"page: {page_number}"]
-    
-    if start_time is not None:
-        args.append(f"startTime: {start_time}")
-    
-    args_str = ", ".join(args)
-
-    query = f"""
-    {{
-      reportData {{
-        reports({args_str}) {{
-          data {{
-            code
-            title
-            startTime
-            zone {{
-              name
-            }}
-            owner {{
-              name
-            }}
-          }}
-        }}
-      }}
-    }}
-    """
-
-    response = requests.post(GRAPHQL_ENDPOINT, json={"query": query}, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def get_players_data(report_code):
+def get_wowsims_export(report_code, fight_ids=None):
+    """Return per-player gear in WoWSims addon-import JSON format."""
     token = get_access_token()
-    data = fetch_dps_table(token, report_code)
+    data = fetch_dps_table(token, report_code, fight_ids)
     players = data["data"]["reportData"]["report"]["table"]["data"]["entries"]
-    names = [player['name'] for player in players]
-    return names
-
-def get_raid_pop():
-    token = get_access_token()
-    all_logs = []
-    last_start_time = None
-
-    while last_start_time is None or last_start_time > 174641280000:
-
-      count = 0
-
-      while count+1<25:
-          print(count)
-          response = get_all_logs(token, page_number=count+1, start_time = last_start_time)
-          try:
-            reports = response["data"]["reportData"]["reports"]["data"]
-            old_reports = reports
-          except:
-            import pdb;pdb.set_trace()
-          
-          if not reports:
-              break
-
-          all_logs.extend(reports)
-          count = count + 1
-      # Use the startTime of the last report to paginate
-      try:
-        last_start_time = old_reports[-1]["startTime"]
-      except:
-         import pdb;pdb.set_trace()
-
-      from datetime import datetime, timezone
-      import pytz
-
-      # Your Unix timestamp in milliseconds
-      timestamp_ms = last_start_time
-
-      # Convert milliseconds to seconds
-      timestamp_s = timestamp_ms / 1000
-
-      # Create a datetime object in UTC
-      dt_utc = datetime.fromtimestamp(timestamp_s, tz=timezone.utc)
-
-      # Define the EST timezone (Eastern Time with daylight saving awareness)
-      eastern = pytz.timezone('US/Eastern')
-
-      # Convert to EST
-      dt_est = dt_utc.astimezone(eastern)
-
-      # Print both for comparison
-      print("EST Time:", dt_est)
-        
-    unique_players = []
-    for log in all_logs:
-      unique_players = set(unique_players)  # ensure it's a set
-      unique_players.update(get_players_data(log["code"]))
+    return _wowsims_rows(players, report_code, fight_ids)
 
 
-       
-    unique_raiders = len(unique_players)
-    
-    results_dict = {}
-    results_dict['unique_raiders'] = unique_raiders
-
-    return results_dict
+def fetch_reports_window(token, start_time, end_time, page_number=1):
+    """One page of all public reports that started in [start_time, end_time] (ms)."""
+    return _graphql_post(_auth_headers(token), queries.reports_window(start_time, end_time, page_number))
 
 
 def fetch_master_data(token, report_code):
     """Get player actor list to map names to sourceIDs."""
-    headers = {"Authorization": f"Bearer {token}"}
-    query = f"""
-    {{
-      reportData {{
-        report(code: "{report_code}") {{
-          masterData {{
-            actors(type: "Player") {{
-              id
-              name
-              type
-              subType
-            }}
-          }}
-        }}
-      }}
-    }}
-    """
-    return _graphql_post(headers, query)
+    return _cached_report_query(_auth_headers(token), queries.report_master_data(report_code), "masterData", report_code)
 
 
 def fetch_graph(token, report_code, fight_id, source_id=None, data_type="DamageDone"):
     """Fetch time-series graph data for a fight, optionally filtered to one player."""
-    headers = {"Authorization": f"Bearer {token}"}
-    source_filter = f"sourceID: {source_id}," if source_id else ""
-    query = f"""
-    {{
-      reportData {{
-        report(code: "{report_code}") {{
-          graph(dataType: {data_type}, fightIDs: [{fight_id}], {source_filter} startTime: 0, endTime: 100000000000)
-        }}
-      }}
-    }}
-    """
-    return _graphql_post(headers, query)
+    return _cached_report_query(
+        _auth_headers(token), queries.report_graph(report_code, fight_id, source_id, data_type),
+        "graph", report_code, dataType=data_type, fightIDs=[fight_id], sourceID=source_id,
+    )
 
 
 def fetch_rankings(token, encounter_id, class_name, spec_name, metric="dps"):
     """Fetch top character rankings for an encounter + class/spec."""
-    headers = {"Authorization": f"Bearer {token}"}
-    query = f"""
-    {{
-      worldData {{
-        encounter(id: {encounter_id}) {{
-          characterRankings(
-            className: "{class_name}"
-            specName: "{spec_name}"
-            metric: {metric}
-            page: 1
-          )
-        }}
-      }}
-    }}
-    """
-    return _graphql_post(headers, query)
-
-
-def _extract_timeline(series_data, total_time=None):
-    """Extract combined damage/healing over time from graph series data."""
-    if not series_data:
-        return []
-    combined = {}
-    for s in series_data:
-        data = s.get("data", [])
-        point_start = s.get("pointStart", 0)
-        point_interval = s.get("pointInterval", 1000)
-        for i, val in enumerate(data):
-            # data can be [timestamp, value] pairs or bare values with pointInterval
-            if isinstance(val, list):
-                t = val[0]
-                v = val[1]
-            else:
-                t = point_start + i * point_interval
-                v = val
-            # Convert time to seconds
-            t_sec = round(t / 1000, 1)
-            combined[t_sec] = combined.get(t_sec, 0) + v
-    return [{"time": t, "value": round(combined[t], 1)} for t in sorted(combined)]
+    return _graphql_post(_auth_headers(token), queries.rankings(encounter_id, class_name, spec_name, metric))
+
+
+def _timeline_result(fights_data, fight_id, graph_data, player_name, metric, points, method):
+    """Summed, downsampled series for one fight, as seconds from the pull."""
+    fights = fights_data["data"]["reportData"]["report"]["fights"]
+    fight = next((f for f in fights if f["id"] == fight_id), None)
+    if not fight:
+        return {"error": "Fight not found"}
+    graph = graph_data["data"]["reportData"]["report"]["graph"] or {}
+    times, values = timeline.merge_series((graph.get("data") or {}).get("series"))
+    raw_points = len(times)
+    times, values = timeline.downsample(times, values, points, method)
+    return {
+        "fightId": fight_id,
+        "encounterName": fight.get("name", "Unknown"),
+        "player": player_name,
+        "metric": metric,
+        "method": method,
+        "rawPoints": raw_points,
+        "time": np.round((times - fight["startTime"]) / 1000, 1).tolist(),
+        "value": np.round(values, 1).tolist(),
+    }
+
+
+def get_timeline(report_code, fight_id, player_name=None, metric="dps", points=timeline.DEFAULT_POINTS, method="lttb"):
+    """Damage or healing over a fight for the raid or one player, downsampled to `points`."""
+    token = get_access_token()
+    fights_data = fetch_fights(token, report_code)
+    source_id = None
+    if player_name:
+        actors = fetch_master_data(token, report_code)["data"]["reportData"]["report"]["masterData"]["actors"]
+        actor = _find_by_name(actors, player_name)
+        if not actor:
+            return {"error": "Player actor not found"}
+        source_id = actor["id"]
+    graph_data = fetch_graph(token, report_code, fight_id, source_id, _metric_data_type(metric))
+    return _timeline_result(fights_data, fight_id, graph_data, player_name, metric, points, method)
 
 
 def fetch_player_abilities(token, report_code, fight_id, source_id, data_type="DamageDone"):
     """Fetch per-ability damage/healing breakdown for a specific player in a fight."""
-    headers = {"Authorization": f"Bearer {token}"}
-    query = f"""
-    {{
-      reportData {{
-        report(code: "{report_code}") {{
-          table(dataType: {data_type}, fightIDs: [{fight_id}], sourceID: {source_id}, startTime: 0, endTime: 100000000000)
-        }}
-      }}
-    }}
-    """
-    return _graphql_post(headers, query)
+    return _cached_report_query(
+        _auth_headers(token),
+        queries.report_table(report_code, data_type, [fight_id], source_id, end_time=queries.GRAPH_END_TIME),
+        "table", report_code, dataType=data_type, fightIDs=[fight_id], sourceID=source_id,
+    )
 
 
 def _extract_abilities(table_json):
@@ -614,265 +599,564 @@ def _extract_abilities(table_json):
     return abilities
 
 
-def get_compare_data(report_code, fight_id, player_name, metric="dps"):
-    """Compare a player's fight performance against the top-ranked parse."""
-    token = get_access_token()
+def _find_by_name(items, name):
+    """Return the first actor/table entry whose name matches case-insensitively."""
+    return next((item for item in items if item["name"].lower() == name.lower()), None)
 
-    # 1. Get fight info to find encounterID
-    fights_data = fetch_fights(token, report_code)
-    fights = fights_data["data"]["reportData"]["report"]["fights"]
-    fight = next((f for f in fights if f["id"] == fight_id), None)
-    if not fight:
-        return {"error": "Fight not found"}
-    encounter_id = fight.get("encounterID", 0)
-    if encounter_id == 0:
-        return {"error": "Cannot compare trash fights"}
-
-    # 2. Get player class/spec from table data
-    data_type = "DamageDone" if metric == "dps" else "Healing"
-    time.sleep(0.5)
-    table_data = fetch_table(token, report_code, data_type, [fight_id])
-    entries = table_data["data"]["reportData"]["report"]["table"]["data"]["entries"]
-    player_entry = next(
-        (e for e in entries if e["name"].lower() == player_name.lower()), None
-    )
-    if not player_entry:
-        return {"error": "Player not found in this fight"}
 
-    player_class = player_entry.get("type", "Unknown")
-    player_icon = player_entry.get("icon", "")
-    player_spec = player_icon.split("-")[-1] if "-" in player_icon else ""
+def spec_of(entry):
+    """Spec name from a table entry's "Class-Spec" icon, or "" without one."""
+    icon = entry.get("icon", "")
+    return icon.split("-")[-1] if "-" in icon else ""
+
+
+def _compare_result(fight, metric, player_name, player_entry, player_abilities, top_rank, top_abilities):
+    """Shape the compare response from the player's entry and the top-ranked parse."""
     player_total = player_entry.get("total", 0)
     player_active = player_entry.get("activeTime", 1)
     player_throughput = round(player_total / player_active * 1000, 2) if player_active else 0
-
-    # 3. Get player's sourceID
-    time.sleep(0.5)
-    master_data = fetch_master_data(token, report_code)
-    actors = master_data["data"]["reportData"]["report"]["masterData"]["actors"]
-    player_actor = next(
-        (a for a in actors if a["name"].lower() == player_name.lower()), None
-    )
-    if not player_actor:
-        return {"error": "Player actor not found"}
-    source_id = player_actor["id"]
-
-    # 4. Fetch player's per-ability breakdown
-    time.sleep(0.5)
-    player_abilities_data = fetch_player_abilities(token, report_code, fight_id, source_id, data_type)
-    player_abilities = _extract_abilities(player_abilities_data)
-
-    # 5. Fetch top ranking for this encounter/class/spec
-    time.sleep(0.5)
-    try:
-        rankings_data = fetch_rankings(token, encounter_id, player_class, player_spec, metric)
-        rankings_json = rankings_data["data"]["worldData"]["encounter"]["characterRankings"]
-        rankings = rankings_json.get("rankings", [])
-    except Exception as e:
-        return {"error": f"Failed to fetch rankings: {str(e)}"}
-
-    if not rankings:
-        return {"error": f"No rankings found for {player_class} {player_spec} on this encounter"}
-
-    top_rank = rankings[0]
-    top_report_code = top_rank["report"]["code"]
-    top_fight_id = top_rank["report"]["fightID"]
-    top_player_name = top_rank["name"]
-    top_amount = top_rank.get("amount", 0)
-    top_duration = round(top_rank.get("duration", 0) / 1000, 1)
-
-    # 6. Get top player's sourceID
-    time.sleep(0.5)
-    top_master = fetch_master_data(token, top_report_code)
-    top_actors = top_master["data"]["reportData"]["report"]["masterData"]["actors"]
-    top_actor = next(
-        (a for a in top_actors if a["name"].lower() == top_player_name.lower()), None
-    )
-    if not top_actor:
-        return {"error": f"Top player '{top_player_name}' actor not found in their log"}
-    top_source_id = top_actor["id"]
-
-    # 7. Fetch top player's per-ability breakdown
-    time.sleep(0.5)
-    top_abilities_data = fetch_player_abilities(token, top_report_code, top_fight_id, top_source_id, data_type)
-    top_abilities = _extract_abilities(top_abilities_data)
-
-    # 8. Compute fight durations
     player_duration = round((fight["endTime"] - fight["startTime"]) / 1000, 1)
 
     return {
         "encounterName": fight.get("name", "Unknown"),
-        "encounterID": encounter_id,
+        "encounterID": fight.get("encounterID", 0),
         "metric": metric,
         "player": {
             "name": player_name,
-            "class": player_class,
-            "spec": player_spec,
+            "class": player_entry.get("type", "Unknown"),
+            "spec": spec_of(player_entry),
             "throughput": player_throughput,
             "total": player_total,
             "duration": player_duration,
             "abilities": player_abilities,
         },
         "top": {
-            "name": top_player_name,
-            "throughput": round(top_amount, 2),
+            "name": top_rank["name"],
+            "throughput": round(top_rank.get("amount", 0), 2),
             "total": sum(a["total"] for a in top_abilities),
-            "duration": top_duration,
-            "reportCode": top_report_code,
-            "fightId": top_fight_id,
+            "duration": round(top_rank.get("duration", 0) / 1000, 1),
+            "reportCode": top_rank["report"]["code"],
+            "fightId": top_rank["report"]["fightID"],
             "abilities": top_abilities,
         },
     }
 
 
-def get_player_summary(guild, server, region, player_name):
-    """Get per-log + per-boss DPS for a specific player across guild logs."""
-    token = get_access_token()
-    data = fetch_all_logs(token, guild, server, region)
-    reports = data["data"]["reportData"]["reports"]["data"]
+def _metric_data_type(metric):
+    return "DamageDone" if metric == "dps" else "Healing"
 
-    result = []
-    latest_export = None
 
-    for report in reports:
-        code = report["code"]
-        title = report["title"]
-        zone_name = report["zone"]["name"] if report.get("zone") else "Unknown"
+def _baseline_key(encounter_id, class_name, spec_name, metric):
+    return query_signature("baseline", f"encounter-{encounter_id}", className=class_name, specName=spec_name, metric=metric)
+
+
+def _top_rank(rankings_data, class_name, spec_name):
+    """Return (top ranking, None), or (None, error) when the spec has no rankings."""
+    rankings = rankings_data["data"]["worldData"]["encounter"]["characterRankings"].get("rankings", [])
+    if not rankings:
+        return None, {"error": f"No rankings found for {class_name} {spec_name} on this encounter"}
+    return rankings[0], None
+
+
+def _top_actor(top_master, top_rank):
+    """Return (actor, None) for the top player in their own log, or (None, error)."""
+    actors = top_master["data"]["reportData"]["report"]["masterData"]["actors"]
+    actor = _find_by_name(actors, top_rank["name"])
+    if not actor:
+        return None, {"error": f"Top player '{top_rank['name']}' actor not found in their log"}
+    return actor, None
+
 
-        # Fetch overall DPS to check if player is in this log
+def _fetch_baseline(token, encounter_id, class_name, spec_name, metric):
+    rankings_data = fetch_rankings(token, encounter_id, class_name, spec_name, metric)
+    top_rank, error = _top_rank(rankings_data, class_name, spec_name)
+    if error:
+        return error
+    top_report_code = top_rank["report"]["code"]
+    top_actor, error = _top_actor(fetch_master_data(token, top_report_code), top_rank)
+    if error:
+        return error
+    top_abilities_data = fetch_player_abilities(
+        token, top_report_code, top_rank["report"]["fightID"], top_actor["id"], _metric_data_type(metric)
+    )
+    return {"topRank": top_rank, "abilities": _extract_abilities(top_abilities_data)}
+
+
+def _read_through_baseline(key, token, encounter_id, class_name, spec_name, metric):
+    cached = report_cache.get(key)
+    if cached is not None:
+        return cached
+    baseline = _fetch_baseline(token, encounter_id, class_name, spec_name, metric)
+    report_cache.put(key, f"encounter-{encounter_id}", "baseline", baseline, _baseline_ttl(baseline))
+    return baseline
+
+
+def _baseline_ttl(baseline):
+    return BASELINE_ERROR_TTL_S if "error" in baseline else BASELINE_TTL_S
+
+
+def get_baseline(token, encounter_id, class_name, spec_name, metric="dps"):
+    """Top-ranked parse and its ability breakdown for an encounter/class/spec/metric.
+
+    The same for every player of that spec, so it is kept for BASELINE_TTL_S.
+    Returns {"topRank", "abilities"} or an {"error"} dict.
+    """
+    key = _baseline_key(encounter_id, class_name, spec_name, metric)
+    return single_flight.do(
+        key, lambda: _read_through_baseline(key, token, encounter_id, class_name, spec_name, metric)
+    )
+
+
+def _compare_fight(fights_data, fight_id):
+    """The boss fight being compared, or an early exit for missing/trash fights."""
+    fights = fights_data["data"]["reportData"]["report"]["fights"]
+    fight = next((f for f in fights if f["id"] == fight_id), None)
+    if not fight:
+        raise EarlyExit({"error": "Fight not found"})
+    if fight.get("encounterID", 0) == 0:
+        raise EarlyExit({"error": "Cannot compare trash fights"})
+    return fight
+
+
+def _compare_player(table_data, master_data, player_name):
+    """The player's table entry (class/spec) and actor (sourceID)."""
+    entries = table_data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+    player_entry = _find_by_name(entries, player_name)
+    if not player_entry:
+        raise EarlyExit({"error": "Player not found in this fight"})
+    actors = master_data["data"]["reportData"]["report"]["masterData"]["actors"]
+    player_actor = _find_by_name(actors, player_name)
+    if not player_actor:
+        raise EarlyExit({"error": "Player actor not found"})
+    return player_entry, player_actor
+
+
+def _compare_baseline(baseline):
+    if "error" in baseline:
+        raise EarlyExit(baseline)
+    return baseline
+
+
+def _compare_response(run, metric, player_name, debug=False):
+    if run.exit is not None:
+        result = run.exit
+    else:
+        baseline = run.results["baseline"]
+        result = _compare_result(
+            run.results["fight"], metric, player_name, run.results["player"][0],
+            run.results["abilities"], baseline["topRank"], baseline["abilities"],
+        )
+    if debug:
+        result = {**result, "timings": run.timing_report()}
+    return result
+
+
+def get_compare_data(report_code, fight_id, player_name, metric="dps", debug=False):
+    """Compare a player's fight performance against the top-ranked parse.
+
+    Runs as a dependency graph in three stages: the fight list, the player's
+    table and the report's actors together; then the player's abilities
+    alongside the (usually cached) baseline for their spec.
+    """
+    token = get_access_token()
+    data_type = _metric_data_type(metric)
+
+    def abilities(results):
+        source_id = results["player"][1]["id"]
+        return _extract_abilities(fetch_player_abilities(token, report_code, fight_id, source_id, data_type))
+
+    def baseline(results):
+        player_entry = results["player"][0]
         try:
-            dps_data = fetch_dps_table(token, code)
-            entries = dps_data["data"]["reportData"]["report"]["table"]["data"]["entries"]
-        except Exception:
-            continue
+            found = get_baseline(
+                token, results["fight"]["encounterID"], player_entry.get("type", "Unknown"),
+                spec_of(player_entry), metric,
+            )
+        except Exception as e:
+            raise EarlyExit({"error": f"Failed to fetch rankings: {str(e)}"})
+        return _compare_baseline(found)
 
-        player_entry = None
-        for entry in entries:
-            if entry["name"].lower() == player_name.lower():
-                player_entry = entry
-                break
+    run = run_dag_threads({
+        "fight": Step((), lambda results: _compare_fight(fetch_fights(token, report_code), fight_id)),
+        "table": Step((), lambda results: fetch_table(token, report_code, data_type, [fight_id])),
+        "masterData": Step((), lambda results: fetch_master_data(token, report_code)),
+        "player": Step(
+            ("fight", "table", "masterData"),
+            lambda results: _compare_player(results["table"], results["masterData"], player_name),
+        ),
+        "abilities": Step(("player",), abilities),
+        "baseline": Step(("fight", "player"), baseline),
+    })
+    return _compare_response(run, metric, player_name, debug)
 
-        if not player_entry:
+
+# ---- Batched report queries ----
+
+# One report-scoped field to fetch ("table", "fights" or "masterData");
+# fight_ids is a tuple so pieces are hashable.
+ReportPiece = namedtuple("ReportPiece", ["kind", "report_code", "data_type", "fight_ids"], defaults=[None, None])
+
+
+def _chunks(items, size):
+    """Split any iterable into lists of `size`, pulling items lazily."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, max(1, size))):
+        yield chunk
+
+
+def _piece_key(piece):
+    """Cache key matching the one fetch_table / fetch_fights use for the same data."""
+    if piece.kind in ("fights", "masterData"):
+        return query_signature(piece.kind, piece.report_code)
+    return query_signature("table", piece.report_code, dataType=piece.data_type, fightIDs=piece.fight_ids)
+
+
+def _split_batched_response(response, aliases):
+    """Re-shape an aliased response into per-piece responses like the single queries return.
+
+    Pieces that came back null (e.g. a report-level GraphQL error) are left out.
+    """
+    report_data = (response.get("data") or {}).get("reportData") or {}
+    result = {}
+    for piece, (r_alias, p_alias) in aliases.items():
+        report = report_data.get(r_alias)
+        if not report or report.get(p_alias) is None:
             continue
+        # Piece kinds are named after the report field they select.
+        result[piece] = {"data": {"reportData": {"report": {
+            "endTime": report.get("endTime"),
+            piece.kind: report[p_alias],
+        }}}}
+    return result
 
-        overall_dps = round(player_entry["total"] / player_entry["activeTime"] * 1000, 2) if player_entry.get("activeTime") else 0
-        player_class = player_entry.get("type", "Unknown")
-        player_icon = player_entry.get("icon", "")
 
-        # Fetch fights for per-boss breakdown
-        try:
-            fights_data = fetch_fights(token, code)
-            fights = fights_data["data"]["reportData"]["report"]["fights"]
-        except Exception:
-            fights = []
+def _cached_pieces(pieces):
+    """Split pieces into cache hits and the de-duplicated misses still to fetch."""
+    hits = {}
+    misses = []
+    for piece in dict.fromkeys(pieces):
+        cached = report_cache.get(_piece_key(piece))
+        if cached is not None:
+            http_cache.note_ttl(ttl_for(cached))
+            hits[piece] = cached
+        else:
+            misses.append(piece)
+    return hits, misses
 
-        boss_fights = []
-        for fight in fights:
-            encounter_id = fight.get("encounterID", 0)
-            if encounter_id == 0:
-                continue
-            fight_id = fight["id"]
-            fight_name = fight.get("name", "Unknown")
-            start = fight.get("startTime", 0)
-            end = fight.get("endTime", 0)
-            duration_s = round((end - start) / 1000, 1)
-            boss_pct = fight.get("bossPercentage", None)
-            kill = boss_pct == 0 if boss_pct is not None else None
 
-            # Per-boss DPS for this player
-            try:
-                boss_dps_data = fetch_dps_table(token, code, [fight_id])
-                boss_entries = boss_dps_data["data"]["reportData"]["report"]["table"]["data"]["entries"]
-                boss_player = None
-                for be in boss_entries:
-                    if be["name"].lower() == player_name.lower():
-                        boss_player = be
-                        break
-            except Exception:
-                boss_player = None
-
-            if boss_player:
-                boss_dps = round(boss_player["total"] / boss_player["activeTime"] * 1000, 2) if boss_player.get("activeTime") else 0
-                boss_damage = boss_player["total"]
-            else:
-                boss_dps = 0
-                boss_damage = 0
-
-            boss_fights.append({
-                "fightId": fight_id,
-                "boss": fight_name,
-                "duration": duration_s,
-                "kill": kill,
-                "dps": boss_dps,
-                "damage": boss_damage,
-            })
+def _store_pieces(fetched):
+    for piece, piece_data in fetched.items():
+        ttl = ttl_for(piece_data)
+        report_cache.put(_piece_key(piece), piece.report_code, piece.kind, piece_data, ttl)
+        http_cache.note_ttl(ttl)
 
-        # Build gear export from this log (first log where player appears = most recent)
-        if latest_export is None:
-            gear_raw = player_entry.get("gear", [])
-            items = []
-            gear_display = []
-            seen_slots = set()
-            for piece in gear_raw:
-                slot = piece.get("slot")
-                item_id = piece.get("id", 0)
-                if slot is None or item_id == 0 or slot in seen_slots:
-                    continue
-                seen_slots.add(slot)
-                item = {"slot": slot, "id": item_id}
-                enchant = piece.get("permanentEnchant")
-                if enchant:
-                    item["enchant"] = enchant
-                gems_raw = piece.get("gems", [])
-                if gems_raw:
-                    gem_ids = [g.get("id") for g in gems_raw if g.get("id")]
-                    if gem_ids:
-                        item["gems"] = gem_ids
-                items.append(item)
-
-                # Detailed display info
-                gear_display.append({
-                    "slot": slot,
-                    "id": item_id,
-                    "name": piece.get("name", "Empty"),
-                    "ilvl": piece.get("itemLevel", 0),
-                    "enchant": piece.get("permanentEnchantName", ""),
-                    "quality": piece.get("quality", 0),
-                })
-
-            items.sort(key=lambda x: x["slot"])
-            gear_display.sort(key=lambda x: x["slot"])
-
-            # Compute avg ilvl (exclude shirt=3, tabard=18)
-            ilvl_items = [g for g in gear_display if g["slot"] not in (3, 18) and g["ilvl"] not in (0, 1)]
-            avg_ilvl = round(sum(g["ilvl"] for g in ilvl_items) / max(1, len(ilvl_items)), 1)
-
-            latest_export = {
-                "name": player_entry["name"],
-                "class": CLASS_ID_MAP.get(player_class, 0),
-                "className": player_class,
-                "spec": player_icon.split("-")[-1] if "-" in player_icon else "",
-                "gear": items,
-                "gearDisplay": gear_display,
-                "avgIlvl": avg_ilvl,
-            }
 
-        result.append({
-            "reportCode": code,
-            "title": title,
-            "zone": zone_name,
-            "overallDps": overall_dps,
-            "bosses": boss_fights,
-        })
+def fetch_report_pieces(token, pieces):
+    """Fetch many report tables/fight lists in as few aliased requests as possible.
 
+    Cached pieces are served locally; the rest go upstream at most
+    BATCH_MAX_FIELDS per request and are written back to the cache.
+    """
+    results, misses = _cached_pieces(pieces)
+    for chunk in _chunks(misses, BATCH_MAX_FIELDS):
+        request, aliases = queries.batched_report_pieces(chunk)
+        fetched = _split_batched_response(_graphql_post(_auth_headers(token), request), aliases)
+        _store_pieces(fetched)
+        results.update(fetched)
+    return results
+
+
+def _throughput(entry):
+    return round(entry["total"] / entry["activeTime"] * 1000, 2) if entry.get("activeTime") else 0
+
+
+def _boss_fight_row(fight, boss_player):
+    """Per-boss DPS row for the player, zeroed when they were absent from the pull."""
+    start = fight.get("startTime", 0)
+    end = fight.get("endTime", 0)
+    boss_pct = fight.get("bossPercentage", None)
+    return {
+        "fightId": fight["id"],
+        "boss": fight.get("name", "Unknown"),
+        "duration": round((end - start) / 1000, 1),
+        "kill": boss_pct == 0 if boss_pct is not None else None,
+        "dps": _throughput(boss_player) if boss_player else 0,
+        "damage": boss_player["total"] if boss_player else 0,
+    }
+
+
+def _player_export(player_entry, report_code=None):
+    """Build the WoWSims export and gear display for a player's table entry."""
+    player_class = player_entry.get("type", "Unknown")
+    decoded = gear.decoded(player_entry, report_code)
+    return {
+        "name": player_entry["name"],
+        "class": CLASS_ID_MAP.get(player_class, 0),
+        "className": player_class,
+        "spec": spec_of(player_entry),
+        "gear": gear.wowsims_items(decoded),
+        "gearDisplay": gear.display_items(decoded),
+        "avgIlvl": round(decoded.avg_ilvl, 1),
+    }
+
+
+def _report_row(report, overall_dps, boss_fights):
+    return {
+        "reportCode": report["code"],
+        "title": report["title"],
+        "zone": report["zone"]["name"] if report.get("zone") else "Unknown",
+        "overallDps": overall_dps,
+        "bosses": boss_fights,
+    }
+
+
+def _player_summary_result(player_name, latest_export, logs, errors=()):
     return {
         "player": player_name,
         "playerClass": latest_export.get("className") if latest_export else None,
         "spec": latest_export.get("spec") if latest_export else None,
         "export": latest_export,
-        "logs": result,
+        "logs": logs,
+        "errors": list(errors),
+    }
+
+
+def _bundle_pieces(report_code, fight_ids=None):
+    fight_ids = tuple(fight_ids) if fight_ids else None
+    return [
+        ReportPiece("fights", report_code),
+        ReportPiece("table", report_code, "DamageDone", fight_ids),
+        ReportPiece("table", report_code, "Healing", fight_ids),
+    ]
+
+
+def _report_bundle(pieces, fetched):
+    """Derive every ReportDetail view from one fights list and two tables."""
+    missing = [piece for piece in pieces if piece not in fetched]
+    if missing:
+        raise ValueError(f"Report {missing[0].report_code} returned no {missing[0].kind} data")
+    fights_piece, damage_piece, healing_piece = pieces
+    damage_entries = _piece_entries(fetched[damage_piece])
+    return {
+        "fights": _summarize_fights(fetched[fights_piece]["data"]["reportData"]["report"]["fights"]),
+        "dps": _dps_rows(damage_entries),
+        "healing": _healing_rows(_piece_entries(fetched[healing_piece])),
+        "gear": _gear_rows(damage_entries, damage_piece.report_code, damage_piece.fight_ids),
+        "wowsimsExport": _wowsims_rows(damage_entries, damage_piece.report_code, damage_piece.fight_ids),
     }
 
 
+def get_report_bundle(report_code, fight_ids=None):
+    """Fights, DPS, healing, gear and WoWSims export for a report in one upstream request.
 
+    The fights list always covers the whole report; `fight_ids` only narrows
+    the DamageDone and Healing tables the other views are derived from.
+    """
+    token = get_access_token()
+    pieces = _bundle_pieces(report_code, fight_ids)
+    return _report_bundle(pieces, fetch_report_pieces(token, pieces))
+
+
+def _piece_entries(piece_data):
+    if piece_data is None:
+        return None
+    return piece_data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+
+
+def _summary_overview_pieces(reports):
+    pieces = []
+    for report in reports:
+        pieces.append(ReportPiece("table", report["code"], "DamageDone"))
+        pieces.append(ReportPiece("fights", report["code"]))
+    return pieces
 
+
+def _summary_appearances(reports, overview, player_name):
+    """Return (report, player_entry, boss_fights) for each report the player is in."""
+    appearances = []
+    for report in reports:
+        code = report["code"]
+        entries = _piece_entries(overview.get(ReportPiece("table", code, "DamageDone")))
+        if entries is None:
+            continue
+        player_entry = _find_by_name(entries, player_name)
+        if not player_entry:
+            continue
+        fights_data = overview.get(ReportPiece("fights", code))
+        fights = fights_data["data"]["reportData"]["report"]["fights"] if fights_data else []
+        boss_fights = [fight for fight in fights if fight.get("encounterID", 0) != 0]
+        appearances.append((report, player_entry, boss_fights))
+    return appearances
+
+
+def _summary_boss_pieces(appearances):
+    return [
+        ReportPiece("table", report["code"], "DamageDone", (fight["id"],))
+        for report, _, boss_fights in appearances
+        for fight in boss_fights
+    ]
+
+
+def _summary_rows(appearances, boss_tables, player_name):
+    """Build the per-report rows for a batch of appearances."""
+    rows = []
+    for report, player_entry, boss_fights in appearances:
+        rows_for_report = []
+        for fight in boss_fights:
+            boss_entries = _piece_entries(boss_tables.get(
+                ReportPiece("table", report["code"], "DamageDone", (fight["id"],))
+            ))
+            boss_player = _find_by_name(boss_entries, player_name) if boss_entries else None
+            rows_for_report.append(_boss_fight_row(fight, boss_player))
+        rows.append(_report_row(report, _throughput(player_entry), rows_for_report))
+    return rows
+
+
+def _batch_codes(reports):
+    return [report["code"] for report in reports]
+
+
+def _fan_out_errors(run):
+    """Flatten fan-out failures over report batches into per-report errors."""
+    errors = []
+    for failure in run.failures:
+        codes = failure["item"] if isinstance(failure["item"], list) else [failure["item"]]
+        errors.extend({"reportCode": code, "error": failure["error"]} for code in codes)
+    return errors
+
+
+def _summarize_batch(token, batch, player_name):
+    overview = fetch_report_pieces(token, _summary_overview_pieces(batch))
+    appearances = _summary_appearances(batch, overview, player_name)
+    boss_tables = fetch_report_pieces(token, _summary_boss_pieces(appearances))
+    return appearances, _summary_rows(appearances, boss_tables, player_name)
+
+
+class _SummaryStream:
+    """Turns ordered per-batch results into player-summary stream frames.
+
+    Frames are dicts with a "type": "player" (class, spec and gear export,
+    from the newest report the player appears in), one "log" per report,
+    "error" for reports whose batch failed, and a closing "summary".
+    """
+
+    def __init__(self, player_name):
+        self.player_name = player_name
+        self.player = None
+        self.logs = 0
+        self.errors = []
+
+    def batch(self, batch, outcome, error):
+        if error is not None:
+            for code in _batch_codes(batch):
+                failure = {"reportCode": code, "error": error}
+                self.errors.append(failure)
+                yield {"type": "error", **failure}
+            return
+        appearances, rows = outcome
+        if self.player is None and appearances:
+            report, entry, _ = appearances[0]
+            export = _player_export(entry, report["code"])
+            self.player = {
+                "player": self.player_name,
+                "playerClass": export.get("className"),
+                "spec": export.get("spec"),
+                "export": export,
+            }
+            yield {"type": "player", **self.player}
+        for row in rows:
+            self.logs += 1
+            yield {"type": "log", "log": row}
+
+    def summary(self):
+        player = self.player or {"player": self.player_name, "playerClass": None, "spec": None}
+        return {
+            "type": "summary",
+            "player": player["player"],
+            "playerClass": player["playerClass"],
+            "spec": player["spec"],
+            "logs": self.logs,
+            "errors": self.errors,
+        }
+
+
+def _player_summary_from_frames(player_name, frames):
+    """Fold stream frames back into the non-streaming player-summary response."""
+    export = None
+    logs = []
+    errors = []
+    for frame in frames:
+        if frame["type"] == "player":
+            export = frame["export"]
+        elif frame["type"] == "log":
+            logs.append(frame["log"])
+        elif frame["type"] == "summary":
+            errors = frame["errors"]
+    return _player_summary_result(player_name, export, logs, errors)
+
+
+def iter_player_summary(guild, server, region, player_name):
+    """Yield player-summary frames (see _SummaryStream) as reports complete.
+
+    The guild's whole history is read page by page (up to
+    GUILD_HISTORY_MAX_PAGES) and split into batches of BATCH_REPORTS which run
+    concurrently:
+    each batch makes one aliased request for every overall table and fight
+    list, and one for every boss fight table of the reports the player is in.
+    Batches are emitted newest first and dropped once emitted, so memory does
+    not grow with the number of logs.
+    """
+    token = get_access_token()
+    reports = iter_guild_reports(token, guild, server, region)
+
+    stream = _SummaryStream(player_name)
+    for batch, outcome, error in fan_out_threads_ordered(
+        _chunks(reports, BATCH_REPORTS),
+        lambda batch: _summarize_batch(token, batch, player_name),
+    ):
+        yield from stream.batch(batch, outcome, error)
+    yield stream.summary()
+
+
+def get_player_summary(guild, server, region, player_name):
+    """Get per-log + per-boss DPS for a specific player across guild logs.
+
+    Batches that fail are listed under "errors" instead of being dropped.
+    """
+    return _player_summary_from_frames(player_name, iter_player_summary(guild, server, region, player_name))
+
+
+# ---- Baseline warm-up ----
+
+def baseline_targets(token, guild, server, region, reports=BASELINE_WARM_REPORTS):
+    """(encounter, class, spec, metric) combos seen in a guild's most recent reports."""
+    data = fetch_all_logs(token, guild, server, region)
+    codes = [report["code"] for report in data["data"]["reportData"]["reports"]["data"][:reports]]
+    fights = fetch_report_pieces(token, [ReportPiece("fights", code) for code in codes])
+
+    encounter_of = {}
+    for piece, fights_data in fights.items():
+        for fight in fights_data["data"]["reportData"]["report"]["fights"]:
+            if fight.get("encounterID", 0) == 0:
+                continue
+            for data_type in ("DamageDone", "Healing"):
+                encounter_of[ReportPiece("table", piece.report_code, data_type, (fight["id"],))] = fight["encounterID"]
+
+    targets = set()
+    for piece, table_data in fetch_report_pieces(token, list(encounter_of)).items():
+        metric = "dps" if piece.data_type == "DamageDone" else "hps"
+        for entry in table_data["data"]["reportData"]["report"]["table"]["data"]["entries"]:
+            spec = spec_of(entry)
+            # Everyone shows up in the healing table; only healers compare on HPS.
+            if metric == "hps" and spec not in HEALER_SPECS:
+                continue
+            targets.add((encounter_of[piece], entry.get("type", "Unknown"), spec, metric))
+    return sorted(targets)
+
+
+def warm_baselines(guild, server, region):
+    """Fill the baseline cache for every encounter/spec the guild recently fought."""
+    token = get_access_token()
+    targets = baseline_targets(token, guild, server, region)
+    run = fan_out_threads(targets, lambda target: get_baseline(token, *target), label=list)
+    return {"targets": len(targets), "errors": run.failures}
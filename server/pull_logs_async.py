@@ -0,0 +1,423 @@
+"""Asyncio versions of the pull_logs fetchers used by the FastAPI endpoints.
+
+Queries and response shaping are shared with pull_logs, which stays the
+synchronous facade for scripts; only the transport differs.
+"""
+import asyncio
+import logging
+import time
+
+import async_http_client
+import metrics
+import pull_logs
+import queries
+from dag import EarlyExit, Step, run_dag
+from fan_out import fan_out_ordered
+from rate_limiter import RATE_LIMIT_RETRIES, estimate_cost, rate_budget
+from report_cache import report_cache, query_signature, ttl_for
+from shared_cache import shared_flight
+from single_flight import async_single_flight, query_key
+import timeline
+from pull_logs import (
+    BATCH_MAX_FIELDS,
+    BATCH_REPORTS,
+    GUILD_HISTORY_MAX_PAGES,
+    GUILD_HISTORY_PAGE_SIZE,
+    GUILD_PAGE_SIZE,
+    GUILD_PAGE_TTL_S,
+    GRAPHQL_ENDPOINT,
+    _apply_rate_limit_data,
+    _operation,
+    _auth_headers,
+    _guild_page_anchor,
+    _guild_page_result,
+    decode_cursor,
+    _zone_counts,
+    _summarize_fights,
+    _dps_rows,
+    _healing_rows,
+    _gear_rows,
+    _wowsims_rows,
+    _extract_abilities,
+    spec_of,
+    _find_by_name,
+    _metric_data_type,
+    _baseline_key,
+    _top_rank,
+    _top_actor,
+    _compare_fight,
+    _compare_player,
+    _compare_baseline,
+    _compare_response,
+    _timeline_result,
+    _chunks,
+    _split_batched_response,
+    _cached_pieces,
+    _baseline_ttl,
+    _noted,
+    _store_pieces,
+    _summary_overview_pieces,
+    _summary_appearances,
+    _summary_boss_pieces,
+    _summary_rows,
+    _SummaryStream,
+    _player_summary_from_frames,
+    _bundle_pieces,
+    _report_bundle,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def get_access_token():
+    """Return the shared API token without blocking the loop on the fast path.
+
+    Refreshes are rare and go through the thread-safe TokenProvider in a worker
+    thread, so sync and async callers still share one in-flight refresh.
+    """
+    token = pull_logs._token_provider.peek()
+    if token:
+        return token
+    return await asyncio.to_thread(pull_logs.get_access_token)
+
+
+async def _post(operation, url, **kwargs):
+    """Async twin of pull_logs._post."""
+    started = time.perf_counter()
+    with metrics.upstream_in_flight.track(operation=operation):
+        try:
+            response = await async_http_client.post(url, **kwargs)
+        except Exception:
+            metrics.record_upstream(operation, "error", started)
+            raise
+    metrics.record_upstream(operation, response.status_code, started)
+    return response
+
+
+async def _refresh_rate_budget(headers):
+    """Async twin of pull_logs._refresh_rate_budget."""
+    try:
+        response = await _post("rateLimit", GRAPHQL_ENDPOINT, json={"query": queries.RATE_LIMIT}, headers=headers)
+        response.raise_for_status()
+        _apply_rate_limit_data(response.json())
+    except Exception:
+        logger.warning("could not read rateLimitData", exc_info=True)
+        rate_budget.refresh_failed()
+    finally:
+        rate_budget.end_refresh()
+
+
+async def _graphql_post(headers, request):
+    """Async twin of pull_logs._graphql_post; identical in-flight queries share one call."""
+    key = query_key(*request)
+    return await async_single_flight.do(
+        key, lambda: shared_flight.do_async(key, lambda: _send_query(headers, request))
+    )
+
+
+async def _send_query(headers, request):
+    """Async twin of pull_logs._send_query, including the 401 retry and budget."""
+    if rate_budget.claim_refresh():
+        await _refresh_rate_budget(headers)
+    operation = _operation(request.query)
+    body = {"query": request.query, "variables": request.variables}
+    cost = estimate_cost(request.query)
+    response = await _post_query(operation, body, headers, cost)
+    if response.status_code == 401:
+        stale_token = headers.get("Authorization", "").removeprefix("Bearer ")
+        pull_logs.invalidate_token(stale_token)
+        headers = {**headers, "Authorization": f"Bearer {await get_access_token()}"}
+        response = await _post_query(operation, body, headers, cost)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _post_query(operation, body, headers, cost):
+    """Async twin of pull_logs._post_query."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await rate_budget.acquire_async(cost, refresh=lambda: _refresh_rate_budget(headers))
+        response = await _post(operation, GRAPHQL_ENDPOINT, json=body, headers=headers)
+        rate_budget.observe(response.status_code, response.headers)
+        if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            return response
+        metrics.record_retry(response.status_code)
+
+
+async def _cached_report_query(headers, request, kind, report_code, **params):
+    """Async twin of pull_logs._cached_report_query; cache I/O runs in a thread."""
+    key = query_signature(kind, report_code, **params)
+    return _noted(await async_single_flight.do(key, lambda: _read_through(key, headers, request, kind, report_code)))
+
+
+async def _read_through(key, headers, request, kind, report_code, ttl=None):
+    cached = await asyncio.to_thread(report_cache.get, key)
+    if cached is not None:
+        return cached
+    data = await _graphql_post(headers, request)
+    if not data.get("errors"):
+        ttl = ttl if ttl is not None else ttl_for(data)
+        await asyncio.to_thread(report_cache.put, key, report_code, kind, data, ttl)
+    return data
+
+
+async def fetch_all_logs(token, guild, server, region, limit=100):
+    return await _graphql_post(_auth_headers(token), queries.guild_reports(guild, server, region, limit=limit))
+
+
+async def fetch_guild_reports_page(token, guild, server, region, page=1, limit=GUILD_PAGE_SIZE, zone_id=None, start_time=None, end_time=None):
+    """Async twin of pull_logs.fetch_guild_reports_page."""
+    scope = f"{guild}/{server}/{region}".lower()
+    params = {"page": page, "limit": limit, "zoneID": zone_id, "startTime": start_time, "endTime": end_time}
+    key = query_signature("guild-page", scope, **params)
+    request = queries.guild_reports(guild, server, region, page, limit, zone_id, start_time, end_time)
+    data = await async_single_flight.do(
+        key, lambda: _read_through(key, _auth_headers(token), request, "guild-page", scope, GUILD_PAGE_TTL_S)
+    )
+    return _noted(data, GUILD_PAGE_TTL_S)
+
+
+async def iter_guild_reports(token, guild, server, region, zone_id=None, start_time=None, end_time=None, max_pages=GUILD_HISTORY_MAX_PAGES):
+    """Async twin of pull_logs.iter_guild_reports."""
+    anchor = _guild_page_anchor(end_time)
+    for page in range(1, max_pages + 1):
+        data = await fetch_guild_reports_page(
+            token, guild, server, region, page, GUILD_HISTORY_PAGE_SIZE, zone_id, start_time, anchor
+        )
+        reports_page = data["data"]["reportData"]["reports"]
+        for report in reports_page["data"]:
+            yield report
+        if not reports_page.get("has_more_pages"):
+            break
+
+
+async def _chunks_async(items, size):
+    """Async twin of pull_logs._chunks for async iterables."""
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= max(1, size):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def fetch_table(token, report_code, data_type="DamageDone", fight_ids=None):
+    return await _cached_report_query(
+        _auth_headers(token), queries.report_table(report_code, data_type, fight_ids),
+        "table", report_code, dataType=data_type, fightIDs=fight_ids,
+    )
+
+
+async def fetch_dps_table(token, report_code, fight_ids=None):
+    return await fetch_table(token, report_code, "DamageDone", fight_ids)
+
+
+async def fetch_fights(token, report_code):
+    """Async twin of pull_logs.fetch_fights."""
+    return await _cached_report_query(_auth_headers(token), queries.report_fights(report_code), "fights", report_code)
+
+
+async def fetch_master_data(token, report_code):
+    return await _cached_report_query(_auth_headers(token), queries.report_master_data(report_code), "masterData", report_code)
+
+
+async def fetch_graph(token, report_code, fight_id, source_id=None, data_type="DamageDone"):
+    return await _cached_report_query(
+        _auth_headers(token), queries.report_graph(report_code, fight_id, source_id, data_type),
+        "graph", report_code, dataType=data_type, fightIDs=[fight_id], sourceID=source_id,
+    )
+
+
+async def fetch_rankings(token, encounter_id, class_name, spec_name, metric="dps"):
+    return await _graphql_post(_auth_headers(token), queries.rankings(encounter_id, class_name, spec_name, metric))
+
+
+async def fetch_player_abilities(token, report_code, fight_id, source_id, data_type="DamageDone"):
+    return await _cached_report_query(
+        _auth_headers(token),
+        queries.report_table(report_code, data_type, [fight_id], source_id, end_time=queries.GRAPH_END_TIME),
+        "table", report_code, dataType=data_type, fightIDs=[fight_id], sourceID=source_id,
+    )
+
+
+async def fetch_report_pieces(token, pieces):
+    """Fetch many report tables/fight lists in as few aliased requests as possible."""
+    results, misses = await asyncio.to_thread(_cached_pieces, pieces)
+    for chunk in _chunks(misses, BATCH_MAX_FIELDS):
+        request, aliases = queries.batched_report_pieces(chunk)
+        fetched = _split_batched_response(await _graphql_post(_auth_headers(token), request), aliases)
+        await asyncio.to_thread(_store_pieces, fetched)
+        results.update(fetched)
+    return results
+
+
+async def summarize_zone_counts(guild, server, region="US"):
+    token = await get_access_token()
+    return _zone_counts([report async for report in iter_guild_reports(token, guild, server, region)])
+
+
+async def get_guild_logs(guild, server, region="US", cursor=None, zone_id=None, start_time=None, end_time=None, limit=GUILD_PAGE_SIZE):
+    """Async twin of pull_logs.get_guild_logs."""
+    token = await get_access_token()
+    anchor, page = decode_cursor(cursor) if cursor else (_guild_page_anchor(end_time), 1)
+    data = await fetch_guild_reports_page(token, guild, server, region, page, limit, zone_id, start_time, anchor)
+    return _guild_page_result(data, anchor, page)
+
+
+async def get_fights(report_code):
+    token = await get_access_token()
+    data = await fetch_fights(token, report_code)
+    return _summarize_fights(data["data"]["reportData"]["report"]["fights"])
+
+
+async def _table_entries(report_code, data_type="DamageDone", fight_ids=None):
+    token = await get_access_token()
+    data = await fetch_table(token, report_code, data_type, fight_ids)
+    return data["data"]["reportData"]["report"]["table"]["data"]["entries"]
+
+
+async def get_dps_data(report_code, fight_ids=None):
+    return _dps_rows(await _table_entries(report_code, "DamageDone", fight_ids))
+
+
+async def get_healing_data(report_code, fight_ids=None):
+    return _healing_rows(await _table_entries(report_code, "Healing", fight_ids))
+
+
+async def get_gear_data(report_code, fight_ids=None):
+    return _gear_rows(await _table_entries(report_code, "DamageDone", fight_ids), report_code, fight_ids)
+
+
+async def get_wowsims_export(report_code, fight_ids=None):
+    """Return per-player gear in WoWSims addon-import JSON format."""
+    return _wowsims_rows(await _table_entries(report_code, "DamageDone", fight_ids), report_code, fight_ids)
+
+
+async def get_report_bundle(report_code, fight_ids=None):
+    """Fights, DPS, healing, gear and WoWSims export for a report in one upstream request."""
+    token = await get_access_token()
+    pieces = _bundle_pieces(report_code, fight_ids)
+    return _report_bundle(pieces, await fetch_report_pieces(token, pieces))
+
+
+async def _fetch_baseline(token, encounter_id, class_name, spec_name, metric):
+    rankings_data = await fetch_rankings(token, encounter_id, class_name, spec_name, metric)
+    top_rank, error = _top_rank(rankings_data, class_name, spec_name)
+    if error:
+        return error
+    top_report_code = top_rank["report"]["code"]
+    top_actor, error = _top_actor(await fetch_master_data(token, top_report_code), top_rank)
+    if error:
+        return error
+    top_abilities_data = await fetch_player_abilities(
+        token, top_report_code, top_rank["report"]["fightID"], top_actor["id"], _metric_data_type(metric)
+    )
+    return {"topRank": top_rank, "abilities": _extract_abilities(top_abilities_data)}
+
+
+async def _read_through_baseline(key, token, encounter_id, class_name, spec_name, metric):
+    cached = await asyncio.to_thread(report_cache.get, key)
+    if cached is not None:
+        return cached
+    baseline = await _fetch_baseline(token, encounter_id, class_name, spec_name, metric)
+    await asyncio.to_thread(
+        report_cache.put, key, f"encounter-{encounter_id}", "baseline", baseline, _baseline_ttl(baseline)
+    )
+    return baseline
+
+
+async def get_baseline(token, encounter_id, class_name, spec_name, metric="dps"):
+    """Async twin of pull_logs.get_baseline."""
+    key = _baseline_key(encounter_id, class_name, spec_name, metric)
+    return await async_single_flight.do(
+        key, lambda: _read_through_baseline(key, token, encounter_id, class_name, spec_name, metric)
+    )
+
+
+async def get_compare_data(report_code, fight_id, player_name, metric="dps", debug=False):
+    """Async twin of pull_logs.get_compare_data."""
+    token = await get_access_token()
+    data_type = _metric_data_type(metric)
+
+    async def fight(results):
+        return _compare_fight(await fetch_fights(token, report_code), fight_id)
+
+    async def table(results):
+        return await fetch_table(token, report_code, data_type, [fight_id])
+
+    async def master_data(results):
+        return await fetch_master_data(token, report_code)
+
+    async def player(results):
+        return _compare_player(results["table"], results["masterData"], player_name)
+
+    async def abilities(results):
+        source_id = results["player"][1]["id"]
+        return _extract_abilities(await fetch_player_abilities(token, report_code, fight_id, source_id, data_type))
+
+    async def baseline(results):
+        player_entry = results["player"][0]
+        try:
+            found = await get_baseline(
+                token, results["fight"]["encounterID"], player_entry.get("type", "Unknown"),
+                spec_of(player_entry), metric,
+            )
+        except Exception as e:
+            raise EarlyExit({"error": f"Failed to fetch rankings: {str(e)}"})
+        return _compare_baseline(found)
+
+    run = await run_dag({
+        "fight": Step((), fight),
+        "table": Step((), table),
+        "masterData": Step((), master_data),
+        "player": Step(("fight", "table", "masterData"), player),
+        "abilities": Step(("player",), abilities),
+        "baseline": Step(("fight", "player"), baseline),
+    })
+    return _compare_response(run, metric, player_name, debug)
+
+
+async def get_timeline(report_code, fight_id, player_name=None, metric="dps", points=timeline.DEFAULT_POINTS, method="lttb"):
+    """Async twin of pull_logs.get_timeline; fights and actors are fetched together."""
+    token = await get_access_token()
+    if player_name:
+        fights_data, master_data = await asyncio.gather(
+            fetch_fights(token, report_code), fetch_master_data(token, report_code)
+        )
+        actor = _find_by_name(master_data["data"]["reportData"]["report"]["masterData"]["actors"], player_name)
+        if not actor:
+            return {"error": "Player actor not found"}
+        source_id = actor["id"]
+    else:
+        fights_data, source_id = await fetch_fights(token, report_code), None
+    graph_data = await fetch_graph(token, report_code, fight_id, source_id, _metric_data_type(metric))
+    return _timeline_result(fights_data, fight_id, graph_data, player_name, metric, points, method)
+
+
+async def _summarize_batch(token, batch, player_name):
+    overview = await fetch_report_pieces(token, _summary_overview_pieces(batch))
+    appearances = _summary_appearances(batch, overview, player_name)
+    boss_tables = await fetch_report_pieces(token, _summary_boss_pieces(appearances))
+    return appearances, _summary_rows(appearances, boss_tables, player_name)
+
+
+async def iter_player_summary(guild, server, region, player_name):
+    """Async twin of pull_logs.iter_player_summary."""
+    token = await get_access_token()
+    reports = iter_guild_reports(token, guild, server, region)
+
+    stream = _SummaryStream(player_name)
+    async for batch, outcome, error in fan_out_ordered(
+        _chunks_async(reports, BATCH_REPORTS),
+        lambda batch: _summarize_batch(token, batch, player_name),
+    ):
+        for frame in stream.batch(batch, outcome, error):
+            yield frame
+    yield stream.summary()
+
+
+async def get_player_summary(guild, server, region, player_name):
+    """Get per-log + per-boss DPS for a specific player across guild logs."""
+    frames = [frame async for frame in iter_player_summary(guild, server, region, player_name)]
+    return _player_summary_from_frames(player_name, frames)
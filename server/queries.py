@@ -0,0 +1,184 @@
+"""GraphQL documents for the Warcraft Logs API and the variables to send with them.
+
+Documents are fixed texts, whitespace-normalized once when this module is
+imported; report codes, guild names, fight ids and the like travel as
+GraphQL variables, so caller input is never spliced into a query and equal
+requests hash equally (single_flight.query_key). Builders return a
+Request(query, variables) pair.
+
+Report fight lists are projected to FIGHT_FIELDS, the union of what every
+reader in this tree uses; one shared projection keeps one cached fight
+list per report. Table and graph results are JSON scalars upstream and
+cannot be narrowed.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+Request = namedtuple("Request", ["query", "variables"])
+
+# Fight attributes read by summaries, compare, timelines and the metrics store.
+FIGHT_FIELDS = ("id", "name", "encounterID", "startTime", "endTime", "difficulty", "bossPercentage")
+TABLE_END_TIME = 100000000
+GRAPH_END_TIME = 100000000000
+
+
+def compile_query(text):
+    """Collapse whitespace so the sent text, and so its hash, never depends on formatting."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+RATE_LIMIT = compile_query("query RateLimit { rateLimitData { limitPerHour pointsSpentThisHour pointsResetIn } }")
+
+GUILD_REPORTS = compile_query("""
+query GuildReports($guild: String, $server: String, $region: String, $limit: Int, $page: Int,
+                   $zoneID: Int, $startTime: Float, $endTime: Float) {
+  reportData {
+    reports(guildName: $guild, guildServerSlug: $server, guildServerRegion: $region, limit: $limit, page: $page,
+            zoneID: $zoneID, startTime: $startTime, endTime: $endTime) {
+      data { code title startTime zone { id name } owner { name } }
+      has_more_pages
+    }
+  }
+}
+""")
+
+REPORTS_WINDOW = compile_query("""
+query ReportsWindow($startTime: Float, $endTime: Float, $page: Int) {
+  reportData {
+    reports(startTime: $startTime, endTime: $endTime, page: $page, limit: 100) {
+      data { code startTime endTime zone { id name } guild { name server { slug region { slug } } } }
+      has_more_pages
+    }
+  }
+}
+""")
+
+REPORT_TABLE = compile_query("""
+query ReportTable($code: String, $dataType: TableDataType, $fightIDs: [Int], $sourceID: Int, $endTime: Float) {
+  reportData {
+    report(code: $code) {
+      endTime
+      table(dataType: $dataType, fightIDs: $fightIDs, sourceID: $sourceID, startTime: 0, endTime: $endTime)
+    }
+  }
+}
+""")
+
+REPORT_GRAPH = compile_query(f"""
+query ReportGraph($code: String, $dataType: GraphDataType, $fightIDs: [Int], $sourceID: Int) {{
+  reportData {{
+    report(code: $code) {{
+      endTime
+      graph(dataType: $dataType, fightIDs: $fightIDs, sourceID: $sourceID, startTime: 0, endTime: {GRAPH_END_TIME})
+    }}
+  }}
+}}
+""")
+
+MASTER_DATA_FIELD = "masterData { actors(type: \"Player\") { id name type subType server } }"
+
+REPORT_MASTER_DATA = compile_query(f"""
+query ReportMasterData($code: String) {{
+  reportData {{ report(code: $code) {{ endTime {MASTER_DATA_FIELD} }} }}
+}}
+""")
+
+RANKINGS = compile_query("""
+query Rankings($encounterID: Int, $className: String, $specName: String, $metric: CharacterRankingMetricType) {
+  worldData {
+    encounter(id: $encounterID) {
+      characterRankings(className: $className, specName: $specName, metric: $metric, page: 1)
+    }
+  }
+}
+""")
+
+
+FIGHTS_FIELD = f"fights {{ {' '.join(FIGHT_FIELDS)} }}"
+
+REPORT_FIGHTS = compile_query(f"""
+query ReportFights($code: String) {{
+  reportData {{ report(code: $code) {{ endTime {FIGHTS_FIELD} }} }}
+}}
+""")
+
+
+def guild_reports(guild, server, region, page=None, limit=100, zone_id=None, start_time=None, end_time=None):
+    return Request(GUILD_REPORTS, {
+        "guild": guild, "server": server, "region": region, "limit": limit, "page": page,
+        "zoneID": zone_id, "startTime": start_time, "endTime": end_time,
+    })
+
+
+def reports_window(start_time, end_time, page_number=1):
+    return Request(REPORTS_WINDOW, {"startTime": start_time, "endTime": end_time, "page": page_number})
+
+
+def report_table(report_code, data_type="DamageDone", fight_ids=None, source_id=None, end_time=TABLE_END_TIME):
+    return Request(REPORT_TABLE, {
+        "code": report_code, "dataType": data_type, "fightIDs": list(fight_ids) if fight_ids else None,
+        "sourceID": source_id, "endTime": end_time,
+    })
+
+
+def report_fights(report_code):
+    return Request(REPORT_FIGHTS, {"code": report_code})
+
+
+def report_master_data(report_code):
+    return Request(REPORT_MASTER_DATA, {"code": report_code})
+
+
+def report_graph(report_code, fight_id, source_id=None, data_type="DamageDone"):
+    return Request(REPORT_GRAPH, {"code": report_code, "dataType": data_type, "fightIDs": [fight_id], "sourceID": source_id})
+
+
+def rankings(encounter_id, class_name, spec_name, metric="dps"):
+    return Request(RANKINGS, {"encounterID": encounter_id, "className": class_name, "specName": spec_name, "metric": metric})
+
+
+@lru_cache(maxsize=256)
+def _batched_document(shape):
+    """Aliased document for `shape`: per report, the piece kinds it selects."""
+    declarations = []
+    blocks = []
+    for r_idx, kinds in enumerate(shape):
+        declarations.append(f"$c{r_idx}: String")
+        fields = []
+        for p_idx, kind in enumerate(kinds):
+            if kind == "fights":
+                field = FIGHTS_FIELD
+            elif kind == "masterData":
+                field = MASTER_DATA_FIELD
+            else:
+                declarations += [f"$t{r_idx}_{p_idx}: TableDataType", f"$f{r_idx}_{p_idx}: [Int]"]
+                field = (f"table(dataType: $t{r_idx}_{p_idx}, fightIDs: $f{r_idx}_{p_idx}, "
+                         f"startTime: 0, endTime: {TABLE_END_TIME})")
+            fields.append(f"p{p_idx}: {field}")
+        blocks.append(f"r{r_idx}: report(code: $c{r_idx}) {{ endTime {' '.join(fields)} }}")
+    return compile_query(f"query Batch({', '.join(declarations)}) {{ reportData {{ {' '.join(blocks)} }} }}")
+
+
+def batched_report_pieces(pieces):
+    """One aliased request for many report pieces, grouped per report.
+
+    Returns the Request and a mapping of piece -> (report alias, field alias).
+    Requests with the same shape share one compiled document.
+    """
+    by_report = {}
+    for piece in pieces:
+        by_report.setdefault(piece.report_code, []).append(piece)
+
+    aliases = {}
+    variables = {}
+    shape = []
+    for r_idx, (report_code, report_pieces) in enumerate(by_report.items()):
+        variables[f"c{r_idx}"] = report_code
+        for p_idx, piece in enumerate(report_pieces):
+            if piece.kind == "table":
+                variables[f"t{r_idx}_{p_idx}"] = piece.data_type
+                variables[f"f{r_idx}_{p_idx}"] = list(piece.fight_ids) if piece.fight_ids else None
+            aliases[piece] = (f"r{r_idx}", f"p{p_idx}")
+        shape.append(tuple(piece.kind for piece in report_pieces))
+    return Request(_batched_document(tuple(shape)), variables), aliases
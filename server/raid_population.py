@@ -0,0 +1,522 @@
+"""Incrementally maintained index of who raided where, for /api/raiding-population.
+
+Ingestion walks public reports forward in fixed time windows from a stored
+watermark, pulls each new report's player actor list (cheap masterData
+rather than a DamageDone table) and stores one row per report and per
+report player. Each report's players are also added to a HyperLogLog sketch
+per UTC day, server, region and zone, so unique raiders over any range of
+days, broken down by server or zone or as a weekly series, are counted by
+merging a few KiB of registers. exact=True answers with COUNT(DISTINCT)
+over the player rows instead, for validating the estimates on small
+windows. Reports that were still live when ingested are re-read on the next
+run until they finish; re-adding their players to a sketch is harmless.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    delete,
+    func,
+    select,
+)
+
+import hll
+import pull_logs
+import shared_cache
+from db import get_engine
+from fan_out import fan_out_threads
+from pull_logs import BATCH_MAX_FIELDS, ReportPiece, _chunks, _fan_out_errors
+from rate_limiter import BACKGROUND, priority
+from report_cache import LIVE_WINDOW_S
+
+logger = logging.getLogger(__name__)
+
+INDEX_URL = os.getenv("WCL_INDEX_URL", "sqlite:///wcl_index.db")
+# Where the first run starts: 2025-05-05 00:00 UTC, the cut-off the old crawl
+# meant to use (its 174641280000 literal was missing a digit).
+SINCE_MS = int(os.getenv("WCL_RAID_POP_SINCE_MS", "1746403200000"))
+WINDOW_MS = int(os.getenv("WCL_RAID_POP_WINDOW_S", str(6 * 60 * 60))) * 1000
+MAX_PAGES_PER_RUN = int(os.getenv("WCL_RAID_POP_MAX_PAGES", "25"))
+# How long after a report starts it may still be uploaded. The watermark
+# stays this far behind now and newer windows are re-listed every run.
+UPLOAD_LAG_MS = int(os.getenv("WCL_RAID_POP_UPLOAD_LAG_S", str(12 * 60 * 60))) * 1000
+REFRESH_INTERVAL_S = int(os.getenv("WCL_RAID_POP_REFRESH", "900"))
+
+metadata = MetaData()
+
+pop_reports = Table(
+    "raid_pop_reports",
+    metadata,
+    Column("code", String(32), primary_key=True),
+    Column("start_time", BigInteger, nullable=False, index=True),
+    Column("end_time", BigInteger),
+    Column("server", String(64), index=True),
+    Column("region", String(8)),
+    Column("zone_id", Integer),
+    Column("zone_name", String(128)),
+    Column("guild", String(128)),
+    Column("final", Boolean, nullable=False),
+)
+
+pop_players = Table(
+    "raid_pop_players",
+    metadata,
+    Column("report_code", String(32), primary_key=True),
+    # "name-server" so same-named characters on different realms stay distinct.
+    Column("player_key", String(160), primary_key=True),
+    Column("name", String(64), nullable=False),
+    Column("server", String(64)),
+)
+
+pop_sketches = Table(
+    "raid_pop_sketches",
+    metadata,
+    # UTC "YYYY-MM-DD" of the reports' start times.
+    Column("day", String(10), primary_key=True),
+    Column("server", String(64), primary_key=True),
+    Column("region", String(8), primary_key=True),
+    # 0 for reports without a zone.
+    Column("zone_id", Integer, primary_key=True),
+    Column("zone_name", String(128)),
+    Column("registers", LargeBinary, nullable=False),
+)
+
+# Breakdowns /api/raiding-population supports, by report column.
+GROUP_COLUMNS = {"server": "server", "zone": "zone_name"}
+
+pop_state = Table(
+    "raid_pop_state",
+    metadata,
+    Column("key", String(32), primary_key=True),
+    Column("value", Text, nullable=False),
+)
+
+_ingest_lock = threading.Lock()
+
+
+def _engine():
+    return get_engine(INDEX_URL, metadata)
+
+
+def normalize_slug(value):
+    """Turn a typed server/region name ("Living Flame") into its slug ("living-flame")."""
+    if not value:
+        return None
+    return value.strip().lower().replace("'", "").replace(" ", "-")
+
+
+def _get_state(conn, key, default=None):
+    value = conn.execute(select(pop_state.c.value).where(pop_state.c.key == key)).scalar()
+    return json.loads(value) if value is not None else default
+
+
+def _set_state(conn, key, value):
+    conn.execute(delete(pop_state).where(pop_state.c.key == key))
+    conn.execute(pop_state.insert().values(key=key, value=json.dumps(value)))
+
+
+def _is_final(end_time_ms):
+    return bool(end_time_ms) and time.time() - end_time_ms / 1000 > LIVE_WINDOW_S
+
+
+def _report_row(report):
+    guild = report.get("guild") or {}
+    server = guild.get("server") or {}
+    zone = report.get("zone") or {}
+    return {
+        "code": report["code"],
+        "start_time": report.get("startTime", 0),
+        "end_time": report.get("endTime"),
+        "server": server.get("slug"),
+        "region": normalize_slug((server.get("region") or {}).get("slug")),
+        "zone_id": zone.get("id"),
+        "zone_name": zone.get("name"),
+        "guild": guild.get("name"),
+    }
+
+
+def _store_players(conn, report_code, report_server, actors):
+    """Replace the report's player rows; returns their player keys."""
+    conn.execute(delete(pop_players).where(pop_players.c.report_code == report_code))
+    rows = {}
+    for actor in actors:
+        server = normalize_slug(actor.get("server")) or report_server
+        key = f"{actor['name']}-{server or ''}"
+        rows[key] = {"report_code": report_code, "player_key": key, "name": actor["name"], "server": server}
+    if rows:
+        conn.execute(pop_players.insert(), list(rows.values()))
+    return list(rows)
+
+
+def _day(time_ms):
+    return datetime.fromtimestamp(time_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _sketch_cell(row):
+    return (_day(row["start_time"]), row["server"] or "", row["region"] or "", row["zone_id"] or 0)
+
+
+def _add_to_sketches(conn, cells):
+    """Fold {(day, server, region, zone_id): (zone_name, player keys)} into the stored sketches."""
+    for (day, server, region, zone_id), (zone_name, player_keys) in cells.items():
+        where = (
+            pop_sketches.c.day == day,
+            pop_sketches.c.server == server,
+            pop_sketches.c.region == region,
+            pop_sketches.c.zone_id == zone_id,
+        )
+        stored = conn.execute(select(pop_sketches.c.registers).where(*where)).scalar()
+        registers = hll.from_bytes(stored) if stored is not None else hll.empty()
+        hll.add(registers, player_keys)
+        conn.execute(delete(pop_sketches).where(*where))
+        conn.execute(pop_sketches.insert().values(
+            day=day, server=server, region=region, zone_id=zone_id, zone_name=zone_name,
+            registers=hll.to_bytes(registers),
+        ))
+
+
+def rebuild_sketches():
+    """Recompute every sketch from the stored player rows, e.g. for an index that predates them."""
+    query = select(
+        pop_reports.c.start_time, pop_reports.c.server, pop_reports.c.region,
+        pop_reports.c.zone_id, pop_reports.c.zone_name, pop_players.c.player_key,
+    ).select_from(pop_reports.join(pop_players, pop_players.c.report_code == pop_reports.c.code))
+    with _engine().begin() as conn:
+        cells = {}
+        for row in conn.execute(query).mappings():
+            cell = cells.setdefault(_sketch_cell(row), (row["zone_name"], []))
+            cell[1].append(row["player_key"])
+        conn.execute(delete(pop_sketches))
+        _add_to_sketches(conn, cells)
+        _set_state(conn, "sketches", {"precisionBits": hll.PRECISION_BITS})
+    return len(cells)
+
+
+def _fetch_actors(token, codes):
+    """Fetch actor lists for many reports with batched masterData requests."""
+    run = fan_out_threads(
+        list(_chunks(codes, BATCH_MAX_FIELDS)),
+        lambda batch: pull_logs.fetch_report_pieces(token, [ReportPiece("masterData", code) for code in batch]),
+        label=list,
+    )
+    fetched = {}
+    for pieces in run.succeeded():
+        for piece, piece_data in pieces.items():
+            fetched[piece.report_code] = piece_data["data"]["reportData"]["report"]
+    return fetched, _fan_out_errors(run)
+
+
+def _ingest(token, reports):
+    """Store reports and their player sets; returns (stored count, errors)."""
+    if not reports:
+        return 0, []
+    rows = {report["code"]: _report_row(report) for report in reports}
+    fetched, errors = _fetch_actors(token, list(rows))
+    with _engine().begin() as conn:
+        for code, report in fetched.items():
+            row = rows[code]
+            row["end_time"] = report.get("endTime") or row["end_time"]
+            row["final"] = _is_final(row["end_time"])
+            conn.execute(delete(pop_reports).where(pop_reports.c.code == code))
+            conn.execute(pop_reports.insert().values(**row))
+            player_keys = _store_players(conn, code, row["server"], report["masterData"]["actors"])
+            _add_to_sketches(conn, {_sketch_cell(row): (row["zone_name"], player_keys)})
+    return len(fetched), errors
+
+
+def _refresh_live(token):
+    """Re-read reports that were still live last time; they may have gained players."""
+    with _engine().connect() as conn:
+        live = conn.execute(select(pop_reports).where(pop_reports.c.final.is_(False))).mappings().all()
+    if not live:
+        return 0, []
+    reports = [{
+        "code": row["code"],
+        "startTime": row["start_time"],
+        "endTime": row["end_time"],
+        "zone": {"id": row["zone_id"], "name": row["zone_name"]},
+        "guild": {"name": row["guild"], "server": {"slug": row["server"], "region": {"slug": row["region"]}}},
+    } for row in live]
+    return _ingest(token, reports)
+
+
+def _unknown(reports):
+    """The listed reports not in the index yet; known live ones are re-read by _refresh_live."""
+    codes = [report["code"] for report in reports]
+    if not codes:
+        return []
+    with _engine().connect() as conn:
+        known = set(conn.execute(select(pop_reports.c.code).where(pop_reports.c.code.in_(codes))).scalars())
+    return [report for report in reports if report["code"] not in known]
+
+
+def ingest_new_reports(max_pages=MAX_PAGES_PER_RUN):
+    """Advance the index from its watermark, at most `max_pages` listing pages per run.
+
+    The watermark only moves past a time window once every report in it was
+    stored, so a failed run is simply retried from the same point. It also
+    stays UPLOAD_LAG_MS behind now: windows after it are listed on every run
+    and reports uploaded late are picked up. A window with more pages than
+    one run's budget resumes at its next page. One run at a time across
+    workers sharing WCL_SHARED_CACHE_URL.
+    """
+    with shared_cache.lock("raid-pop-ingest", REFRESH_INTERVAL_S) as acquired:
+        if not acquired:
+            return {"status": "already running"}
+        return _ingest_new_reports(max_pages)
+
+
+def _ingest_new_reports(max_pages):
+    if not _ingest_lock.acquire(blocking=False):
+        return {"status": "already running"}
+    started = time.time()
+    try:
+        token = pull_logs.get_access_token()
+        with _engine().connect() as conn:
+            watermark = _get_state(conn, "watermark", SINCE_MS)
+            # {"start", "page"}: where a window the page budget cut short resumes.
+            resume = _get_state(conn, "resume")
+            sketches = _get_state(conn, "sketches")
+        if sketches != {"precisionBits": hll.PRECISION_BITS}:
+            rebuild_sketches()
+
+        ingested, errors = _refresh_live(token)
+        now_ms = int(time.time() * 1000)
+        settled_ms = now_ms - UPLOAD_LAG_MS
+        window_start = watermark
+        pages = 0
+        while window_start < now_ms and pages < max_pages:
+            window_end = min(window_start + WINDOW_MS, now_ms)
+            page_number = resume["page"] if resume and resume["start"] == window_start else 1
+            listed = []
+            has_more = True
+            while has_more and pages < max_pages:
+                data = pull_logs.fetch_reports_window(token, window_start, window_end, page_number)
+                reports_page = data["data"]["reportData"]["reports"]
+                listed.extend(reports_page["data"])
+                pages += 1
+                has_more = reports_page.get("has_more_pages")
+                page_number += 1
+
+            stored, window_errors = _ingest(token, _unknown(listed))
+            ingested += stored
+            errors.extend(window_errors)
+            if window_errors:
+                break
+            if has_more:
+                # Resume by page only where the listing no longer changes.
+                if window_start == watermark and window_end <= settled_ms:
+                    resume = {"start": window_start, "page": page_number}
+                    with _engine().begin() as conn:
+                        _set_state(conn, "resume", resume)
+                break
+            if window_end <= settled_ms:
+                watermark = window_end
+                with _engine().begin() as conn:
+                    _set_state(conn, "watermark", watermark)
+                    _set_state(conn, "resume", None)
+            window_start = window_end
+
+        last_run = {
+            "finishedAt": int(time.time() * 1000),
+            "durationS": round(time.time() - started, 2),
+            "pages": pages,
+            "ingested": ingested,
+            "watermark": watermark,
+            "errors": errors,
+        }
+    except Exception as e:
+        logger.exception("raiding population ingestion failed")
+        last_run = {"finishedAt": int(time.time() * 1000), "errors": [{"error": f"{type(e).__name__}: {e}"}]}
+    finally:
+        _ingest_lock.release()
+
+    with _engine().begin() as conn:
+        _set_state(conn, "last_run", last_run)
+    return last_run
+
+
+def refresh_in_background():
+    """Start an ingestion run in a daemon thread if the index is stale and none is running.
+
+    Returns whether an ingestion run is under way, so answers read from a
+    stale index can say newer reports are still coming.
+    """
+    if _ingest_lock.locked():
+        return True
+    with _engine().connect() as conn:
+        last_run = _get_state(conn, "last_run", {})
+    if time.time() * 1000 - last_run.get("finishedAt", 0) < REFRESH_INTERVAL_S * 1000:
+        return False
+    threading.Thread(target=_ingest_in_background, name="raid-pop-ingest", daemon=True).start()
+    return True
+
+
+def _ingest_in_background():
+    with priority(BACKGROUND):
+        ingest_new_reports()
+
+
+def _day_start_ms(day):
+    return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _widen_to_days(start_time, end_time):
+    """Stretch a time range to the whole UTC days sketches are kept for."""
+    if start_time is not None:
+        start_time = _day_start_ms(_day(start_time))
+    if end_time is not None:
+        end_time = _day_start_ms(_day(end_time)) + 24 * 60 * 60 * 1000 - 1
+    return start_time, end_time
+
+
+def _report_conditions(server, region, zone_id, start_time, end_time):
+    conditions = []
+    if server:
+        conditions.append(pop_reports.c.server == normalize_slug(server))
+    if region:
+        conditions.append(pop_reports.c.region == normalize_slug(region))
+    if zone_id is not None:
+        conditions.append(pop_reports.c.zone_id == zone_id)
+    if start_time is not None:
+        conditions.append(pop_reports.c.start_time >= start_time)
+    if end_time is not None:
+        conditions.append(pop_reports.c.start_time <= end_time)
+    return conditions
+
+
+def _sketch_rows(conn, server, region, zone_id, start_time, end_time):
+    conditions = []
+    if server:
+        conditions.append(pop_sketches.c.server == normalize_slug(server))
+    if region:
+        conditions.append(pop_sketches.c.region == normalize_slug(region))
+    if zone_id is not None:
+        conditions.append(pop_sketches.c.zone_id == zone_id)
+    if start_time is not None:
+        conditions.append(pop_sketches.c.day >= _day(start_time))
+    if end_time is not None:
+        conditions.append(pop_sketches.c.day <= _day(end_time))
+    return conn.execute(select(pop_sketches).where(*conditions)).mappings().all()
+
+
+def _merged_estimates(rows, group_of):
+    """Estimated unique raiders per group, merging the sketches of each group's rows."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(group_of(row), []).append(hll.from_bytes(row["registers"]))
+    return {group: hll.estimate(hll.merge(sketches)) for group, sketches in groups.items()}
+
+
+def _grouped_counts(conn, conditions, group_by, exact):
+    """(report counts, exact unique raiders or None) keyed by group value, or by None when ungrouped."""
+    group = [pop_reports.c[GROUP_COLUMNS[group_by]]] if group_by else []
+    reports = conn.execute(
+        select(*group, func.count()).select_from(pop_reports).where(*conditions).group_by(*group)
+    ).all()
+    reports = {row[0] if group else None: row[-1] for row in reports}
+    if not exact:
+        return reports, None
+    raiders = conn.execute(
+        select(*group, func.count(func.distinct(pop_players.c.player_key)))
+        .select_from(pop_reports.join(pop_players, pop_players.c.report_code == pop_reports.c.code))
+        .where(*conditions)
+        .group_by(*group)
+    ).all()
+    return reports, {row[0] if group else None: row[-1] for row in raiders}
+
+
+def query_population(server=None, region=None, start_time=None, end_time=None, zone_id=None, group_by=None, exact=False):
+    """Unique raiders and report count over the index, optionally filtered and broken down.
+
+    `group_by` is "server" or "zone". Estimates cover whole UTC days, so the
+    time range is widened to day boundaries unless `exact` is set, in which
+    case raiders are counted exactly from the player rows.
+    """
+    if not exact:
+        start_time, end_time = _widen_to_days(start_time, end_time)
+    conditions = _report_conditions(server, region, zone_id, start_time, end_time)
+    with _engine().connect() as conn:
+        reports, raiders = _grouped_counts(conn, conditions, None, exact)
+        if group_by:
+            group_reports, group_raiders = _grouped_counts(conn, conditions, group_by, exact)
+        if not exact:
+            rows = _sketch_rows(conn, server, region, zone_id, start_time, end_time)
+    if not exact:
+        raiders = _merged_estimates(rows, lambda row: None)
+        if group_by:
+            column = GROUP_COLUMNS[group_by]
+            group_raiders = _merged_estimates(rows, lambda row: row[column] or None)
+
+    result = {"unique_raiders": raiders.get(None, 0), "reports": reports.get(None, 0), "exact": exact}
+    if group_by:
+        result["groups"] = sorted((
+            {group_by: value, "unique_raiders": group_raiders.get(value, 0), "reports": count}
+            for value, count in group_reports.items()
+        ), key=lambda group: group["unique_raiders"], reverse=True)
+    return result
+
+
+def _period(day, interval):
+    if interval == "day":
+        return day
+    date = datetime.strptime(day, "%Y-%m-%d")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+def population_trend(server=None, region=None, start_time=None, end_time=None, zone_id=None, interval="week"):
+    """Estimated unique raiders and report count per day or per week (starting Monday), oldest first.
+
+    Each period also carries its change against the previous period.
+    """
+    start_time, end_time = _widen_to_days(start_time, end_time)
+    conditions = _report_conditions(server, region, zone_id, start_time, end_time)
+    with _engine().connect() as conn:
+        rows = _sketch_rows(conn, server, region, zone_id, start_time, end_time)
+        start_times = conn.execute(select(pop_reports.c.start_time).where(*conditions)).scalars().all()
+    raiders = _merged_estimates(rows, lambda row: _period(row["day"], interval))
+    reports = {}
+    for report_start in start_times:
+        period = _period(_day(report_start), interval)
+        reports[period] = reports.get(period, 0) + 1
+
+    series = []
+    previous = None
+    for period in sorted(raiders.keys() | reports.keys()):
+        unique_raiders = raiders.get(period, 0)
+        series.append({
+            "period": period,
+            "unique_raiders": unique_raiders,
+            "reports": reports.get(period, 0),
+            "change": round((unique_raiders - previous) / previous, 3) if previous else None,
+        })
+        previous = unique_raiders
+    return {"interval": interval, "series": series}
+
+
+def status():
+    """Watermark, last run and index size, for monitoring ingestion lag."""
+    with _engine().connect() as conn:
+        watermark = _get_state(conn, "watermark", SINCE_MS)
+        last_run = _get_state(conn, "last_run")
+        reports = conn.execute(select(func.count()).select_from(pop_reports)).scalar()
+    return {
+        "watermark": watermark,
+        "lagS": round(time.time() - watermark / 1000, 1),
+        "running": _ingest_lock.locked(),
+        "reports": reports,
+        "lastRun": last_run,
+    }
@@ -0,0 +1,238 @@
+"""Shared Warcraft Logs points budget for every upstream GraphQL call.
+
+The API grants a fixed number of points per hour. RateBudget tracks how many
+are left, from `rateLimitData` and from rate-limit response headers, and
+spends an estimate locally for each call in between, acting as one token
+bucket for the whole process that refills at the hourly reset.
+
+Calls only wait when the budget actually runs low. Background work (the
+scheduler and ingestion) stops once BACKGROUND_RESERVE of the hour is left
+so interactive page views keep headroom; interactive calls only wait at
+INTERACTIVE_RESERVE, and give up with RateLimitExceeded instead of hanging a
+request for minutes.
+
+Every worker process keeps its own RateBudget over the same account. Between
+refreshes a worker spends at most its 1/WORKERS share of the headroom that
+upstream last reported, so together they stay within it.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Fraction of the hourly budget each priority must leave untouched.
+BACKGROUND_RESERVE = float(os.getenv("WCL_BACKGROUND_RESERVE", "0.25"))
+INTERACTIVE_RESERVE = float(os.getenv("WCL_INTERACTIVE_RESERVE", "0.02"))
+INTERACTIVE_MAX_WAIT_S = float(os.getenv("WCL_INTERACTIVE_MAX_WAIT_S", "10"))
+# Re-read rateLimitData after this long or this many calls, whichever is first.
+REFRESH_INTERVAL_S = 60
+REFRESH_EVERY_CALLS = 50
+# Longest single sleep, so waiters notice budget updates and resets promptly.
+MAX_WAIT_STEP_S = 5
+DEFAULT_RETRY_AFTER_S = 60
+# Times a call answered with 429 is retried once the budget lets it through.
+RATE_LIMIT_RETRIES = int(os.getenv("WCL_RATE_LIMIT_RETRIES", "3"))
+# Worker processes spending the same budget; uvicorn reads WEB_CONCURRENCY too.
+WORKERS = max(1, int(os.getenv("WCL_RATE_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+
+_priority = contextvars.ContextVar("wcl_priority", default=INTERACTIVE)
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when an interactive call would have to wait too long for budget."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Warcraft Logs rate limit reached, retry in {round(retry_after)}s")
+        self.retry_after = retry_after
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed upstream calls at `level` (INTERACTIVE or BACKGROUND)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def estimate_cost(query):
+    """Rough point cost of a query: one per expensive field, at least one."""
+    return max(1, query.count("table(") + query.count("graph(") + query.count("characterRankings("))
+
+
+class RateBudget:
+    """Thread-safe view of the hourly points budget."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limit = None
+        self.spent = 0.0
+        # Account-wide spend as last reported upstream; spent - synced_spent is this process's since.
+        self.synced_spent = 0.0
+        self.reset_at = 0.0
+        self.updated_at = 0.0
+        self.blocked_until = 0.0
+        self._calls_since_refresh = 0
+        self._refreshing = False
+        self.throttled = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def _reserve(self, level):
+        fraction = BACKGROUND_RESERVE if level == BACKGROUND else INTERACTIVE_RESERVE
+        return self.limit * fraction
+
+    def _delay(self, cost, level, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.limit is None:
+            return 0
+        if now >= self.reset_at:
+            # The hour rolled over; spend starts again until the next refresh.
+            self.spent = self.synced_spent = 0.0
+            self.reset_at = now + 3600
+        share = (self.limit - self.synced_spent - self._reserve(level)) / WORKERS
+        if self.spent - self.synced_spent + cost <= share:
+            return 0
+        if self.limit - self.spent - cost >= self._reserve(level):
+            # Only this worker's share is used up; re-read what the others spent.
+            self._calls_since_refresh = REFRESH_EVERY_CALLS
+            return 1.0
+        return max(1.0, self.reset_at - now)
+
+    def try_spend(self, cost, level):
+        """Spend `cost` points and return 0, or return how long to wait first."""
+        with self._lock:
+            delay = self._delay(cost, level, time.time())
+            if delay == 0:
+                self.spent += cost
+                self._calls_since_refresh += 1
+            return delay
+
+    def claim_refresh(self):
+        """True for exactly one caller when the budget should be re-read.
+
+        That caller must call end_refresh once it is done, even if it fails.
+        """
+        with self._lock:
+            stale = (
+                time.time() - self.updated_at > REFRESH_INTERVAL_S
+                or self._calls_since_refresh >= REFRESH_EVERY_CALLS
+            )
+            if not stale or self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def update(self, limit_per_hour, points_spent, reset_in_s):
+        with self._lock:
+            self.limit = float(limit_per_hour)
+            self.spent = self.synced_spent = float(points_spent)
+            self.reset_at = time.time() + float(reset_in_s)
+            self.updated_at = time.time()
+            self._calls_since_refresh = 0
+
+    def refresh_failed(self):
+        with self._lock:
+            self.updated_at = time.time()
+            self._calls_since_refresh = 0
+
+    def end_refresh(self):
+        """Let claim_refresh hand out the next refresh, however this one ended."""
+        with self._lock:
+            self._refreshing = False
+
+    def observe(self, status_code, headers):
+        """Fold rate-limit headers and 429s from any upstream response into the budget."""
+        now = time.time()
+        with self._lock:
+            limit = headers.get("X-RateLimit-Limit")
+            remaining = headers.get("X-RateLimit-Remaining")
+            if limit is not None and remaining is not None:
+                try:
+                    self.limit = float(limit)
+                    self.spent = self.synced_spent = self.limit - float(remaining)
+                    self.updated_at = now
+                except ValueError:
+                    pass
+            if status_code == 429:
+                self.rate_limited += 1
+                try:
+                    retry_after = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER_S))
+                except ValueError:
+                    retry_after = DEFAULT_RETRY_AFTER_S
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def acquire(self, cost, level=None, refresh=None):
+        """Block until `cost` points may be spent at the caller's priority.
+
+        `refresh` re-reads the budget from upstream when it falls due while waiting.
+        """
+        level = level or current_priority()
+        waited = 0.0
+        while True:
+            delay = self.try_spend(cost, level)
+            if delay == 0:
+                return waited
+            if level == INTERACTIVE and waited + delay > INTERACTIVE_MAX_WAIT_S:
+                self._count("rejected")
+                raise RateLimitExceeded(delay)
+            if waited == 0:
+                self._count("throttled")
+            step = min(delay, MAX_WAIT_STEP_S)
+            time.sleep(step)
+            waited += step
+            if refresh is not None and self.claim_refresh():
+                refresh()
+
+    async def acquire_async(self, cost, level=None, refresh=None):
+        """Async twin of `acquire` that sleeps without blocking the event loop."""
+        level = level or current_priority()
+        waited = 0.0
+        while True:
+            delay = self.try_spend(cost, level)
+            if delay == 0:
+                return waited
+            if level == INTERACTIVE and waited + delay > INTERACTIVE_MAX_WAIT_S:
+                self._count("rejected")
+                raise RateLimitExceeded(delay)
+            if waited == 0:
+                self._count("throttled")
+            step = min(delay, MAX_WAIT_STEP_S)
+            await asyncio.sleep(step)
+            waited += step
+            if refresh is not None and self.claim_refresh():
+                await refresh()
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "limitPerHour": self.limit,
+                "pointsSpentThisHour": round(self.spent, 1),
+                "pointsRemaining": round(self.limit - self.spent, 1) if self.limit is not None else None,
+                "resetInS": round(max(0, self.reset_at - now), 1) if self.limit is not None else None,
+                "blockedForS": round(max(0, self.blocked_until - now), 1),
+                "updatedAgoS": round(now - self.updated_at, 1) if self.updated_at else None,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "rateLimited": self.rate_limited,
+                "workers": WORKERS,
+            }
+
+
+rate_budget = RateBudget()
@@ -0,0 +1,282 @@
+"""In-process background jobs that keep the caches warm for tracked guilds.
+
+Each tracked guild is polled on its own interval: new reports are found via
+fetch_all_logs and their fights, tables and actor lists are pulled into the
+report cache, so the first visitor to a guild or player page reads locally.
+Compare baselines (top parses per encounter/spec the guild fought) and the
+raiding population index are refreshed by jobs of their own. Jobs run at
+background priority, so they pause before page views run out of API budget.
+
+The scheduler starts with the FastAPI app (set WCL_SCHEDULER=0 to disable)
+or on its own with `python scheduler.py`. Several web workers can all run
+it when they share WCL_SHARED_CACHE_URL: each due job is claimed by one of
+them per interval.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import leaderboard
+import metrics_store
+import pull_logs
+import raid_population
+import shared_cache
+from rate_limiter import BACKGROUND, priority
+from pull_logs import (
+    BATCH_REPORTS,
+    GUILD_NAME,
+    REGION,
+    SERVER_SLUG,
+    ReportPiece,
+    _chunks,
+)
+from report_cache import ttl_for
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("WCL_SCHEDULER", "1") not in ("0", "false", "off")
+# "guild/server/region" entries separated by ";".
+TRACKED_GUILDS = os.getenv("WCL_TRACKED_GUILDS", f"{GUILD_NAME}/{SERVER_SLUG}/{REGION}")
+GUILD_REFRESH_S = int(os.getenv("WCL_GUILD_REFRESH_S", "600"))
+# Each wait is stretched or shrunk by up to this fraction so jobs don't align.
+JITTER = float(os.getenv("WCL_SCHEDULER_JITTER", "0.1"))
+MAX_ERRORS_KEPT = 10
+
+
+def parse_tracked_guilds(spec=TRACKED_GUILDS):
+    """Parse "guild/server/region;..." into (guild, server, region) tuples."""
+    guilds = []
+    for entry in spec.split(";"):
+        parts = [part.strip() for part in entry.split("/")]
+        if len(parts) == 2:
+            parts.append(REGION)
+        if len(parts) == 3 and all(parts):
+            guilds.append(tuple(parts))
+    return guilds
+
+
+class Job:
+    """A named periodic task plus the bookkeeping shown on the status endpoint."""
+
+    def __init__(self, name, interval_s, run):
+        self.name = name
+        self.interval_s = interval_s
+        self.run = run
+        self.next_run = time.time() + random.uniform(0, interval_s * JITTER)
+        self.running = False
+        self.runs = 0
+        self.last_started = None
+        self.last_finished = None
+        self.last_success = None
+        self.last_duration_s = None
+        self.last_result = None
+        self.errors = deque(maxlen=MAX_ERRORS_KEPT)
+
+    def schedule_next(self):
+        delay = self.interval_s * (1 + random.uniform(-JITTER, JITTER))
+        self.next_run = time.time() + delay
+
+    def execute(self):
+        # With several workers sharing a cache tier, the first to claim a run does it.
+        if not shared_cache.claim(f"job:{self.name}", self.interval_s * (1 - JITTER)):
+            self.last_result = {"skipped": "claimed by another worker"}
+            self.schedule_next()
+            return
+        self.running = True
+        self.last_started = time.time()
+        try:
+            with priority(BACKGROUND):
+                self.last_result = self.run()
+            self.last_success = time.time()
+        except Exception as e:
+            logger.exception("scheduled job %s failed", self.name)
+            self.errors.append({"at": int(time.time() * 1000), "error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.runs += 1
+            self.running = False
+            self.last_finished = time.time()
+            self.last_duration_s = round(self.last_finished - self.last_started, 2)
+            self.schedule_next()
+
+    def status(self):
+        now = time.time()
+        return {
+            "name": self.name,
+            "intervalS": self.interval_s,
+            "running": self.running,
+            "runs": self.runs,
+            "lastStarted": _ms(self.last_started),
+            "lastFinished": _ms(self.last_finished),
+            "lastDurationS": self.last_duration_s,
+            # Seconds since the data this job maintains was last refreshed.
+            "lagS": round(now - self.last_success, 1) if self.last_success else None,
+            "nextRunInS": round(max(0, self.next_run - now), 1),
+            "lastResult": self.last_result,
+            "errors": list(self.errors),
+        }
+
+
+def _ms(timestamp):
+    return int(timestamp * 1000) if timestamp else None
+
+
+class Scheduler:
+    """Runs due jobs one at a time on a single daemon thread."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="wcl-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            now = time.time()
+            for job in self.jobs:
+                if self._stop.is_set():
+                    break
+                if job.next_run <= now:
+                    job.execute()
+            next_due = min((job.next_run for job in self.jobs), default=now + 60)
+            self._stop.wait(max(0.5, next_due - time.time()))
+
+    def status(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "jobs": [job.status() for job in self.jobs],
+        }
+
+
+def _report_pieces(report_code):
+    return [
+        ReportPiece("fights", report_code),
+        ReportPiece("masterData", report_code),
+        ReportPiece("table", report_code, "DamageDone"),
+        ReportPiece("table", report_code, "Healing"),
+    ]
+
+
+def _fights(fights_data):
+    return fights_data["data"]["reportData"]["report"]["fights"] if fights_data else []
+
+
+def _boss_pieces(report_code, fights_data):
+    return [
+        ReportPiece("table", report_code, data_type, (fight["id"],))
+        for fight in _fights(fights_data)
+        if fight.get("encounterID", 0) != 0
+        for data_type in ("DamageDone", "Healing")
+    ]
+
+
+def _record_metrics(guild, server, region, batch, overview, boss_tables):
+    """Append the batch's boss fight tables to the columnar metrics store.
+
+    Finished reports are also folded into the guild leaderboard.
+    """
+    key = metrics_store.guild_key(guild, server, region)
+    rows = []
+    for report in batch:
+        fights_data = overview.get(ReportPiece("fights", report["code"]))
+        tables = {
+            (piece.fight_ids[0], piece.data_type): table["data"]["reportData"]["report"]["table"]["data"]["entries"]
+            for piece, table in boss_tables.items()
+            if piece.report_code == report["code"]
+        }
+        report_rows = metrics_store.fight_rows(report, _fights(fights_data), tables)
+        rows.extend(report_rows)
+        if fights_data is not None and ttl_for(fights_data) is None:
+            leaderboard.fold(key, report["code"], report.get("startTime", 0), report_rows)
+    return metrics_store.record(key, rows)
+
+
+def prewarm_guild(guild, server, region, seen):
+    """Pull every not-yet-seen report of a guild into the report cache.
+
+    Boss fight tables are also recorded in the metrics store for trends and
+    folded into the guild leaderboard.
+
+    `seen` holds codes of finished reports already warmed by this job; live
+    reports stay out of it so they are revisited on the next run.
+    """
+    token = pull_logs.get_access_token()
+    data = pull_logs.fetch_all_logs(token, guild, server, region)
+    reports = data["data"]["reportData"]["reports"]["data"]
+    new_reports = [report for report in reports if report["code"] not in seen]
+
+    warmed = 0
+    errors = []
+    for batch in _chunks(new_reports, BATCH_REPORTS):
+        codes = [report["code"] for report in batch]
+        try:
+            overview = pull_logs.fetch_report_pieces(token, [p for code in codes for p in _report_pieces(code)])
+            boss_pieces = [
+                p for code in codes for p in _boss_pieces(code, overview.get(ReportPiece("fights", code)))
+            ]
+            boss_tables = pull_logs.fetch_report_pieces(token, boss_pieces)
+            _record_metrics(guild, server, region, batch, overview, boss_tables)
+        except Exception as e:
+            errors.extend({"reportCode": code, "error": f"{type(e).__name__}: {e}"} for code in codes)
+            continue
+        for code in codes:
+            fights_data = overview.get(ReportPiece("fights", code))
+            if fights_data is not None and ttl_for(fights_data) is None:
+                seen.add(code)
+            warmed += 1
+    return {"reports": len(reports), "warmed": warmed, "errors": errors}
+
+
+def rebuild_leaderboard(guild, server, region):
+    """Rebuild a guild's leaderboard from scratch out of the reports already folded into it.
+
+    Each report in the leaderboard's ledger is refolded from its rows in the
+    metrics store, so a rebuild makes no upstream calls and cannot leave
+    reports out that the guild job already counts as warmed.
+    """
+    key = metrics_store.guild_key(guild, server, region)
+    reports = leaderboard.folded_reports(key)
+    rows = metrics_store.report_rows(key)
+    leaderboard.clear(key)
+    for report_code, start_time in reports:
+        leaderboard.fold(key, report_code, start_time, rows.get(report_code, []))
+    return {"reports": len(reports), "rows": sum(len(rows.get(code, [])) for code, _ in reports)}
+
+
+def build_jobs(guilds=None):
+    jobs = []
+    for guild, server, region in guilds if guilds is not None else parse_tracked_guilds():
+        seen = set()
+        jobs.append(Job(
+            f"guild:{guild}/{server}/{region}",
+            GUILD_REFRESH_S,
+            lambda g=guild, s=server, r=region, seen=seen: prewarm_guild(g, s, r, seen),
+        ))
+        # Re-warm at half the TTL so baselines are rarely found expired.
+        jobs.append(Job(
+            f"baselines:{guild}/{server}/{region}",
+            max(60, pull_logs.BASELINE_TTL_S // 2),
+            lambda g=guild, s=server, r=region: pull_logs.warm_baselines(g, s, r),
+        ))
+    jobs.append(Job("raiding-population", raid_population.REFRESH_INTERVAL_S, raid_population.ingest_new_reports))
+    return jobs
+
+
+scheduler = Scheduler(build_jobs())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    scheduler.run_forever()
@@ -0,0 +1,350 @@
+"""Cache tier shared by every worker process: tokens, in-flight results and claims.
+
+WCL_SHARED_CACHE_URL picks the store: "sqlite:///shared_cache.db" (a
+WAL-mode SQLite file, enough for workers on one host), "redis://host:6379/0"
+(needs the `redis` package, for several hosts) or "off", the default, for a
+single process. Values are JSON, zlib-compressed above COMPRESS_MIN_BYTES at
+a fast level since they are mostly large report tables read back once or
+twice.
+
+SharedFlight extends single_flight across processes: the first worker to
+claim a key runs the call, and the others wait for it to publish the result
+for RESULT_TTL_S instead of sending the same upstream request. A worker
+that dies mid-call only holds its claim for LOCK_TTL_S.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from single_flight import WAIT_TIMEOUT_S
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_URL = os.getenv("WCL_SHARED_CACHE_URL", "off")
+LOCK_TTL_S = int(os.getenv("WCL_SHARED_LOCK_TTL", "60"))
+RESULT_TTL_S = int(os.getenv("WCL_SHARED_RESULT_TTL", "30"))
+POLL_S = float(os.getenv("WCL_SHARED_POLL_S", "0.02"))
+MAX_POLL_S = float(os.getenv("WCL_SHARED_MAX_POLL_S", "0.5"))
+COMPRESS_MIN_BYTES = 1024
+# Purge expired SQLite rows every N writes.
+PURGE_EVERY = 500
+
+_RAW, _ZLIB = b"j", b"z"
+
+
+def dumps(value):
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return _RAW + raw
+    # Level 1 is several times faster than the default at a few percent larger output.
+    return _ZLIB + zlib.compress(raw, 1)
+
+
+def loads(data):
+    body = data[1:]
+    return json.loads(zlib.decompress(body) if data[:1] == _ZLIB else body)
+
+
+class SqliteStore:
+    """Expiring key/value rows in a WAL-mode SQLite file, one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            # WAL lets readers in every worker run alongside the one writer.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM shared_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = None if ttl is None else time.time() + ttl
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO shared_cache VALUES (?, ?, ?)", (key, value, expires_at))
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, key, value, ttl):
+        """Set `key` only if it is absent or expired; True when this call set it."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM shared_cache WHERE key = ? AND expires_at <= ?", (key, now))
+            added = conn.execute(
+                "INSERT OR IGNORE INTO shared_cache VALUES (?, ?, ?)", (key, value, now + ttl)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def delete(self, key, value=None):
+        """Remove `key`; with `value`, only while it still holds that value."""
+        if value is None:
+            self._connect().execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+        else:
+            self._connect().execute("DELETE FROM shared_cache WHERE key = ? AND value = ?", (key, value))
+
+
+class RedisStore:
+    """The same operations on a Redis server."""
+
+    # Compare-and-delete, so a claim that expired and was taken over is not released by its old owner.
+    _DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError(f"WCL_SHARED_CACHE_URL={url!r} needs the redis package")
+        self._client = redis.Redis.from_url(url)
+        self._delete_if = self._client.register_script(self._DELETE_IF)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=None if ttl is None else max(1, int(ttl)))
+
+    def add(self, key, value, ttl):
+        return bool(self._client.set(key, value, nx=True, ex=max(1, int(ttl))))
+
+    def delete(self, key, value=None):
+        if value is None:
+            self._client.delete(key)
+        else:
+            self._delete_if(keys=[key], args=[value])
+
+
+def open_store(url=SHARED_CACHE_URL):
+    """The store for `url`, or None when sharing is off."""
+    if not url or url == "off":
+        return None
+    if url.startswith("sqlite:///"):
+        return SqliteStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"unsupported WCL_SHARED_CACHE_URL {url!r}")
+
+
+store = open_store()
+
+
+def get_json(key):
+    if store is None:
+        return None
+    try:
+        data = store.get(key)
+    except Exception:
+        logger.exception("shared cache read failed")
+        return None
+    return loads(data) if data is not None else None
+
+
+def set_json(key, value, ttl=None):
+    if store is None:
+        return
+    try:
+        store.set(key, dumps(value), ttl)
+    except Exception:
+        logger.exception("shared cache write failed")
+
+
+def delete(key):
+    if store is not None:
+        try:
+            store.delete(key)
+        except Exception:
+            logger.exception("shared cache delete failed")
+
+
+def claim(name, ttl):
+    """Take `name` for `ttl` seconds unless another worker holds it; always True when sharing is off."""
+    if store is None:
+        return True
+    try:
+        return store.add(f"claim:{name}", b"1", ttl)
+    except Exception:
+        logger.exception("shared cache claim failed")
+        return True
+
+
+@contextmanager
+def lock(name, ttl=LOCK_TTL_S):
+    """Cross-process lock that yields whether it was acquired, without waiting for it."""
+    if store is None:
+        yield True
+        return
+    owner = uuid.uuid4().hex.encode()
+    key = f"lock:{name}"
+    try:
+        acquired = store.add(key, owner, ttl)
+    except Exception:
+        logger.exception("shared cache lock failed")
+        yield True
+        return
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                store.delete(key, owner)
+            except Exception:
+                logger.exception("shared cache unlock failed")
+
+
+class SharedFlight:
+    """Cross-process single flight; results must be JSON-serializable.
+
+    A worker that finds the key claimed registers as waiting, and the leader
+    only publishes when someone has, so a call nobody else wanted costs a
+    claim and one lookup but no encode or write. SQLite has no notifications,
+    so waiters poll with backoff from POLL_S up to MAX_POLL_S. After
+    WAIT_TIMEOUT_S they make the call themselves.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self.published = 0
+        self.wait_timeouts = 0
+
+    def _try_lead(self, key, owner):
+        try:
+            return store.add(f"flight:{key}", owner, LOCK_TTL_S)
+        except Exception:
+            logger.exception("shared flight claim failed")
+            return True
+
+    def _leading(self, key):
+        """Whether some worker still holds the claim on `key`."""
+        try:
+            return store.get(f"flight:{key}") is not None
+        except Exception:
+            logger.exception("shared flight read failed")
+            return False
+
+    def _wait_for(self, key):
+        try:
+            store.set(f"waiting:{key}", b"1", LOCK_TTL_S)
+        except Exception:
+            logger.exception("shared flight wait failed")
+
+    def _published(self, key):
+        return get_json(f"result:{key}")
+
+    def _release(self, key, owner):
+        try:
+            store.delete(f"flight:{key}", owner)
+        except Exception:
+            logger.exception("shared flight release failed")
+
+    def _abandon(self, key, owner):
+        """Release the claim after the call failed, dropping any waiting marker with it."""
+        delete(f"waiting:{key}")
+        self._release(key, owner)
+
+    def _finish(self, key, owner, result):
+        """Publish `result` if another worker is waiting for it, then release the claim."""
+        try:
+            wanted = store.get(f"waiting:{key}") is not None
+        except Exception:
+            logger.exception("shared flight read failed")
+            wanted = False
+        if wanted:
+            set_json(f"result:{key}", {"value": result}, RESULT_TTL_S)
+            delete(f"waiting:{key}")
+            self.published += 1
+        self._release(key, owner)
+
+    def do(self, key, fn):
+        """fn()'s result, or the one another worker publishes for `key` while this waits."""
+        if store is None:
+            return fn()
+        owner = uuid.uuid4().hex.encode()
+        while True:
+            if self._try_lead(key, owner):
+                try:
+                    result = fn()
+                except BaseException:
+                    self._abandon(key, owner)
+                    raise
+                self._finish(key, owner, result)
+                return result
+            self._wait_for(key)
+            deadline = time.monotonic() + WAIT_TIMEOUT_S
+            delay = POLL_S
+            published = self._published(key)
+            while published is None and self._leading(key):
+                if time.monotonic() >= deadline:
+                    self.wait_timeouts += 1
+                    return fn()
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_S)
+                published = self._published(key)
+            if published is not None:
+                self.coalesced += 1
+                return published["value"]
+            # The leader finished without publishing or failed; try to lead this time.
+
+    async def do_async(self, key, coro_fn):
+        """Async twin of do; store calls run in a thread."""
+        if store is None:
+            return await coro_fn()
+        owner = uuid.uuid4().hex.encode()
+        while True:
+            if await asyncio.to_thread(self._try_lead, key, owner):
+                try:
+                    result = await coro_fn()
+                except BaseException:
+                    await asyncio.to_thread(self._abandon, key, owner)
+                    raise
+                await asyncio.to_thread(self._finish, key, owner, result)
+                return result
+            await asyncio.to_thread(self._wait_for, key)
+            deadline = time.monotonic() + WAIT_TIMEOUT_S
+            delay = POLL_S
+            published = await asyncio.to_thread(self._published, key)
+            while published is None and await asyncio.to_thread(self._leading, key):
+                if time.monotonic() >= deadline:
+                    self.wait_timeouts += 1
+                    return await coro_fn()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_S)
+                published = await asyncio.to_thread(self._published, key)
+            if published is not None:
+                self.coalesced += 1
+                return published["value"]
+
+
+shared_flight = SharedFlight()
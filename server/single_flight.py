@@ -0,0 +1,121 @@
+"""Coalesce identical upstream queries that are in flight at the same time.
+
+When a raid ends, many people open the same report together and every page
+view asks for the same fights and tables. The first caller for a key runs
+the query; everyone arriving while it is in flight waits for that result
+instead of sending their own. Failures are raised to every waiter. Results
+are shared objects, so callers must treat them as read-only.
+
+A thread waits at most WAIT_TIMEOUT_S, one upstream call's connect plus read
+timeout, and then makes the call itself. A hung leader cannot hold every
+thread waiting on its key.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import weakref
+
+from http_client import CONNECT_TIMEOUT_S, READ_TIMEOUT_S
+
+WAIT_TIMEOUT_S = CONNECT_TIMEOUT_S + READ_TIMEOUT_S
+
+
+def query_key(query, variables=None):
+    """Stable key for a GraphQL query and its variables, ignoring whitespace and key order."""
+    normalized = re.sub(r"\s+", " ", query).strip()
+    if variables:
+        normalized += "\n" + json.dumps(variables, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-based coalescing for the synchronous fetchers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+        self.wait_timeouts = 0
+
+    def do(self, key, fn):
+        """Return fn()'s result, sharing one call among concurrent callers of `key`."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(WAIT_TIMEOUT_S):
+                self.wait_timeouts += 1
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Asyncio coalescing; the shared call runs as its own task on each loop.
+
+    Waiters await it through `asyncio.shield`, so cancelling one request only
+    cancels that request's wait. The shared task still finishes, fills the
+    cache and answers the other waiters.
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+        self.coalesced = 0
+
+    async def do(self, key, coro_fn):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        task = calls.get(key)
+        if task is None:
+            task = loop.create_task(coro_fn())
+            calls[key] = task
+            task.add_done_callback(lambda done, key=key: _finished(calls, key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+def _finished(calls, key, task):
+    calls.pop(key, None)
+    # Mark the error as retrieved even if every waiter was cancelled.
+    if not task.cancelled():
+        task.exception()
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+
+
+def stats():
+    return {
+        "coalesced": single_flight.coalesced + async_single_flight.coalesced,
+        "waitTimeouts": single_flight.wait_timeouts,
+    }
@@ -0,0 +1,87 @@
+"""Vectorized merging and downsampling of Warcraft Logs graph series.
+
+A graph response holds one series per source/ability, each either evenly
+spaced values (pointStart + i * pointInterval) or [timestamp, value] pairs.
+Series are decoded into NumPy arrays, summed on a common time grid and then
+reduced to a requested number of points, so a long fight answers with a few
+hundred points instead of every sample of every series.
+"""
+import numpy as np
+
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+
+
+def decode_series(series):
+    """Return (times_ms, values) float arrays for one graph series."""
+    data = series.get("data") or []
+    if not data:
+        return np.empty(0), np.empty(0)
+    if isinstance(data[0], (list, tuple)):
+        pairs = np.asarray(data, dtype=np.float64)
+        return pairs[:, 0], pairs[:, 1]
+    values = np.asarray(data, dtype=np.float64)
+    start = series.get("pointStart", 0)
+    interval = series.get("pointInterval", 1000)
+    return start + np.arange(len(values)) * interval, values
+
+
+def merge_series(series_list, step_ms=None):
+    """Sum all series onto one grid; returns (times_ms, values).
+
+    The grid step defaults to the finest pointInterval among the series.
+    Points are assigned to the nearest grid slot with np.bincount.
+    """
+    decoded = [decode_series(series) for series in series_list or []]
+    decoded = [(t, v) for t, v in decoded if len(t)]
+    if not decoded:
+        return np.empty(0), np.empty(0)
+    if step_ms is None:
+        intervals = [series.get("pointInterval") for series in series_list if series.get("pointInterval")]
+        step_ms = min(intervals) if intervals else 1000
+    times = np.concatenate([t for t, _ in decoded])
+    values = np.concatenate([v for _, v in decoded])
+    origin = times.min()
+    slots = np.rint((times - origin) / step_ms).astype(np.int64)
+    summed = np.bincount(slots, weights=values)
+    grid = origin + np.arange(len(summed)) * step_ms
+    return grid, summed
+
+
+def bucket_mean(x, y, points):
+    """Average consecutive samples into `points` equal-count buckets."""
+    if len(x) <= points:
+        return x, y
+    edges = np.linspace(0, len(x), points + 1).astype(np.int64)[:-1]
+    counts = np.diff(np.append(edges, len(x)))
+    return np.add.reduceat(x, edges) / counts, np.add.reduceat(y, edges) / counts
+
+
+def lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets: keep the `points` samples that best preserve shape."""
+    n = len(x)
+    if points >= n or points < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex.
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[previous] - avg_x) * (by - y[previous]) - (x[previous] - bx) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        keep[i + 1] = previous
+    return x[keep], y[keep]
+
+
+DOWNSAMPLERS = {"lttb": lttb, "buckets": bucket_mean}
+
+
+def downsample(x, y, points=DEFAULT_POINTS, method="lttb"):
+    points = max(3, min(int(points), MAX_POINTS))
+    return DOWNSAMPLERS[method](x, y, points)
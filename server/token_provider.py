@@ -0,0 +1,57 @@
+"""Process-wide cache for the Warcraft Logs client-credentials token."""
+import threading
+import time
+
+# Refresh this many seconds before the token actually expires.
+REFRESH_MARGIN_S = 60
+
+
+class TokenProvider:
+    """Cache an OAuth token until shortly before `expires_in` runs out.
+
+    `fetch` is called with no arguments and must return
+    `(access_token, expires_in_seconds)`. Concurrent callers that find the
+    token stale wait on a single in-flight refresh instead of each hitting
+    the token endpoint.
+    """
+
+    def __init__(self, fetch, refresh_margin=REFRESH_MARGIN_S):
+        self._fetch = fetch
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+
+    def peek(self):
+        """Return the cached token if it is still fresh, otherwise None."""
+        token = self._token
+        if token and time.monotonic() < self._expires_at - self._refresh_margin:
+            return token
+        return None
+
+    def get_token(self):
+        """Return a fresh token, refreshing it at most once across threads."""
+        token = self.peek()
+        if token:
+            return token
+        with self._lock:
+            # Another thread may have refreshed while we waited on the lock.
+            token = self.peek()
+            if token:
+                return token
+            token, expires_in = self._fetch()
+            self._token = token
+            self._expires_at = time.monotonic() + float(expires_in or 0)
+            return token
+
+    def invalidate(self, token=None):
+        """Drop the cached token.
+
+        When `token` is given the cache is only cleared if that token is still
+        the current one, so a late 401 for an old token does not evict a
+        token another thread just refreshed.
+        """
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
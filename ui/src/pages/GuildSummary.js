@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { Link } from "react-router-dom";
 
 function GuildSummary({ backendUrl }) {
@@ -7,24 +7,57 @@ function GuildSummary({ backendUrl }) {
   const [logs, setLogs] = useState([]);
   const [loading, setLoading] = useState(false);
   const [fetched, setFetched] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef(null);
+
+  const guildLogsUrl = (cursor) =>
+    `${backendUrl}/api/guild-logs?guild=${encodeURIComponent(guild)}&server=${encodeURIComponent(server)}` +
+    (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
 
   const fetchGuildLogs = () => {
     if (!guild || !server) return;
     setLoading(true);
     setFetched(false);
+    setLogs([]);
+    setNextCursor(null);
 
-    fetch(
-      `${backendUrl}/api/guild-logs?guild=${encodeURIComponent(guild)}&server=${encodeURIComponent(server)}`
-    )
+    fetch(guildLogsUrl())
       .then((res) => res.json())
       .then((data) => {
-        setLogs(data);
+        setLogs(data.logs || []);
+        setNextCursor(data.nextCursor);
         setFetched(true);
       })
       .catch((err) => console.error("Failed to fetch guild logs:", err))
       .finally(() => setLoading(false));
   };
 
+  const loadMore = () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+
+    fetch(guildLogsUrl(nextCursor))
+      .then((res) => res.json())
+      .then((data) => {
+        setLogs((prev) => [...prev, ...(data.logs || [])]);
+        setNextCursor(data.nextCursor);
+      })
+      .catch((err) => console.error("Failed to fetch more guild logs:", err))
+      .finally(() => setLoadingMore(false));
+  };
+
+  // Infinite scroll: load the next page when the sentinel below the list shows up
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) loadMore();
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  });
+
   const handleKeyDown = (e) => {
     if (e.key === "Enter") fetchGuildLogs();
   };
@@ -136,6 +169,13 @@ function GuildSummary({ backendUrl }) {
                 </div>
               </div>
             ))}
+          <div ref={sentinelRef} />
+          {loadingMore && (
+            <div className="loading-container">
+              <div className="spinner"></div>
+              <span className="loading-text">Loading older logs…</span>
+            </div>
+          )}
         </div>
       )}
 
@@ -31,22 +31,59 @@ function PlayerPage({ backendUrl }) {
     }
   }, [data, showGear, expandedLogs]);
 
-  const fetchPlayerData = () => {
+  // Frames from /api/player-summary/stream, folded into the summary shape
+  const applyFrame = (summary, frame) => {
+    if (frame.type === "player") {
+      return {
+        ...summary,
+        playerClass: frame.playerClass,
+        spec: frame.spec,
+        export: frame.export,
+      };
+    }
+    if (frame.type === "log") {
+      return { ...summary, logs: [...summary.logs, frame.log] };
+    }
+    if (frame.type === "summary") {
+      return { ...summary, errors: frame.errors };
+    }
+    return summary;
+  };
+
+  const fetchPlayerData = async () => {
     if (!guild || !server || !playerName) return;
     setLoading(true);
     setFetched(false);
     setData(null);
 
-    fetch(
-      `${backendUrl}/api/player-summary?guild=${encodeURIComponent(guild)}&server=${encodeURIComponent(server)}&player=${encodeURIComponent(playerName)}`
-    )
-      .then((res) => res.json())
-      .then((result) => {
-        setData(result);
-        setFetched(true);
-      })
-      .catch((err) => console.error("Failed to fetch player data:", err))
-      .finally(() => setLoading(false));
+    let summary = { player: playerName, export: null, logs: [], errors: [] };
+    try {
+      const res = await fetch(
+        `${backendUrl}/api/player-summary/stream?guild=${encodeURIComponent(guild)}&server=${encodeURIComponent(server)}&player=${encodeURIComponent(playerName)}`
+      );
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines
+          .filter((line) => line.trim())
+          .forEach((line) => {
+            summary = applyFrame(summary, JSON.parse(line));
+          });
+        setData(summary);
+      }
+      setFetched(true);
+    } catch (err) {
+      console.error("Failed to fetch player data:", err);
+    } finally {
+      setLoading(false);
+    }
   };
 
   const handleKeyDown = (e) => {
@@ -198,7 +235,8 @@ function PlayerPage({ backendUrl }) {
         <div className="loading-container">
           <div className="spinner"></div>
           <span className="loading-text">
-            Fetching player data across logs… This may take a moment.
+            Fetching player data across logs…
+            {data?.logs?.length ? ` ${data.logs.length} loaded so far.` : " This may take a moment."}
           </span>
         </div>
       )}
@@ -212,7 +250,7 @@ function PlayerPage({ backendUrl }) {
         </div>
       )}
 
-      {!loading && data && data.logs && data.logs.length > 0 && (
+      {data && data.logs && data.logs.length > 0 && (
         <div>
           {/* Player header */}
           <div className="player-header">
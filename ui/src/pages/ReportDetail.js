@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect } from "react";
 import { useParams, Link } from "react-router-dom";
 
 function ReportDetail({ backendUrl }) {
@@ -39,7 +39,6 @@ function ReportDetail({ backendUrl }) {
   // Sim comparison state
   const [simExportData, setSimExportData] = useState([]);
   const [simExportLoading, setSimExportLoading] = useState(false);
-  const [simExportFetched, setSimExportFetched] = useState(null);
   const [simDpsValues, setSimDpsValues] = useState(() => {
     try {
       const stored = localStorage.getItem(`simDps_${code}`);
@@ -48,11 +47,6 @@ function ReportDetail({ backendUrl }) {
   });
   const [copiedPlayer, setCopiedPlayer] = useState(null);
 
-  // Keep track of which fight was last fetched per tab so we can re-fetch on change
-  const [dpsFetchedFight, setDpsFetchedFight] = useState(null);
-  const [healingFetchedFight, setHealingFetchedFight] = useState(null);
-  const [gearFetchedFight, setGearFetchedFight] = useState(null);
-
   const fightParam = selectedFight !== "all" ? `?fight_ids=${selectedFight}` : "";
 
   // Refresh Wowhead tooltips/icons when gear data renders
@@ -62,91 +56,37 @@ function ReportDetail({ backendUrl }) {
     }
   }, [gearData]);
 
-  // Fetch fights on mount
+  // Fetch fights, DPS, healing, gear and sim export in one request whenever
+  // the selected fight changes; the backend derives all of them from a
+  // single upstream query.
   useEffect(() => {
-    setFightsLoading(true);
-    fetch(`${backendUrl}/api/fights/${code}`)
-      .then((res) => res.json())
-      .then((data) => setFights(data))
-      .catch((err) => console.error("Failed to fetch fights:", err))
-      .finally(() => setFightsLoading(false));
-  }, [backendUrl, code]);
-
-  // Fetch DPS
-  const fetchDps = useCallback(() => {
+    if (fights.length === 0) setFightsLoading(true);
     setDpsLoading(true);
-    fetch(`${backendUrl}/api/dps/${code}${fightParam}`)
-      .then((res) => res.json())
-      .then((data) => {
-        const sorted = [...data].sort((a, b) => b.dps - a.dps);
-        setDpsData(sorted);
-        setDpsFetchedFight(selectedFight);
-        setDpsSortConfig({ key: "dps", direction: "desc" });
-      })
-      .catch((err) => console.error("Failed to fetch DPS:", err))
-      .finally(() => setDpsLoading(false));
-  }, [backendUrl, code, fightParam, selectedFight]);
-
-  // Fetch Healing
-  const fetchHealing = useCallback(() => {
     setHealingLoading(true);
-    fetch(`${backendUrl}/api/healing/${code}${fightParam}`)
-      .then((res) => res.json())
-      .then((data) => {
-        const sorted = [...data].sort((a, b) => b.hps - a.hps);
-        setHealingData(sorted);
-        setHealingFetchedFight(selectedFight);
-        setHealingSortConfig({ key: "hps", direction: "desc" });
-      })
-      .catch((err) => console.error("Failed to fetch Healing:", err))
-      .finally(() => setHealingLoading(false));
-  }, [backendUrl, code, fightParam, selectedFight]);
-
-  // Fetch Gear
-  const fetchGear = useCallback(() => {
     setGearLoading(true);
-    fetch(`${backendUrl}/api/gear/${code}${fightParam}`)
-      .then((res) => res.json())
-      .then((data) => {
-        setGearData(data);
-        setGearFetchedFight(selectedFight);
-      })
-      .catch((err) => console.error("Failed to fetch Gear:", err))
-      .finally(() => setGearLoading(false));
-  }, [backendUrl, code, fightParam, selectedFight]);
-
-  // Fetch WoWSims export data
-  const fetchSimExport = useCallback(() => {
     setSimExportLoading(true);
-    fetch(`${backendUrl}/api/wowsims-export/${code}${fightParam}`)
+    fetch(`${backendUrl}/api/report/${code}/bundle${fightParam}`)
       .then((res) => res.json())
       .then((data) => {
-        setSimExportData(data);
-        setSimExportFetched(selectedFight);
+        setFights(data.fights);
+        setDpsData([...data.dps].sort((a, b) => b.dps - a.dps));
+        setDpsSortConfig({ key: "dps", direction: "desc" });
+        setHealingData([...data.healing].sort((a, b) => b.hps - a.hps));
+        setHealingSortConfig({ key: "hps", direction: "desc" });
+        setGearData(data.gear);
+        setSimExportData(data.wowsimsExport);
       })
-      .catch((err) => console.error("Failed to fetch sim export:", err))
-      .finally(() => setSimExportLoading(false));
-  }, [backendUrl, code, fightParam, selectedFight]);
-
-  // Auto-fetch active tab when fight changes or on initial load
-  useEffect(() => {
-    if (activeTab === "dps" && dpsFetchedFight !== selectedFight) fetchDps();
-  }, [activeTab, selectedFight, dpsFetchedFight, fetchDps]);
-
-  useEffect(() => {
-    if (activeTab === "healing" && healingFetchedFight !== selectedFight) fetchHealing();
-  }, [activeTab, selectedFight, healingFetchedFight, fetchHealing]);
-
-  useEffect(() => {
-    if (activeTab === "gear" && gearFetchedFight !== selectedFight) fetchGear();
-  }, [activeTab, selectedFight, gearFetchedFight, fetchGear]);
-
-  useEffect(() => {
-    if (activeTab === "sim") {
-      if (dpsFetchedFight !== selectedFight) fetchDps();
-      if (simExportFetched !== selectedFight) fetchSimExport();
-    }
-  }, [activeTab, selectedFight, dpsFetchedFight, simExportFetched, fetchDps, fetchSimExport]);
+      .catch((err) => console.error("Failed to fetch report bundle:", err))
+      .finally(() => {
+        setFightsLoading(false);
+        setDpsLoading(false);
+        setHealingLoading(false);
+        setGearLoading(false);
+        setSimExportLoading(false);
+      });
+    // fights.length only decides whether to show the fights spinner
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [backendUrl, code, fightParam]);
 
   // --- DPS sorting ---
   const sortDps = (key) => {